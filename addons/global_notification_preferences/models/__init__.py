@@ -1,3 +1,4 @@
 from . import res_users
 from . import mail_followers
-from . import user_notification_preferences
\ No newline at end of file
+from . import user_notification_preferences
+from . import mail_message_subtype
\ No newline at end of file
@@ -1,4 +1,5 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, Command
+from collections import defaultdict
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -17,36 +18,48 @@ class MailFollowers(models.Model):
     def create(self, vals_list):
         """Apply global preferences when creating new followers"""
         followers = super().create(vals_list)
-        
-        for follower in followers:
-            if follower.use_global_preferences:
-                follower._apply_global_preferences()
-        
+        followers.filtered('use_global_preferences')._apply_global_preferences()
         return followers
     
     def _apply_global_preferences(self):
-        """Apply user's global notification preferences to this follower"""
-        self.ensure_one()
+        """Apply the users' global notification preferences to these followers
         
+        Partners are resolved to users and subtypes are computed once per
+        (user, model), then each distinct subtype set is written in one go.
+        """
         # Only apply for user partners (not external partners)
-        if not self.partner_id or not self.partner_id.user_ids:
+        partner_ids = self.partner_id.ids
+        if not partner_ids:
             return
+        users_by_partner = {}
+        for user in self.env['res.users'].search([('partner_id', 'in', partner_ids)]):
+            users_by_partner.setdefault(user.partner_id.id, user)
         
-        user = self.partner_id.user_ids[0]
-        
-        # Get user's preferences for this model
-        subtypes = user.get_notification_subtypes_for_model(self.res_model)
-        
-        if subtypes:
-            self.subtype_ids = subtypes
-            _logger.info(f"Applied global preferences for user {user.name} on {self.res_model}")
+        subtypes_by_key = {}
+        followers_by_subtypes = defaultdict(lambda: self.browse())
+        for follower in self:
+            user = users_by_partner.get(follower.partner_id.id)
+            if not user:
+                continue
+            key = (user.id, follower.res_model)
+            if key not in subtypes_by_key:
+                # Get user's preferences for this model
+                subtypes_by_key[key] = tuple(user.get_notification_subtypes_for_model(follower.res_model).ids)
+            if subtypes_by_key[key]:
+                followers_by_subtypes[subtypes_by_key[key]] |= follower
+        
+        for subtype_ids, followers in followers_by_subtypes.items():
+            followers.subtype_ids = [Command.set(subtype_ids)]
+        if followers_by_subtypes:
+            _logger.info(
+                "Applied global preferences to %d followers for %d user/model combinations",
+                sum(len(followers) for followers in followers_by_subtypes.values()),
+                len(subtypes_by_key)
+            )
     
     def action_apply_global_preferences(self):
         """Manual action to apply global preferences"""
-        for follower in self:
-            if follower.partner_id and follower.partner_id.user_ids:
-                follower._apply_global_preferences()
-        
+        self._apply_global_preferences()
         return True
     
     def action_override_preferences(self):
@@ -66,30 +79,6 @@ class MailFollowers(models.Model):
             },
         }
     
-    @api.model
-    def _add_followers(self, res_model, res_ids, partner_ids, channel_ids=None,
-                       check_existing=True, existing_policy='skip'):
-        """Override to apply global preferences to new followers"""
-        result = super()._add_followers(
-            res_model, res_ids, partner_ids, 
-            channel_ids=channel_ids,
-            check_existing=check_existing,
-            existing_policy=existing_policy
-        )
-        
-        # Apply global preferences to newly created followers
-        new_followers = self.search([
-            ('res_model', '=', res_model),
-            ('res_id', 'in', res_ids),
-            ('partner_id', 'in', partner_ids),
-        ])
-        
-        for follower in new_followers:
-            if follower.use_global_preferences:
-                follower._apply_global_preferences()
-        
-        return result
-    
     def _get_subscription_data(self, res_model, res_ids, partner_ids):
         """Override to inject global preferences into subscription data"""
         data = super()._get_subscription_data(res_model, res_ids, partner_ids)
@@ -0,0 +1,27 @@
+from odoo import models, api
+
+
+class MailMessageSubtype(models.Model):
+    _inherit = 'mail.message.subtype'
+    
+    def _register_hook(self):
+        """Materialize the default subtypes per notification mode at load"""
+        super()._register_hook()
+        self.env['res.users']._get_default_subtype_map()
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        subtypes = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return subtypes
+    
+    def write(self, vals):
+        res = super().write(vals)
+        if {'name', 'res_model'}.intersection(vals):
+            self.env.registry.clear_cache()
+        return res
+    
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
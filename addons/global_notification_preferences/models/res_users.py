@@ -1,8 +1,17 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from odoo.tools import frozendict
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Subtype name keywords selected by default per notification mode (None = all)
+DEFAULT_MODE_KEYWORDS = {
+    'default': None,
+    'important': ('message', 'comment', 'assign', 'stage', 'state'),
+    'minimal': ('message', 'comment'),
+    'custom': None,
+}
+
 
 class ResUsers(models.Model):
     _inherit = 'res.users'
@@ -143,28 +152,38 @@ class ResUsers(models.Model):
     
     def _get_default_subtypes_by_mode(self, model_name):
         """Get default subtypes based on user's notification mode"""
-        all_subtypes = self.env['mail.message.subtype'].search([
-            '|',
-            ('res_model', '=', model_name),
-            ('res_model', '=', False),
-        ])
-        
-        if self.notification_preference_mode == 'default':
-            return all_subtypes
-        
-        elif self.notification_preference_mode == 'important':
-            # Filter for important subtypes (messages, assignments, state changes)
-            important_keywords = ['message', 'comment', 'assign', 'stage', 'state']
-            domain = ['|'] * (len(important_keywords) - 1)
-            for keyword in important_keywords:
-                domain.append(('name', 'ilike', keyword))
-            
-            return all_subtypes.filtered_domain(domain)
+        subtype_ids = self._get_default_subtype_ids(model_name, self.notification_preference_mode or 'default')
+        return self.env['mail.message.subtype'].browse(subtype_ids)
+    
+    @api.model
+    @tools.ormcache('model_name', 'mode')
+    def _get_default_subtype_ids(self, model_name, mode):
+        """Default subtype ids for a (model, notification mode)"""
+        return tuple(
+            subtype_id
+            for res_model, subtype_id in self._get_default_subtype_map()[mode]
+            if not res_model or res_model == model_name
+        )
+    
+    @api.model
+    @tools.ormcache()
+    def _get_default_subtype_map(self):
+        """Subtypes matching each notification mode, in subtype order
         
-        elif self.notification_preference_mode == 'minimal':
-            # Only direct messages
-            return all_subtypes.filtered(
-                lambda s: 'message' in s.name.lower() or 'comment' in s.name.lower()
-            )
+        Built from all subtypes in one query and kept in the registry cache,
+        which is cleared whenever a ``mail.message.subtype`` changes.
         
-        return all_subtypes
\ No newline at end of file
+        :return: dict mode -> tuple of (res_model, subtype id)
+        """
+        subtypes = self.env['mail.message.subtype'].sudo().with_context(lang='en_US').search_read(
+            [], ['name', 'res_model'],
+        )
+        subtype_map = {mode: [] for mode in DEFAULT_MODE_KEYWORDS}
+        for subtype in subtypes:
+            name = (subtype['name'] or '').lower()
+            entry = (subtype['res_model'] or False, subtype['id'])
+            for mode, keywords in DEFAULT_MODE_KEYWORDS.items():
+                # Filter for matching subtypes, e.g. important: messages, assignments, state changes
+                if keywords is None or any(keyword in name for keyword in keywords):
+                    subtype_map[mode].append(entry)
+        return frozendict({mode: tuple(entries) for mode, entries in subtype_map.items()})
@@ -0,0 +1 @@
+from . import test_global_notification_preferences
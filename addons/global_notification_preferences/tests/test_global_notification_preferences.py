@@ -0,0 +1,153 @@
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestGlobalNotificationPreferences(TransactionCase):
+    
+    def setUp(self):
+        super().setUp()
+        Users = self.env['res.users'].with_context(no_reset_password=True)
+        self.user_minimal = Users.create({
+            'name': 'Minimal User',
+            'login': 'gnp_minimal',
+            'email': 'gnp_minimal@test.com',
+            'notification_preference_mode': 'minimal',
+        })
+        self.user_important = Users.create({
+            'name': 'Important User',
+            'login': 'gnp_important',
+            'email': 'gnp_important@test.com',
+            'notification_preference_mode': 'important',
+        })
+        self.external_partner = self.env['res.partner'].create({'name': 'External Follower'})
+        
+        Subtype = self.env['mail.message.subtype']
+        self.subtype_comment = Subtype.create({'name': 'Partner Comment Test', 'res_model': 'res.partner'})
+        self.subtype_stage = Subtype.create({'name': 'Partner Stage Test', 'res_model': 'res.partner'})
+        self.subtype_other = Subtype.create({'name': 'Partner Archived Test', 'res_model': 'res.partner'})
+        
+        self.documents = self.env['res.partner'].create([
+            {'name': 'Followed Partner 1'},
+            {'name': 'Followed Partner 2'},
+        ])
+    
+    def _create_followers(self, partners, **values):
+        return self.env['mail.followers'].create([
+            dict(values, res_model='res.partner', res_id=document.id, partner_id=partner.id)
+            for document in self.documents
+            for partner in partners
+        ])
+    
+    def test_new_followers_get_global_preferences(self):
+        """Test new followers receive the subtypes of their user's notification mode"""
+        partners = self.user_minimal.partner_id | self.user_important.partner_id | self.external_partner
+        followers = self._create_followers(partners)
+        
+        for user in self.user_minimal | self.user_important:
+            expected = user.get_notification_subtypes_for_model('res.partner')
+            user_followers = followers.filtered(lambda f: f.partner_id == user.partner_id)
+            self.assertEqual(len(user_followers), 2)
+            for follower in user_followers:
+                self.assertEqual(follower.subtype_ids, expected)
+                self.assertIn(self.subtype_comment, follower.subtype_ids)
+                self.assertNotIn(self.subtype_other, follower.subtype_ids)
+        
+        minimal_follower = followers.filtered(lambda f: f.partner_id == self.user_minimal.partner_id)[0]
+        important_follower = followers.filtered(lambda f: f.partner_id == self.user_important.partner_id)[0]
+        self.assertNotIn(self.subtype_stage, minimal_follower.subtype_ids)
+        self.assertIn(self.subtype_stage, important_follower.subtype_ids)
+        
+        # Partners without a user keep the subtypes they were created with
+        external_followers = followers.filtered(lambda f: f.partner_id == self.external_partner)
+        self.assertEqual(len(external_followers), 2)
+        self.assertFalse(external_followers.subtype_ids)
+    
+    def test_preference_record_overrides_mode(self):
+        """Test a per-model preference wins over the notification mode defaults"""
+        self.env['user.notification.preference'].create({
+            'user_id': self.user_minimal.id,
+            'model_id': self.env['ir.model']._get_id('res.partner'),
+            'subtype_ids': [(6, 0, [self.subtype_stage.id, self.subtype_other.id])],
+        })
+        followers = self._create_followers(self.user_minimal.partner_id | self.user_important.partner_id)
+        
+        minimal_followers = followers.filtered(lambda f: f.partner_id == self.user_minimal.partner_id)
+        for follower in minimal_followers:
+            self.assertEqual(follower.subtype_ids, self.subtype_stage | self.subtype_other)
+        important_followers = followers.filtered(lambda f: f.partner_id == self.user_important.partner_id)
+        for follower in important_followers:
+            self.assertEqual(follower.subtype_ids, self.user_important.get_notification_subtypes_for_model('res.partner'))
+    
+    def test_followers_without_global_preferences_untouched(self):
+        """Test followers opting out of global preferences keep their own subtypes"""
+        followers = self._create_followers(
+            self.user_minimal.partner_id,
+            use_global_preferences=False,
+            subtype_ids=[(6, 0, [self.subtype_other.id])],
+        )
+        for follower in followers:
+            self.assertEqual(follower.subtype_ids, self.subtype_other)
+        
+        followers.action_apply_global_preferences()
+        for follower in followers:
+            self.assertEqual(follower.subtype_ids, self.user_minimal.get_notification_subtypes_for_model('res.partner'))
+    
+    def test_muted_users_get_no_subtypes(self):
+        """Test users with email and inbox notifications off are left alone"""
+        self.user_minimal.write({'global_notify_email': False, 'global_notify_inbox': False})
+        followers = self._create_followers(
+            self.user_minimal.partner_id,
+            subtype_ids=[(6, 0, [self.subtype_other.id])],
+        )
+        for follower in followers:
+            self.assertEqual(follower.subtype_ids, self.subtype_other)
+    
+    def test_default_subtypes_by_mode(self):
+        """Test the default subtypes are filtered by mode and model"""
+        task_comment = self.env['mail.message.subtype'].create({'name': 'Task Comment Test', 'res_model': 'project.task'})
+        Users = self.env['res.users']
+        
+        minimal = set(Users._get_default_subtype_ids('res.partner', 'minimal'))
+        self.assertIn(self.subtype_comment.id, minimal)
+        self.assertNotIn(self.subtype_stage.id, minimal)
+        self.assertNotIn(task_comment.id, minimal)
+        self.assertIn(task_comment.id, Users._get_default_subtype_ids('project.task', 'minimal'))
+        
+        important = set(Users._get_default_subtype_ids('res.partner', 'important'))
+        self.assertTrue({self.subtype_comment.id, self.subtype_stage.id} <= important)
+        self.assertNotIn(self.subtype_other.id, important)
+        
+        everything = set(Users._get_default_subtype_ids('res.partner', 'default'))
+        self.assertTrue(
+            {self.subtype_comment.id, self.subtype_stage.id, self.subtype_other.id} <= everything
+        )
+        self.assertEqual(
+            self.user_minimal._get_default_subtypes_by_mode('res.partner').ids,
+            list(Users._get_default_subtype_ids('res.partner', 'minimal')),
+        )
+    
+    def test_default_subtypes_follow_subtype_changes(self):
+        """Test the cached default subtypes are refreshed when subtypes change"""
+        Users = self.env['res.users']
+        self.assertNotIn(self.subtype_other.id, Users._get_default_subtype_ids('res.partner', 'minimal'))
+        
+        # Renaming into a matching keyword adds the subtype
+        self.subtype_other.name = 'Partner Message Test'
+        self.assertIn(self.subtype_other.id, Users._get_default_subtype_ids('res.partner', 'minimal'))
+        
+        # Moving it to another model removes it for the partner model
+        self.subtype_other.res_model = 'project.task'
+        self.assertNotIn(self.subtype_other.id, Users._get_default_subtype_ids('res.partner', 'minimal'))
+        self.assertIn(self.subtype_other.id, Users._get_default_subtype_ids('project.task', 'minimal'))
+        
+        # New and deleted subtypes are picked up too
+        subtype_new = self.env['mail.message.subtype'].create({'name': 'Partner Comment Later', 'res_model': 'res.partner'})
+        self.assertIn(subtype_new.id, Users._get_default_subtype_ids('res.partner', 'minimal'))
+        comment_id = self.subtype_comment.id
+        self.subtype_comment.unlink()
+        self.assertNotIn(comment_id, Users._get_default_subtype_ids('res.partner', 'minimal'))
+        
+        # New followers use the refreshed defaults
+        followers = self._create_followers(self.user_minimal.partner_id)
+        for follower in followers:
+            self.assertIn(subtype_new, follower.subtype_ids)
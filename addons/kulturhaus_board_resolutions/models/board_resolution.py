@@ -122,20 +122,33 @@ class BoardResolution(models.Model):
 
     @api.depends('present_count')
     def _compute_total_board_members(self):
+        total_board_members = self.env['res.partner']._get_board_member_count()
         for resolution in self:
-            resolution.total_board_members = self.env['res.partner'].search_count([('board_member', '=', True)])
+            resolution.total_board_members = total_board_members
+
+    def _get_required_quorums(self):
+        """Required quorum per meeting type of the resolutions
+
+        The board size is counted once and every meeting type is evaluated
+        once, whatever the number of resolutions. Resolutions without a
+        meeting type (key ``False``) fall back to a simple majority.
+
+        :return: tuple (total board members, dict meeting type id -> quorum)
+        """
+        total_board_members = self.env['res.partner']._get_board_member_count()
+        required_quorums = {
+            meeting_type.id: meeting_type.calculate_quorum(total_board_members)
+            for meeting_type in self.meeting_type_id
+        }
+        required_quorums[False] = total_board_members // 2 + 1
+        return total_board_members, required_quorums
 
     @api.depends('present_count', 'total_board_members', 'meeting_type_id')
     def _compute_quorum_met(self):
+        total_board_members, required_quorums = self._get_required_quorums()
         for resolution in self:
-            if resolution.total_board_members > 0 and resolution.meeting_type_id:
-                required_quorum = resolution.meeting_type_id.calculate_quorum(resolution.total_board_members)
-                resolution.quorum_met = resolution.present_count >= required_quorum
-            elif resolution.total_board_members > 0:
-                # Fallback to simple majority
-                resolution.quorum_met = resolution.present_count > (resolution.total_board_members / 2)
-            else:
-                resolution.quorum_met = False
+            resolution.quorum_met = bool(total_board_members) and (
+                resolution.present_count >= required_quorums[resolution.meeting_type_id.id])
 
     @api.depends('votes_for', 'votes_against', 'votes_abstain')
     def _compute_total_votes(self):
@@ -144,10 +157,15 @@ class BoardResolution(models.Model):
 
     @api.depends('votes_for', 'votes_against', 'meeting_type_id')
     def _compute_result(self):
+        # Majority per (meeting type, votes cast), shared by all resolutions
+        majorities = {}
         for resolution in self:
             if resolution.meeting_type_id:
                 votes_cast = resolution.votes_for + resolution.votes_against
-                majority_needed = resolution.meeting_type_id.calculate_majority_needed(votes_cast)
+                key = (resolution.meeting_type_id.id, votes_cast)
+                if key not in majorities:
+                    majorities[key] = resolution.meeting_type_id.calculate_majority_needed(votes_cast)
+                majority_needed = majorities[key]
                 if resolution.votes_for >= majority_needed:
                     resolution.result = 'passed'
                 elif resolution.votes_against > (votes_cast - majority_needed):
@@ -190,15 +208,15 @@ class BoardResolution(models.Model):
 
     @api.constrains('present_count', 'meeting_type_id')
     def _check_quorum(self):
-        for resolution in self:
-            if resolution.state not in ('draft',) and not resolution.quorum_met:
-                if resolution.meeting_type_id:
-                    required = resolution.meeting_type_id.calculate_quorum(resolution.total_board_members)
-                    raise ValidationError(_('Quorum not met for %s. At least %d board members must be present.') % 
-                                        (resolution.meeting_type_id.name, required))
-                else:
-                    raise ValidationError(_('Quorum not met. At least %d board members must be present.') % 
-                                        (resolution.total_board_members // 2 + 1))
+        resolutions = self.filtered(lambda r: r.state not in ('draft',) and not r.quorum_met)
+        if not resolutions:
+            return
+        resolution = resolutions[0]
+        required = resolution._get_required_quorums()[1][resolution.meeting_type_id.id]
+        if resolution.meeting_type_id:
+            raise ValidationError(_('Quorum not met for %s. At least %d board members must be present.') % 
+                                (resolution.meeting_type_id.name, required))
+        raise ValidationError(_('Quorum not met. At least %d board members must be present.') % required)
 
     @api.constrains('votes_for', 'votes_against', 'votes_abstain', 'present_count')
     def _check_vote_count(self):
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields
+from odoo import models, fields, api, tools
 
 
 class ResPartner(models.Model):
@@ -24,6 +24,37 @@ class ResPartner(models.Model):
         help='Number of resolutions this member attended.'
     )
     
+    @api.model
+    @tools.ormcache()
+    def _get_board_member_count(self):
+        """Number of active board members, cached until a board member changes"""
+        return self.sudo().search_count([('board_member', '=', True)])
+
+    def _clear_board_member_cache(self):
+        self.env.registry.clear_cache()
+        self.env['board.resolution'].invalidate_model(['total_board_members'])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        partners = super().create(vals_list)
+        if any(vals.get('board_member') for vals in vals_list):
+            self._clear_board_member_cache()
+        return partners
+
+    def write(self, vals):
+        board_changed = 'board_member' in vals or ('active' in vals and any(self.mapped('board_member')))
+        res = super().write(vals)
+        if board_changed:
+            self._clear_board_member_cache()
+        return res
+
+    def unlink(self):
+        board_changed = any(self.mapped('board_member'))
+        res = super().unlink()
+        if board_changed:
+            self._clear_board_member_cache()
+        return res
+
     def _compute_resolutions_count(self):
         for partner in self:
             if partner.board_member:
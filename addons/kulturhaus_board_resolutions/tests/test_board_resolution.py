@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from odoo import Command
+from odoo.exceptions import ValidationError
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestBoardResolution(TransactionCase):
+    
+    def setUp(self):
+        super().setUp()
+        Partner = self.env['res.partner']
+        
+        # Start from a board of exactly six members
+        Partner.search([('board_member', '=', True)]).board_member = False
+        self.members = Partner.create([
+            {'name': f'Board Member {index}', 'board_member': True}
+            for index in range(6)
+        ])
+        
+        MeetingType = self.env['board.meeting.type']
+        self.type_half = MeetingType.create({
+            'name': 'Half + 1',
+            'quorum_type': 'half_plus_one',
+            'voting_majority': 'simple',
+        })
+        self.type_two_thirds = MeetingType.create({
+            'name': 'Two Thirds',
+            'quorum_type': 'two_thirds',
+            'voting_majority': 'two_thirds',
+        })
+        self.type_all = MeetingType.create({
+            'name': 'All',
+            'quorum_type': 'all',
+            'voting_majority': 'unanimous',
+        })
+        self.type_fixed = MeetingType.create({
+            'name': 'Fixed',
+            'quorum_type': 'fixed',
+            'quorum_fixed': 2,
+            'voting_majority': 'simple',
+        })
+    
+    def _create_resolutions(self, vals_list):
+        return self.env['board.resolution'].create([{
+            'title': 'Test Resolution',
+            'resolution_text': '<p>Test</p>',
+            'voting_mode': 'secret',
+            **vals,
+        } for vals in vals_list])
+    
+    def _present(self, count):
+        return [Command.set(self.members[:count].ids)]
+    
+    def test_board_member_count_follows_partners(self):
+        """Test the cached board size is refreshed when board members change"""
+        Partner = self.env['res.partner']
+        resolution = self._create_resolutions([{'meeting_type_id': self.type_half.id}])
+        self.assertEqual(Partner._get_board_member_count(), 6)
+        self.assertEqual(resolution.total_board_members, 6)
+        
+        self.members[0].board_member = False
+        self.assertEqual(Partner._get_board_member_count(), 5)
+        self.assertEqual(resolution.total_board_members, 5)
+        
+        self.members[1].active = False
+        self.assertEqual(Partner._get_board_member_count(), 4)
+        
+        new_member = Partner.create({'name': 'New Board Member', 'board_member': True})
+        self.assertEqual(Partner._get_board_member_count(), 5)
+        
+        new_member.unlink()
+        self.assertEqual(Partner._get_board_member_count(), 4)
+        self.assertEqual(resolution.total_board_members, 4)
+    
+    def test_quorum_for_several_meeting_types(self):
+        """Test quorum is evaluated per meeting type within one recordset"""
+        resolutions = self._create_resolutions([
+            {'meeting_type_id': self.type_half.id, 'present_members': self._present(4)},
+            {'meeting_type_id': self.type_half.id, 'present_members': self._present(3)},
+            {'meeting_type_id': self.type_two_thirds.id, 'present_members': self._present(3)},
+            {'meeting_type_id': self.type_all.id, 'present_members': self._present(5)},
+            {'meeting_type_id': self.type_all.id, 'present_members': self._present(6)},
+            {'meeting_type_id': self.type_fixed.id, 'present_members': self._present(2)},
+        ])
+        self.assertEqual(resolutions.mapped('quorum_met'), [True, False, False, False, True, True])
+        
+        required_quorums = resolutions._get_required_quorums()[1]
+        self.assertEqual(required_quorums[self.type_half.id], 4)
+        self.assertEqual(required_quorums[self.type_two_thirds.id], 4)
+        self.assertEqual(required_quorums[self.type_all.id], 6)
+        self.assertEqual(required_quorums[self.type_fixed.id], 2)
+        self.assertEqual(required_quorums[False], 4)
+    
+    def test_result_for_several_majorities(self):
+        """Test the result is evaluated per meeting type and vote count"""
+        resolutions = self._create_resolutions([
+            {'meeting_type_id': self.type_half.id, 'votes_for': 3, 'votes_against': 2},
+            {'meeting_type_id': self.type_half.id, 'votes_for': 2, 'votes_against': 3},
+            {'meeting_type_id': self.type_two_thirds.id, 'votes_for': 4, 'votes_against': 3},
+            {'meeting_type_id': self.type_two_thirds.id, 'votes_for': 5, 'votes_against': 2},
+            {'meeting_type_id': self.type_all.id, 'votes_for': 4, 'votes_against': 0},
+            {'meeting_type_id': self.type_all.id, 'votes_for': 3, 'votes_against': 1},
+        ])
+        self.assertEqual(
+            resolutions.mapped('result'),
+            ['passed', 'rejected', 'rejected', 'passed', 'passed', 'rejected'],
+        )
+    
+    def test_check_quorum(self):
+        """Test voted resolutions without quorum are rejected with the required count"""
+        with self.assertRaisesRegex(ValidationError, 'At least 6 board members'):
+            self._create_resolutions([{
+                'meeting_type_id': self.type_all.id,
+                'present_members': self._present(5),
+                'votes_for': 5,
+                'state': 'voted',
+            }])
+        
+        resolution = self._create_resolutions([{
+            'meeting_type_id': self.type_half.id,
+            'present_members': self._present(4),
+            'votes_for': 4,
+            'state': 'voted',
+        }])
+        self.assertTrue(resolution.quorum_met)
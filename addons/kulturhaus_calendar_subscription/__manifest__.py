@@ -36,6 +36,7 @@ Technical Details:
     'data': [
         'security/ir.model.access.csv',
         'security/calendar_subscription_security.xml',
+        'data/ir_cron.xml',
         'views/calendar_subscription_views.xml',
         'views/res_users_views.xml',
     ],
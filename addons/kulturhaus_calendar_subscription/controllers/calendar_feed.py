@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
 import hashlib
 import logging
+import re
 import pytz
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from werkzeug.exceptions import NotFound
+from werkzeug.http import http_date
+from werkzeug.wsgi import wrap_file
 
-from odoo import http, fields
+from odoo import http
 from odoo.http import request
+from odoo.tools import SQL
+from odoo.tools.lru import LRU
 
 try:
     from icalendar import Calendar, Event, vCalAddress, vText, Timezone
@@ -17,6 +22,26 @@ except ImportError:
 
 _logger = logging.getLogger(__name__)
 
+BERLIN_TZ = pytz.timezone('Europe/Berlin')
+HTML_TAG_RE = re.compile('<.*?>')
+ICAL_FOOTER = b'END:VCALENDAR\r\n'
+MAX_ATTENDEES = 20
+
+# Rendered VEVENT blocks shared by all subscriptions of this worker, keyed by
+# (db, event id, last change of the event data, include_private)
+FRAGMENT_CACHE = LRU(4096)
+
+STATUS_MAP = {
+    'draft': 'TENTATIVE',
+    'confirmed': 'CONFIRMED',
+    'cancelled': 'CANCELLED',
+}
+CLASS_MAP = {
+    'public': 'PUBLIC',
+    'private': 'PRIVATE',
+    'confidential': 'CONFIDENTIAL',
+}
+
 
 class CalendarFeedController(http.Controller):
     
@@ -29,12 +54,10 @@ class CalendarFeedController(http.Controller):
         if not Calendar:
             return request.not_found()
         
-        # Find token using hash for security
+        # Find token using hash for security (cached per worker)
         token_hash = hashlib.sha256(token.encode()).hexdigest()
-        subscription = request.env['calendar.subscription.token'].sudo().search([
-            ('token_hash', '=', token_hash),
-            ('active', '=', True)
-        ], limit=1)
+        Token = request.env['calendar.subscription.token'].sudo()
+        subscription = Token._get_feed_settings(token_hash)
         
         if not subscription:
             _logger.warning(f'Invalid or inactive calendar token accessed: {token[:8]}...')
@@ -43,47 +66,78 @@ class CalendarFeedController(http.Controller):
         # Get user agent for tracking
         user_agent = request.httprequest.headers.get('User-Agent', '')
         
-        # Update access tracking
-        subscription.sudo().write({
-            'last_accessed': fields.Datetime.now(),
-            'access_count': subscription.access_count + 1,
-            'last_user_agent': user_agent[:200],  # Limit length
-        })
-        
-        # Generate iCal content
-        try:
-            cal_content = self._generate_ical(subscription, user_agent)
-        except Exception as e:
-            _logger.error(f'Error generating calendar for token {subscription.id}: {str(e)}')
-            return request.not_found()
+        # Fingerprint the matching events before rendering anything
+        fingerprint = Token._get_feed_fingerprint(subscription)
+        client = self._get_client_type(user_agent)
+        version = Token._get_feed_version(subscription, client, fingerprint)
+        # The client family only changes the calendar header, not when the content changed
+        content_version = Token._get_feed_version(subscription, fingerprint=fingerprint)
+        
+        # Buffer access tracking with the served content, the flush cron updates the token later
+        Token._record_feed_access(subscription['id'], user_agent, content_version)
+        last_modified = Token._get_feed_changed_at(subscription['id'], content_version)
+        last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
         
-        # Prepare response headers
+        # Clients must revalidate, but may keep their copy for conditional requests
         headers = [
-            ('Content-Type', 'text/calendar; charset=utf-8'),
-            ('Content-Disposition', f'inline; filename="kulturhaus_calendar_{subscription.id}.ics"'),
-            ('Cache-Control', 'no-cache, no-store, must-revalidate'),
-            ('Pragma', 'no-cache'),
-            ('Expires', '0'),
+            ('Cache-Control', 'private, no-cache'),
+            ('ETag', f'"{version}"'),
+            ('Last-Modified', http_date(last_modified)),
             ('X-Robots-Tag', 'noindex, nofollow'),
         ]
         
-        # Add caching headers to help calendar clients
-        if cal_content:
-            # Add ETag for cache validation
-            content_hash = hashlib.md5(cal_content).hexdigest()
-            headers.append(('ETag', f'"{content_hash}"'))
-            
-            # Add Last-Modified header
-            last_modified = datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')
-            headers.append(('Last-Modified', last_modified))
-            
+        if self._is_not_modified(version, last_modified):
+            return request.make_response(b'', headers=headers, status=304)
+        
+        # Serve the rendered feed from cache unless events or settings changed
+        feed_file = Token._open_cached_feed(subscription['id'], version, client)
+        if feed_file is None:
+            try:
+                feed_file = Token._store_feed_cache(
+                    subscription['id'], version, self._generate_ical(subscription, user_agent), client
+                )
+            except Exception as e:
+                _logger.error(f'Error generating calendar for token {subscription["id"]}: {str(e)}')
+                return request.not_found()
+        
+        headers += [
+            ('Content-Type', 'text/calendar; charset=utf-8'),
+            ('Content-Disposition', f'inline; filename="kulturhaus_calendar_{subscription["id"]}.ics"'),
             # Suggest refresh interval (not all clients respect this)
-            headers.append(('X-PUBLISHED-TTL', 'PT30M'))  # 30 minutes
+            ('X-PUBLISHED-TTL', 'PT30M'),  # 30 minutes
+        ]
         
-        return request.make_response(cal_content, headers=headers)
+        return request.make_response(wrap_file(request.httprequest.environ, feed_file), headers=headers)
+    
+    def _is_not_modified(self, version, last_modified):
+        """Evaluate If-None-Match / If-Modified-Since against the feed state"""
+        httprequest = request.httprequest
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+        if httprequest.if_none_match:
+            return httprequest.if_none_match.contains_weak(version)
+        if_modified_since = httprequest.if_modified_since
+        if if_modified_since:
+            if if_modified_since.tzinfo is None:
+                if_modified_since = if_modified_since.replace(tzinfo=timezone.utc)
+            return last_modified <= if_modified_since
+        return False
+    
+    def _get_client_type(self, user_agent):
+        """Client family, the only part of the User-Agent that affects the feed"""
+        if 'Darwin' in user_agent or 'iOS' in user_agent:
+            return 'apple'
+        if 'Google' in user_agent:
+            return 'google'
+        return 'default'
     
     def _generate_ical(self, subscription, user_agent=''):
-        """Generate iCal content for the subscription"""
+        """Generate iCal content for the subscription settings.
+        
+        All data is fetched eagerly in a handful of batched reads; the returned
+        generator only serializes plain values, one VEVENT at a time, so it can
+        be consumed after the request cursor is gone and memory stays flat.
+        VEVENT blocks are shared between subscriptions through FRAGMENT_CACHE.
+        """
         cal = Calendar()
         
         # Calendar properties
@@ -91,8 +145,8 @@ class CalendarFeedController(http.Controller):
         cal.add('version', '2.0')
         cal.add('calscale', 'GREGORIAN')
         cal.add('method', 'PUBLISH')
-        cal.add('x-wr-calname', f'Kulturhaus - {subscription.name}')
-        cal.add('x-wr-caldesc', f'Calendar subscription for {subscription.user_id.name}')
+        cal.add('x-wr-calname', f'Kulturhaus - {subscription["name"]}')
+        cal.add('x-wr-caldesc', f'Calendar subscription for {subscription["user_name"]}')
         cal.add('x-wr-timezone', 'Europe/Berlin')
         
         # Add proper VTIMEZONE component for Apple Calendar compatibility
@@ -100,133 +154,186 @@ class CalendarFeedController(http.Controller):
         cal.add_component(berlin_tz)
         
         # Refresh interval hint based on client
-        if 'Darwin' in user_agent or 'iOS' in user_agent:
+        client_type = self._get_client_type(user_agent)
+        if client_type == 'apple':
             cal.add('x-apple-calendar-color', '#2196F3')  # Blue color for Apple Calendar
             cal.add('refresh-interval;value=duration', 'PT15M')  # 15 minutes for Apple
-        elif 'Google' in user_agent:
+        elif client_type == 'google':
             cal.add('refresh-interval;value=duration', 'PT1H')  # 1 hour for Google (they cache heavily anyway)
         else:
             cal.add('refresh-interval;value=duration', 'PT30M')  # 30 minutes default
         
-        # Get calendar events
-        domain = subscription.get_calendar_domain()
-        events = request.env['calendar.event'].sudo().search(domain, order='start asc')
-        
-        _logger.info(f'Generating calendar feed for subscription {subscription.id}: {len(events)} events')
-        
-        # Add events to calendar
-        for event in events:
-            ical_event = Event()
-            
-            # Unique ID (important for updates)
-            ical_event.add('uid', f'odoo-event-{event.id}@kulturhaus-bortfeld.de')
-            
-            # Basic properties
-            ical_event.add('summary', event.name or 'Untitled Event')
-            
-            # Handle timezone properly - NO DOUBLE CONVERSION
-            if event.allday:
-                # All-day events should be date only (no timezone conversion needed)
-                ical_event.add('dtstart', event.start_date)
-                ical_event.add('dtend', event.stop_date)
+        # Split the serialized calendar around its closing line so the events
+        # can be streamed in between
+        header = cal.to_ical()
+        header = header[:-len(ICAL_FOOTER)]
+        
+        feed_data = self._fetch_feed_data(subscription)
+        _logger.info(f'Generating calendar feed for subscription {subscription["id"]}: {len(feed_data["events"])} events')
+        
+        return self._serialize_ical(header, feed_data, subscription['include_private'])
+    
+    def _fetch_feed_data(self, subscription):
+        """Bulk-read the events of the subscription and everything they reference.
+        
+        Only ids and change stamps are read for all events; the full data is
+        read for events whose VEVENT is not in the shared fragment cache yet.
+        """
+        Token = request.env['calendar.subscription.token'].sudo()
+        Event = request.env['calendar.event'].sudo()
+        # Attendees are only rendered together with private data
+        include_private = subscription['include_private']
+        query = Event._search(Token._build_calendar_domain(subscription), order='start asc')
+        request.env.cr.execute(query.select(
+            SQL.identifier(Event._table, 'id'),
+            Token._get_event_stamp_sql(include_private),
+        ))
+        dbname = request.env.cr.dbname
+        event_keys = [
+            (event_id, (dbname, event_id, stamp, include_private))
+            for event_id, stamp in request.env.cr.fetchall()
+        ]
+        fragments = {}
+        missing_ids = []
+        for event_id, key in event_keys:
+            fragment = FRAGMENT_CACHE.get(key)
+            if fragment is None:
+                missing_ids.append(event_id)
             else:
-                # Regular events - Odoo stores datetime in UTC, need to convert to Berlin timezone
-                try:
-                    # Get datetimes from Odoo (stored as UTC)
-                    start_dt = event.start
-                    stop_dt = event.stop
-                    
-                    BERLIN_TZ = pytz.timezone('Europe/Berlin')
-                    UTC_TZ = pytz.UTC
-                    
-                    # If timezone-naive (stored as UTC), localize as UTC first
-                    if start_dt.tzinfo is None:
-                        start_dt = UTC_TZ.localize(start_dt)
-                        _logger.debug(f'Event {event.id} start was naive, localized as UTC: {start_dt}')
-                    
-                    if stop_dt.tzinfo is None:
-                        stop_dt = UTC_TZ.localize(stop_dt)
-                        _logger.debug(f'Event {event.id} stop was naive, localized as UTC: {stop_dt}')
-                    
-                    # Convert from UTC to Berlin timezone
-                    start_berlin = start_dt.astimezone(BERLIN_TZ)
-                    stop_berlin = stop_dt.astimezone(BERLIN_TZ)
-                    
-                    _logger.debug(f'Event {event.id} converted times: start={start_berlin}, stop={stop_berlin}')
-                    
-                    # Add events with proper Berlin timezone
-                    ical_event.add('dtstart', start_berlin)
-                    ical_event['dtstart'].params['TZID'] = 'Europe/Berlin'
-                    ical_event.add('dtend', stop_berlin)
-                    ical_event['dtend'].params['TZID'] = 'Europe/Berlin'
-                    
-                except Exception as e:
-                    _logger.error(f'Error processing event {event.id} timezone: {str(e)}')
-                    # Skip this event to prevent calendar corruption
-                    continue
-            
-            # Timestamps
-            ical_event.add('dtstamp', fields.Datetime.from_string(event.write_date or event.create_date))
-            ical_event.add('created', fields.Datetime.from_string(event.create_date))
-            ical_event.add('last-modified', fields.Datetime.from_string(event.write_date or event.create_date))
-            
-            # Optional fields
-            if event.location:
-                ical_event.add('location', event.location)
-            
-            if event.description:
-                # Clean HTML from description
-                description = event.description
-                # Simple HTML stripping (you might want to use html2text for better results)
-                import re
-                description = re.sub('<.*?>', '', description)
-                ical_event.add('description', description)
-            
-            # Categories from event types
-            if event.categ_ids:
-                categories = [cat.name for cat in event.categ_ids]
-                ical_event.add('categories', categories)
-            
-            # Status
-            if hasattr(event, 'state'):
-                status_map = {
-                    'draft': 'TENTATIVE',
-                    'confirmed': 'CONFIRMED',
-                    'cancelled': 'CANCELLED',
-                }
-                status = status_map.get(event.state, 'CONFIRMED')
-                ical_event.add('status', status)
-            
-            # Privacy
-            if event.privacy:
-                class_map = {
-                    'public': 'PUBLIC',
-                    'private': 'PRIVATE',
-                    'confidential': 'CONFIDENTIAL',
-                }
-                ical_event.add('class', class_map.get(event.privacy, 'PUBLIC'))
-            
-            # Organizer (event creator)
-            if event.user_id and event.user_id.email:
-                organizer = vCalAddress(f'MAILTO:{event.user_id.email}')
-                organizer.params['cn'] = vText(event.user_id.name)
-                ical_event.add('organizer', organizer, encode=0)
-            
-            # Attendees (only if including private data)
-            if subscription.include_private and event.partner_ids:
-                for partner in event.partner_ids[:20]:  # Limit to prevent huge files
-                    if partner.email:
-                        attendee = vCalAddress(f'MAILTO:{partner.email}')
-                        attendee.params['cn'] = vText(partner.name)
-                        attendee.params['role'] = vText('REQ-PARTICIPANT')
-                        ical_event.add('attendee', attendee, encode=0)
-            
-            # Skip alarms for now - can be added later
-            
-            cal.add_component(ical_event)
-        
-        # Return the calendar as bytes
-        return cal.to_ical()
+                fragments[key] = fragment
+        
+        event_fields = [
+            'name', 'allday', 'start', 'stop', 'start_date', 'stop_date',
+            'create_date', 'write_date', 'location', 'description',
+            'privacy', 'categ_ids', 'user_id', 'partner_ids',
+        ]
+        if 'state' in Event._fields:
+            event_fields.append('state')
+        records = self._read_by_id('calendar.event', missing_ids, event_fields)
+        
+        organizer_ids = {event['user_id'][0] for event in records.values() if event['user_id']}
+        category_ids = {categ_id for event in records.values() for categ_id in event['categ_ids']}
+        attendee_ids = set()
+        if include_private:
+            for event in records.values():
+                attendee_ids.update(event['partner_ids'][:MAX_ATTENDEES])
+        
+        return {
+            'events': event_keys,
+            'fragments': fragments,
+            'records': records,
+            'organizers': self._read_by_id('res.users', organizer_ids, ['name', 'email']),
+            'categories': self._read_by_id('calendar.event.type', category_ids, ['name']),
+            'attendees': self._read_by_id('res.partner', attendee_ids, ['name', 'email']),
+        }
+    
+    def _read_by_id(self, model, ids, field_names):
+        if not ids:
+            return {}
+        records = request.env[model].sudo().browse(ids).read(field_names)
+        return {record['id']: record for record in records}
+    
+    def _serialize_ical(self, header, feed_data, include_private):
+        """Yield the feed as bytes chunks, one VEVENT per chunk"""
+        yield header
+        for event_id, key in feed_data['events']:
+            vevent = feed_data['fragments'].get(key)
+            if vevent is None:
+                # Events skipped by the serializer are cached as empty fragments
+                vevent = self._serialize_event(feed_data['records'][event_id], feed_data, include_private) or b''
+                FRAGMENT_CACHE[key] = vevent
+            if vevent:
+                yield vevent
+        yield ICAL_FOOTER
+    
+    def _serialize_event(self, event, feed_data, include_private):
+        """Serialize one event read by ``_fetch_feed_data`` to VEVENT bytes"""
+        ical_event = Event()
+        
+        # Unique ID (important for updates)
+        ical_event.add('uid', f'odoo-event-{event["id"]}@kulturhaus-bortfeld.de')
+        
+        # Basic properties
+        ical_event.add('summary', event['name'] or 'Untitled Event')
+        
+        # Handle timezone properly - NO DOUBLE CONVERSION
+        if event['allday']:
+            # All-day events should be date only (no timezone conversion needed)
+            ical_event.add('dtstart', event['start_date'])
+            ical_event.add('dtend', event['stop_date'])
+        else:
+            # Regular events - Odoo stores datetime in UTC, need to convert to Berlin timezone
+            try:
+                start_dt = event['start']
+                stop_dt = event['stop']
+                
+                # If timezone-naive (stored as UTC), localize as UTC first
+                if start_dt.tzinfo is None:
+                    start_dt = pytz.UTC.localize(start_dt)
+                if stop_dt.tzinfo is None:
+                    stop_dt = pytz.UTC.localize(stop_dt)
+                
+                # Add events with proper Berlin timezone
+                ical_event.add('dtstart', start_dt.astimezone(BERLIN_TZ))
+                ical_event['dtstart'].params['TZID'] = 'Europe/Berlin'
+                ical_event.add('dtend', stop_dt.astimezone(BERLIN_TZ))
+                ical_event['dtend'].params['TZID'] = 'Europe/Berlin'
+                
+            except Exception as e:
+                _logger.error(f'Error processing event {event["id"]} timezone: {str(e)}')
+                # Skip this event to prevent calendar corruption
+                return None
+        
+        # Timestamps
+        ical_event.add('dtstamp', event['write_date'] or event['create_date'])
+        ical_event.add('created', event['create_date'])
+        ical_event.add('last-modified', event['write_date'] or event['create_date'])
+        
+        # Optional fields
+        if event['location']:
+            ical_event.add('location', event['location'])
+        
+        if event['description']:
+            # Simple HTML stripping (you might want to use html2text for better results)
+            ical_event.add('description', HTML_TAG_RE.sub('', event['description']))
+        
+        # Categories from event types
+        categories = [
+            feed_data['categories'][categ_id]['name']
+            for categ_id in event['categ_ids']
+            if categ_id in feed_data['categories']
+        ]
+        if categories:
+            ical_event.add('categories', categories)
+        
+        # Status
+        if 'state' in event:
+            ical_event.add('status', STATUS_MAP.get(event['state'], 'CONFIRMED'))
+        
+        # Privacy
+        if event['privacy']:
+            ical_event.add('class', CLASS_MAP.get(event['privacy'], 'PUBLIC'))
+        
+        # Organizer (event creator)
+        organizer = event['user_id'] and feed_data['organizers'].get(event['user_id'][0])
+        if organizer and organizer['email']:
+            organizer_address = vCalAddress(f'MAILTO:{organizer["email"]}')
+            organizer_address.params['cn'] = vText(organizer['name'])
+            ical_event.add('organizer', organizer_address, encode=0)
+        
+        # Attendees (only if including private data)
+        if include_private:
+            for partner_id in event['partner_ids'][:MAX_ATTENDEES]:  # Limit to prevent huge files
+                partner = feed_data['attendees'].get(partner_id)
+                if partner and partner['email']:
+                    attendee = vCalAddress(f'MAILTO:{partner["email"]}')
+                    attendee.params['cn'] = vText(partner['name'])
+                    attendee.params['role'] = vText('REQ-PARTICIPANT')
+                    ical_event.add('attendee', attendee, encode=0)
+        
+        # Skip alarms for now - can be added later
+        
+        return ical_event.to_ical()
     
     def _create_berlin_timezone(self):
         """Create proper VTIMEZONE component for Europe/Berlin with DST rules"""
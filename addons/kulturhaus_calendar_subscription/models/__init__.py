@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 from . import calendar_subscription_token
+from . import res_partner
 from . import res_users
\ No newline at end of file
@@ -1,13 +1,36 @@
 # -*- coding: utf-8 -*-
+import os
+import glob
 import secrets
 import hashlib
 import logging
+import time
 from datetime import datetime, timedelta
 from odoo import models, fields, api
 from odoo.exceptions import UserError
+from odoo.tools import SQL, frozendict
+from odoo.tools.lru import LRU
 
 _logger = logging.getLogger(__name__)
 
+# Unlogged side table buffering feed hits until the flush cron aggregates them
+ACCESS_LOG_TABLE = 'calendar_subscription_access_log'
+
+# Feed settings per (db, token hash) of this worker, as (expiry, cache
+# generation, settings)
+FEED_SETTINGS_CACHE = LRU(1024)
+# Seconds cached feed settings are trusted; changes that are not signalled
+# through the registry (e.g. renaming the subscriber) are picked up after at
+# most this delay
+FEED_SETTINGS_TTL = 60
+
+# Fields that influence the rendered feed; changing them invalidates the caches
+FEED_SETTINGS_FIELDS = {
+    'name', 'user_id', 'active', 'include_private',
+    'calendar_types', 'days_past', 'days_future',
+    'token', 'token_hash',
+}
+
 
 class CalendarSubscriptionToken(models.Model):
     _name = 'calendar.subscription.token'
@@ -84,6 +107,17 @@ class CalendarSubscriptionToken(models.Model):
         readonly=True,
         help='Calendar application that last accessed this feed'
     )
+    feed_version = fields.Char(
+        string='Feed Version',
+        readonly=True,
+        copy=False
+    )
+    feed_changed_at = fields.Datetime(
+        string='Feed Changed',
+        readonly=True,
+        copy=False,
+        help='Last time the content of this feed changed, served as Last-Modified'
+    )
     
     # URLs
     subscription_url = fields.Char(
@@ -99,6 +133,29 @@ class CalendarSubscriptionToken(models.Model):
         store=False
     )
     
+    def init(self):
+        # UNLOGGED: hits are cheap to insert and losing a few on a crash is fine
+        self.env.cr.execute(SQL(
+            """
+            CREATE UNLOGGED TABLE IF NOT EXISTS %s (
+                token_id INTEGER NOT NULL,
+                accessed_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'UTC'),
+                user_agent VARCHAR
+            )
+            """,
+            SQL.identifier(ACCESS_LOG_TABLE),
+        ))
+        # Content version served by each hit, see ``_get_feed_changed_at``
+        self.env.cr.execute(SQL(
+            "ALTER TABLE %s ADD COLUMN IF NOT EXISTS feed_version VARCHAR",
+            SQL.identifier(ACCESS_LOG_TABLE),
+        ))
+        self.env.cr.execute(SQL(
+            "CREATE INDEX IF NOT EXISTS %s ON %s (token_id)",
+            SQL.identifier(f'{ACCESS_LOG_TABLE}_token_id_index'),
+            SQL.identifier(ACCESS_LOG_TABLE),
+        ))
+    
     @api.model_create_multi
     def create(self, vals_list):
         # Handle both single dict and list of dicts
@@ -111,7 +168,28 @@ class CalendarSubscriptionToken(models.Model):
                 raw_token = secrets.token_urlsafe(32)
                 vals['token'] = raw_token
                 vals['token_hash'] = hashlib.sha256(raw_token.encode()).hexdigest()
-        return super().create(vals_list)
+        records = super().create(vals_list)
+        # A miss for the new token may have been cached already
+        records._invalidate_feed_settings()
+        return records
+    
+    def write(self, vals):
+        if FEED_SETTINGS_FIELDS.intersection(vals):
+            self._invalidate_feed_cache()
+            self._invalidate_feed_settings()
+        res = super().write(vals)
+        if FEED_SETTINGS_FIELDS.intersection(vals):
+            self._invalidate_feed_settings()
+            # Deactivated or rotated tokens must stop working on all workers
+            self.env.registry.clear_cache()
+        return res
+    
+    def unlink(self):
+        self._invalidate_feed_cache()
+        self._invalidate_feed_settings()
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
     
     @api.depends('token')
     def _compute_subscription_url(self):
@@ -167,9 +245,84 @@ class CalendarSubscriptionToken(models.Model):
             }
         }
     
+    @api.model
+    def _record_feed_access(self, token_id, user_agent, feed_version=None):
+        """Buffer a feed hit without locking or writing the token row"""
+        self.env.cr.execute(SQL(
+            "INSERT INTO %s (token_id, user_agent, feed_version) VALUES (%s, %s, %s)",
+            SQL.identifier(ACCESS_LOG_TABLE),
+            token_id,
+            user_agent[:200],  # Limit length
+            feed_version,
+        ))
+    
+    @api.model
+    def flush_access_log(self):
+        """Cron job folding the buffered feed hits into the usage statistics.
+        
+        Also stores the content version of the latest hit, together with the
+        time it was first served, as the feed change time.
+        """
+        self.env.cr.execute(SQL(
+            """
+            WITH hits AS (
+                DELETE FROM %(log)s
+                RETURNING token_id, accessed_at, user_agent, feed_version
+            ), totals AS (
+                SELECT token_id,
+                       COUNT(*) AS hit_count,
+                       MAX(accessed_at) AS last_accessed,
+                       (ARRAY_AGG(user_agent ORDER BY accessed_at DESC))[1] AS last_user_agent,
+                       (ARRAY_AGG(feed_version ORDER BY accessed_at DESC)
+                            FILTER (WHERE feed_version IS NOT NULL))[1] AS feed_version
+                  FROM hits
+              GROUP BY token_id
+            ), replaced AS (
+                -- last hit serving another version than the latest one
+                SELECT totals.token_id, MAX(hits.accessed_at) AS accessed_at
+                  FROM totals
+                  JOIN hits ON hits.token_id = totals.token_id
+                           AND hits.feed_version <> totals.feed_version
+              GROUP BY totals.token_id
+            ), changes AS (
+                -- first hit serving the latest version after that
+                SELECT totals.token_id, MIN(hits.accessed_at) AS changed_at
+                  FROM totals
+                  JOIN hits ON hits.token_id = totals.token_id
+                           AND hits.feed_version = totals.feed_version
+             LEFT JOIN replaced ON replaced.token_id = totals.token_id
+                 WHERE hits.accessed_at > COALESCE(replaced.accessed_at, '-infinity'::timestamp)
+              GROUP BY totals.token_id
+            )
+            UPDATE %(token)s token
+               SET access_count = COALESCE(token.access_count, 0) + totals.hit_count,
+                   last_accessed = GREATEST(token.last_accessed, totals.last_accessed),
+                   last_user_agent = totals.last_user_agent,
+                   feed_version = COALESCE(totals.feed_version, token.feed_version),
+                   feed_changed_at = CASE
+                       WHEN totals.feed_version IS NULL
+                         OR (replaced.accessed_at IS NULL AND token.feed_version = totals.feed_version)
+                       THEN token.feed_changed_at
+                       ELSE COALESCE(changes.changed_at, totals.last_accessed)
+                   END
+              FROM totals
+         LEFT JOIN replaced ON replaced.token_id = totals.token_id
+         LEFT JOIN changes ON changes.token_id = totals.token_id
+             WHERE token.id = totals.token_id
+            """,
+            log=SQL.identifier(ACCESS_LOG_TABLE),
+            token=SQL.identifier(self._table),
+        ))
+        if self.env.cr.rowcount:
+            _logger.info(f'Flushed feed access statistics of {self.env.cr.rowcount} calendar subscriptions')
+        self.invalidate_model([
+            'access_count', 'last_accessed', 'last_user_agent', 'feed_version', 'feed_changed_at',
+        ])
+    
     @api.model
     def cleanup_old_unused_tokens(self):
         """Cron job to cleanup tokens not used in 180 days"""
+        self.flush_access_log()
         cutoff_date = datetime.now() - timedelta(days=180)
         unused_tokens = self.search([
             ('last_accessed', '<', cutoff_date),
@@ -182,23 +335,27 @@ class CalendarSubscriptionToken(models.Model):
     def get_calendar_domain(self):
         """Build domain for calendar events based on token settings"""
         self.ensure_one()
-        
+        return self._build_calendar_domain(self._get_feed_settings_values())
+    
+    @api.model
+    def _build_calendar_domain(self, settings):
+        """Build the calendar event domain from ``_get_feed_settings_values``"""
         # Base domain with user and time range
         domain = [
             '|',
-            ('user_id', '=', self.user_id.id),
-            ('partner_ids', 'in', self.user_id.partner_id.id),
-            ('start', '>=', datetime.now() - timedelta(days=self.days_past)),
-            ('start', '<=', datetime.now() + timedelta(days=self.days_future)),
+            ('user_id', '=', settings['user_id']),
+            ('partner_ids', 'in', settings['partner_id']),
+            ('start', '>=', datetime.now() - timedelta(days=settings['days_past'])),
+            ('start', '<=', datetime.now() + timedelta(days=settings['days_future'])),
         ]
         
         # Privacy filter
-        if not self.include_private:
+        if not settings['include_private']:
             domain.append(('privacy', '!=', 'private'))
         
         # Event type filter
-        if self.calendar_types:
-            domain.append(('categ_ids', 'in', self.calendar_types.ids))
+        if settings['calendar_type_ids']:
+            domain.append(('categ_ids', 'in', list(settings['calendar_type_ids'])))
         
         return domain
     
@@ -208,4 +365,239 @@ class CalendarSubscriptionToken(models.Model):
             if record.days_past < 0 or record.days_past > 365:
                 raise UserError('Days in past must be between 0 and 365')
             if record.days_future < 0 or record.days_future > 730:
-                raise UserError('Days in future must be between 0 and 730')
\ No newline at end of file
+                raise UserError('Days in future must be between 0 and 730')
+    
+    # ------------------------------------------------------------------
+    # Feed settings lookup cache
+    # ------------------------------------------------------------------
+    
+    @api.model
+    def _get_feed_settings(self, token_hash):
+        """Settings of the active subscription with ``token_hash``, or None.
+        
+        Cached per worker in a bounded LRU for ``FEED_SETTINGS_TTL`` seconds.
+        Changes drop the entries of the changed tokens on this worker right
+        away. Writing, deactivating or revoking a token also clears the
+        registry cache; the entries remember the registry cache sequence they
+        were read under, so other workers drop them as soon as the signal
+        reaches them, without waiting for the TTL.
+        """
+        key = (self.env.cr.dbname, token_hash)
+        generation = self.env.registry.cache_sequences.get('default')
+        now = time.monotonic()
+        entry = FEED_SETTINGS_CACHE.get(key)
+        if entry is not None and entry[0] > now and entry[1] == generation:
+            return entry[2]
+        subscription = self.sudo().search([
+            ('token_hash', '=', token_hash),
+            ('active', '=', True)
+        ], limit=1)
+        settings = subscription._get_feed_settings_values() if subscription else None
+        FEED_SETTINGS_CACHE[key] = (now + FEED_SETTINGS_TTL, generation, settings)
+        return settings
+    
+    def _invalidate_feed_settings(self):
+        """Drop the cached feed settings of these subscriptions on this worker"""
+        dbname = self.env.cr.dbname
+        for record in self.sudo():
+            try:
+                del FEED_SETTINGS_CACHE[(dbname, record.token_hash)]
+            except KeyError:
+                pass
+    
+    def _get_feed_settings_values(self):
+        """Plain, immutable snapshot of everything the feed endpoint needs"""
+        self.ensure_one()
+        return frozendict({
+            'id': self.id,
+            'name': self.name,
+            'user_id': self.user_id.id,
+            'user_name': self.user_id.name,
+            'partner_id': self.user_id.partner_id.id,
+            'include_private': self.include_private,
+            'calendar_type_ids': tuple(sorted(self.calendar_types.ids)),
+            'days_past': self.days_past,
+            'days_future': self.days_future,
+        })
+    
+    # ------------------------------------------------------------------
+    # Rendered feed cache
+    # ------------------------------------------------------------------
+    
+    @api.model
+    def _get_feed_cache_dir(self):
+        """Directory in the filestore holding the rendered iCal feeds"""
+        cache_dir = os.path.join(self.env['ir.attachment']._filestore(), 'calendar_feeds')
+        os.makedirs(cache_dir, exist_ok=True)
+        return cache_dir
+    
+    @api.model
+    def _get_feed_cache_path(self, token_id, version, client='default'):
+        return os.path.join(self._get_feed_cache_dir(), f'{token_id}-{client}-{version}.ics')
+    
+    @api.model
+    def _get_event_stamp_sql(self, include_private):
+        """SQL expression of the last change of anything rendered into a VEVENT.
+        
+        Organizer, category and (with private data) attendee names are part of
+        the feed, but renaming them does not touch the event's write_date; the
+        write_date of those records is folded in, so a rename only retires the
+        fragments and feeds of the events that show it.
+        """
+        Event = self.env['calendar.event']
+        event_id = SQL.identifier(Event._table, 'id')
+        categories = Event._fields['categ_ids']
+        stamps = [
+            SQL.identifier(Event._table, 'write_date'),
+            SQL(
+                "(SELECT p.write_date FROM res_users u JOIN res_partner p ON p.id = u.partner_id WHERE u.id = %s)",
+                SQL.identifier(Event._table, 'user_id'),
+            ),
+            SQL(
+                "(SELECT MAX(t.write_date) FROM %s r JOIN calendar_event_type t ON t.id = r.%s WHERE r.%s = %s)",
+                SQL.identifier(categories.relation), SQL.identifier(categories.column2),
+                SQL.identifier(categories.column1), event_id,
+            ),
+        ]
+        if include_private:
+            attendees = Event._fields['partner_ids']
+            stamps.append(SQL(
+                "(SELECT MAX(p.write_date) FROM %s r JOIN res_partner p ON p.id = r.%s WHERE r.%s = %s)",
+                SQL.identifier(attendees.relation), SQL.identifier(attendees.column2),
+                SQL.identifier(attendees.column1), event_id,
+            ))
+        return SQL("GREATEST(%s)", SQL(", ").join(stamps))
+    
+    @api.model
+    def _get_feed_fingerprint(self, settings):
+        """Cheap fingerprint of the events matching a subscription.
+        
+        A single aggregate query over the subscription domain, returning
+        ``(count, last change, md5 of the sorted ids)``. Any edit of an event or
+        of the data rendered with it moves the last change (see
+        ``_get_event_stamp_sql``) and adding/removing events changes the ids,
+        so the fingerprint changes exactly when the feed content would.
+        """
+        Event = self.env['calendar.event'].sudo()
+        Event.flush_model()
+        self.env['res.partner'].flush_model(['write_date'])
+        self.env['calendar.event.type'].flush_model(['write_date'])
+        query = Event._search(self._build_calendar_domain(settings))
+        event_id = SQL.identifier(Event._table, 'id')
+        self.env.cr.execute(query.select(
+            SQL('COUNT(*)'),
+            SQL('MAX(%s)', self._get_event_stamp_sql(settings['include_private'])),
+            SQL("MD5(STRING_AGG(%s::text, ',' ORDER BY %s))", event_id, event_id),
+        ))
+        return self.env.cr.fetchone()
+    
+    @api.model
+    def _get_feed_version(self, settings, client='default', fingerprint=None):
+        """Content version of the feed, used as cache key and ETag"""
+        count, max_write_date, ids_hash = fingerprint or self._get_feed_fingerprint(settings)
+        key = (
+            count,
+            max_write_date and max_write_date.isoformat(),
+            ids_hash,
+            settings['name'],
+            settings['user_id'],
+            settings['user_name'],
+            settings['include_private'],
+            settings['calendar_type_ids'],
+            settings['days_past'],
+            settings['days_future'],
+            client,
+        )
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+    
+    @api.model
+    def _get_feed_changed_at(self, token_id, version):
+        """Time the feed content last changed, i.e. ``version`` was first served.
+        
+        Read-only: every hit buffers the version it served (see
+        ``_record_feed_access``) and the flush cron folds the latest version
+        and its change time into the token. Until then, the change time is the
+        first buffered hit of ``version`` after the last hit of another one.
+        Deleted events or events leaving the date window move it too, unlike
+        the events' write dates.
+        """
+        self.env.cr.execute(SQL(
+            """
+            WITH replaced AS (
+                SELECT MAX(accessed_at) AS accessed_at
+                  FROM %(log)s
+                 WHERE token_id = %(token_id)s
+                   AND feed_version <> %(version)s
+            ), pending AS (
+                SELECT MIN(log.accessed_at) AS accessed_at
+                  FROM %(log)s log, replaced
+                 WHERE log.token_id = %(token_id)s
+                   AND log.feed_version = %(version)s
+                   AND log.accessed_at > COALESCE(replaced.accessed_at, '-infinity'::timestamp)
+            )
+            SELECT COALESCE(
+                       CASE WHEN replaced.accessed_at IS NULL AND token.feed_version = %(version)s
+                            THEN token.feed_changed_at END,
+                       pending.accessed_at,
+                       NOW() AT TIME ZONE 'UTC'
+                   )
+              FROM %(token)s token, replaced, pending
+             WHERE token.id = %(token_id)s
+            """,
+            log=SQL.identifier(ACCESS_LOG_TABLE),
+            token=SQL.identifier(self._table),
+            token_id=token_id,
+            version=version,
+        ))
+        return self.env.cr.fetchone()[0]
+    
+    @api.model
+    def _open_cached_feed(self, token_id, version, client='default'):
+        """Open the rendered feed for ``version``, or return None on a cache miss"""
+        try:
+            return open(self._get_feed_cache_path(token_id, version, client), 'rb')
+        except FileNotFoundError:
+            return None
+    
+    @api.model
+    def _store_feed_cache(self, token_id, version, chunks, client='default'):
+        """Write the feed chunk by chunk and drop older versions of the subscription.
+        
+        Only versions rendered for the same client family are dropped, so
+        clients polling the same subscription keep their own feed.
+        Returns the stored feed opened for reading. The handle is opened before
+        the file is published so a concurrent invalidation cannot pull it away.
+        """
+        path = self._get_feed_cache_path(token_id, version, client)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as feed_file:
+                for chunk in chunks:
+                    feed_file.write(chunk)
+            feed_file = open(tmp_path, 'rb')
+            os.replace(tmp_path, path)
+        except Exception:
+            self._remove_feed_cache_file(tmp_path)
+            raise
+        for stale_path in glob.glob(os.path.join(self._get_feed_cache_dir(), f'{token_id}-{client}-*.ics')):
+            if stale_path != path:
+                self._remove_feed_cache_file(stale_path)
+        return feed_file
+    
+    def _invalidate_feed_cache(self):
+        """Drop all cached renderings of these subscriptions"""
+        if not self.ids:
+            return
+        cache_dir = self._get_feed_cache_dir()
+        for record_id in self.ids:
+            for path in glob.glob(os.path.join(cache_dir, f'{record_id}-*.ics')):
+                self._remove_feed_cache_file(path)
+    
+    @api.model
+    def _remove_feed_cache_file(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            _logger.warning(f'Could not remove cached calendar feed {path}: {str(e)}')
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from odoo import models
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+    
+    def write(self, vals):
+        res = super().write(vals)
+        # The subscriber's own name is part of the cached feed settings
+        if 'name' in vals:
+            subscriptions = self.env['calendar.subscription.token'].sudo().with_context(active_test=False).search([
+                ('user_id.partner_id', 'in', self.ids),
+            ])
+            subscriptions._invalidate_feed_settings()
+        return res
@@ -0,0 +1,507 @@
+# -*- coding: utf-8 -*-
+import glob
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from icalendar import Calendar
+from werkzeug.http import http_date, parse_date
+
+from odoo import fields
+from odoo.tests import HttpCase, TransactionCase, tagged
+from odoo.tools import SQL
+
+from ..controllers.calendar_feed import FRAGMENT_CACHE, CalendarFeedController
+from ..models import calendar_subscription_token
+from ..models.calendar_subscription_token import ACCESS_LOG_TABLE, FEED_SETTINGS_TTL
+
+
+@tagged('post_install', '-at_install')
+class TestCalendarSubscription(TransactionCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.user = self.env['res.users'].with_context(no_reset_password=True).create({
+            'name': 'Feed User',
+            'login': 'feed_user',
+            'email': 'feed_user@test.com',
+        })
+        self.Token = self.env['calendar.subscription.token']
+        self.subscription = self.Token.create({
+            'name': 'Work Phone',
+            'user_id': self.user.id,
+        })
+        self.addCleanup(self._remove_cached_feeds, self.subscription.id)
+    
+    def _remove_cached_feeds(self, token_id):
+        for path in glob.glob(os.path.join(self.Token._get_feed_cache_dir(), f'{token_id}-*.ics')):
+            os.remove(path)
+    
+    def _read_cached_feed(self, token_id, version, client='default'):
+        feed_file = self.Token._open_cached_feed(token_id, version, client)
+        if feed_file is None:
+            return None
+        with feed_file:
+            return feed_file.read()
+    
+    def test_feed_cache_store_and_open(self):
+        """Test a stored feed is served for its version only and replaces older versions"""
+        token_id = self.subscription.id
+        self.assertIsNone(self._read_cached_feed(token_id, 'v1'))
+        
+        with self.Token._store_feed_cache(token_id, 'v1', iter([b'BEGIN:', b'VCALENDAR\r\n'])) as feed_file:
+            self.assertEqual(feed_file.read(), b'BEGIN:VCALENDAR\r\n')
+        self.assertEqual(self._read_cached_feed(token_id, 'v1'), b'BEGIN:VCALENDAR\r\n')
+        self.assertIsNone(self._read_cached_feed(token_id, 'v2'))
+        
+        self.Token._store_feed_cache(token_id, 'v2', [b'v2']).close()
+        self.assertEqual(self._read_cached_feed(token_id, 'v2'), b'v2')
+        self.assertIsNone(self._read_cached_feed(token_id, 'v1'))
+        
+        # A failing rendering leaves the stored feed and no temporary file behind
+        def failing_chunks():
+            yield b'partial'
+            raise ValueError('rendering failed')
+        with self.assertRaises(ValueError):
+            self.Token._store_feed_cache(token_id, 'v3', failing_chunks())
+        self.assertEqual(self._read_cached_feed(token_id, 'v2'), b'v2')
+        self.assertEqual(
+            glob.glob(os.path.join(self.Token._get_feed_cache_dir(), f'{token_id}-*')),
+            [self.Token._get_feed_cache_path(token_id, 'v2')],
+        )
+    
+    def test_feed_cache_per_client(self):
+        """Test clients of the same subscription keep their own stored feed"""
+        token_id = self.subscription.id
+        self.Token._store_feed_cache(token_id, 'v1-default', [b'default'], 'default').close()
+        self.Token._store_feed_cache(token_id, 'v1-apple', [b'apple'], 'apple').close()
+        self.assertEqual(self._read_cached_feed(token_id, 'v1-default'), b'default')
+        self.assertEqual(self._read_cached_feed(token_id, 'v1-apple', 'apple'), b'apple')
+        
+        # A new version only replaces the older version of the same client
+        self.Token._store_feed_cache(token_id, 'v2-apple', [b'apple v2'], 'apple').close()
+        self.assertIsNone(self._read_cached_feed(token_id, 'v1-apple', 'apple'))
+        self.assertEqual(self._read_cached_feed(token_id, 'v2-apple', 'apple'), b'apple v2')
+        self.assertEqual(self._read_cached_feed(token_id, 'v1-default'), b'default')
+        
+        # Settings changes drop the feeds of all clients
+        self.subscription.days_past = 30
+        self.assertIsNone(self._read_cached_feed(token_id, 'v2-apple', 'apple'))
+        self.assertIsNone(self._read_cached_feed(token_id, 'v1-default'))
+    
+    def test_feed_cache_invalidated_on_settings_change(self):
+        """Test settings changes drop the stored feeds, other changes keep them"""
+        other = self.Token.create({'name': 'Tablet', 'user_id': self.user.id})
+        self.addCleanup(self._remove_cached_feeds, other.id)
+        self.Token._store_feed_cache(self.subscription.id, 'v1', [b'feed']).close()
+        self.Token._store_feed_cache(other.id, 'v1', [b'other feed']).close()
+        
+        self.subscription.write({'last_user_agent': 'iOS/17.0'})
+        self.assertEqual(self._read_cached_feed(self.subscription.id, 'v1'), b'feed')
+        
+        self.subscription.days_past = 30
+        self.assertIsNone(self._read_cached_feed(self.subscription.id, 'v1'))
+        self.assertEqual(self._read_cached_feed(other.id, 'v1'), b'other feed')
+        
+        self.Token._store_feed_cache(self.subscription.id, 'v2', [b'feed']).close()
+        self.subscription.include_private = True
+        self.assertIsNone(self._read_cached_feed(self.subscription.id, 'v2'))
+        
+        other_id = other.id
+        other.unlink()
+        self.assertIsNone(self._read_cached_feed(other_id, 'v1'))
+    
+    def _record_hit(self, token_id, version, accessed_at):
+        self.env.cr.execute(SQL(
+            "INSERT INTO %s (token_id, accessed_at, feed_version) VALUES (%s, %s, %s)",
+            SQL.identifier(ACCESS_LOG_TABLE), token_id, accessed_at, version,
+        ))
+    
+    def test_feed_changed_at_follows_version(self):
+        """Test the change time only moves with the served version, without writing the token"""
+        token_id = self.subscription.id
+        write_date = self.subscription.write_date
+        last_week = fields.Datetime.now().replace(microsecond=0) - timedelta(days=7)
+        yesterday = last_week + timedelta(days=6)
+        self._record_hit(token_id, 'v1', last_week)
+        self._record_hit(token_id, 'v1', yesterday)
+        self.assertEqual(self.Token._get_feed_changed_at(token_id, 'v1'), last_week)
+        
+        self.Token._record_feed_access(token_id, 'iOS/17.0', 'v2')
+        changed_at = self.Token._get_feed_changed_at(token_id, 'v2')
+        self.assertGreater(changed_at, yesterday)
+        self.assertRecordValues(self.subscription, [{
+            'feed_version': False,
+            'feed_changed_at': False,
+            'write_date': write_date,
+        }])
+        
+        # The cron stores the latest version with the time it was first served
+        self.Token.flush_access_log()
+        self.assertRecordValues(self.subscription, [{
+            'feed_version': 'v2',
+            'feed_changed_at': changed_at,
+            'access_count': 3,
+            'write_date': write_date,
+        }])
+        self.assertEqual(self.Token._get_feed_changed_at(token_id, 'v2'), changed_at)
+        
+        # Later hits of the same version keep the change time, going back to
+        # an earlier version is a change again
+        self._record_hit(token_id, 'v2', changed_at + timedelta(hours=1))
+        self.assertEqual(self.Token._get_feed_changed_at(token_id, 'v2'), changed_at)
+        self._record_hit(token_id, 'v1', changed_at + timedelta(hours=2))
+        self.assertEqual(self.Token._get_feed_changed_at(token_id, 'v1'), changed_at + timedelta(hours=2))
+        self.Token.flush_access_log()
+        self.assertRecordValues(self.subscription, [{
+            'feed_version': 'v1',
+            'feed_changed_at': changed_at + timedelta(hours=2),
+            'access_count': 5,
+        }])
+    
+    def test_feed_version(self):
+        """Test the feed version follows the fingerprint, the settings and the client"""
+        settings = self.subscription._get_feed_settings_values()
+        fingerprint = (1, datetime(2026, 1, 1), 'hash')
+        version = self.Token._get_feed_version(settings, fingerprint=fingerprint)
+        self.assertEqual(version, self.Token._get_feed_version(settings, fingerprint=fingerprint))
+        self.assertNotEqual(version, self.Token._get_feed_version(settings, 'apple', fingerprint))
+        self.assertNotEqual(version, self.Token._get_feed_version(
+            settings, fingerprint=(1, datetime(2026, 1, 2), 'hash')))
+        self.assertNotEqual(version, self.Token._get_feed_version(
+            settings, fingerprint=(1, datetime(2026, 1, 1), 'other hash')))
+        
+        self.subscription.days_future = 30
+        settings = self.subscription._get_feed_settings_values()
+        self.assertNotEqual(version, self.Token._get_feed_version(settings, fingerprint=fingerprint))
+    
+    def test_feed_settings_cache(self):
+        """Test the cached feed settings are dropped on changes and expire after the TTL"""
+        token_hash = self.subscription.token_hash
+        settings = self.Token._get_feed_settings(token_hash)
+        self.assertEqual(settings['id'], self.subscription.id)
+        self.assertEqual(settings['user_name'], 'Feed User')
+        self.assertEqual(settings['days_past'], 60)
+        
+        # Changes made elsewhere are only seen once the entry expires
+        self.env.cr.execute(
+            "UPDATE calendar_subscription_token SET days_past = 10 WHERE id = %s", (self.subscription.id,),
+        )
+        self.subscription.invalidate_recordset()
+        self.assertEqual(self.Token._get_feed_settings(token_hash)['days_past'], 60)
+        expired = time.monotonic() + FEED_SETTINGS_TTL + 1
+        with patch.object(calendar_subscription_token.time, 'monotonic', return_value=expired):
+            self.assertEqual(self.Token._get_feed_settings(token_hash)['days_past'], 10)
+        
+        # ... or once another worker signals a registry cache invalidation
+        self.env.cr.execute(
+            "UPDATE calendar_subscription_token SET active = FALSE WHERE id = %s", (self.subscription.id,),
+        )
+        self.subscription.invalidate_recordset()
+        self.assertTrue(self.Token._get_feed_settings(token_hash))
+        sequences = self.env.registry.cache_sequences
+        with patch.dict(sequences, {'default': (sequences.get('default') or 0) + 1}):
+            self.assertIsNone(self.Token._get_feed_settings(token_hash))
+        self.env.cr.execute(
+            "UPDATE calendar_subscription_token SET active = TRUE WHERE id = %s", (self.subscription.id,),
+        )
+        self.subscription.invalidate_recordset()
+        
+        # Changes made through the ORM are seen right away
+        self.subscription.days_future = 100
+        self.assertEqual(self.Token._get_feed_settings(token_hash)['days_future'], 100)
+        self.user.partner_id.name = 'Renamed User'
+        self.assertEqual(self.Token._get_feed_settings(token_hash)['user_name'], 'Renamed User')
+        self.subscription.active = False
+        self.assertIsNone(self.Token._get_feed_settings(token_hash))
+        self.subscription.active = True
+        self.assertEqual(self.Token._get_feed_settings(token_hash)['id'], self.subscription.id)
+    
+    def test_feed_settings_signalled(self):
+        """Test writes, deactivations and revocations are signalled to the other workers"""
+        with patch.object(type(self.env.registry), 'clear_cache') as clear_cache:
+            self.subscription.write({'last_user_agent': 'iOS/17.0'})
+            clear_cache.assert_not_called()
+            self.subscription.days_past = 30
+            clear_cache.assert_called_once()
+            clear_cache.reset_mock()
+            self.subscription.active = False
+            clear_cache.assert_called_once()
+            clear_cache.reset_mock()
+            self.subscription.action_revoke_token()
+            clear_cache.assert_called_once()
+    
+    def test_feed_settings_cache_misses(self):
+        """Test unknown tokens are cached too, until a token with that hash appears"""
+        token = 'test-token-not-yet-created'
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        self.assertIsNone(self.Token._get_feed_settings(token_hash))
+        
+        subscription = self.Token.create({
+            'name': 'Laptop',
+            'user_id': self.user.id,
+            'token': token,
+            'token_hash': token_hash,
+        })
+        self.assertEqual(self.Token._get_feed_settings(token_hash)['id'], subscription.id)
+        
+        # A new token retires the old one
+        old_hash = self.subscription.token_hash
+        self.assertTrue(self.Token._get_feed_settings(old_hash))
+        self.subscription.write({'token': 'rotated-token', 'token_hash': 'rotated-hash'})
+        self.assertIsNone(self.Token._get_feed_settings(old_hash))
+        self.assertEqual(self.Token._get_feed_settings('rotated-hash')['id'], self.subscription.id)
+        
+        subscription.unlink()
+        self.assertIsNone(self.Token._get_feed_settings(token_hash))
+
+
+@tagged('post_install', '-at_install')
+class TestCalendarFeed(HttpCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.user = self.env['res.users'].with_context(no_reset_password=True).create({
+            'name': 'Feed User',
+            'login': 'feed_user',
+            'email': 'feed_user@test.com',
+        })
+        self.subscription = self.env['calendar.subscription.token'].create({
+            'name': 'Work Phone',
+            'user_id': self.user.id,
+        })
+        self.addCleanup(self.subscription._invalidate_feed_cache)
+        start = fields.Datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.event = self.env['calendar.event'].create({
+            'name': 'Vorstandssitzung',
+            'user_id': self.user.id,
+            'partner_ids': [(6, 0, self.user.partner_id.ids)],
+            'start': start,
+            'stop': start + timedelta(hours=2),
+        })
+        self.feed_url = f'/calendar/ics/{self.subscription.token}.ics'
+        FRAGMENT_CACHE.clear()
+    
+    def _get_feed(self, headers=None, url=None):
+        self.env.flush_all()
+        return self.url_open(url or self.feed_url, headers=headers)
+    
+    def _get_events(self, response):
+        self.assertEqual(response.status_code, 200)
+        return {
+            str(vevent['uid']): vevent
+            for vevent in Calendar.from_ical(response.content).walk('VEVENT')
+        }
+    
+    def _uid(self, event):
+        return f'odoo-event-{event.id}@kulturhaus-bortfeld.de'
+    
+    def _age(self, records):
+        """Move the write date of ``records`` back, as if written in an earlier transaction"""
+        records.flush_recordset()
+        self.env.cr.execute(SQL(
+            "UPDATE %s SET write_date = write_date - INTERVAL '1 day' WHERE id = ANY(%s)",
+            SQL.identifier(records._table), records.ids,
+        ))
+        records.invalidate_recordset(['write_date'])
+    
+    def test_feed_unknown_token(self):
+        """Test unknown and inactive tokens are not found"""
+        self.assertEqual(self.url_open('/calendar/ics/unknown.ics').status_code, 404)
+        self.subscription.active = False
+        self.assertEqual(self._get_feed().status_code, 404)
+    
+    def test_feed_revoked_token(self):
+        """Test a revoked token stops serving the feed right away"""
+        self.assertEqual(self._get_feed().status_code, 200)
+        self.subscription.active = False
+        self.assertEqual(self._get_feed().status_code, 404)
+        self.subscription.active = True
+        self.assertEqual(self._get_feed().status_code, 200)
+        self.subscription.action_revoke_token()
+        self.assertEqual(self._get_feed().status_code, 404)
+    
+    def test_feed_conditional_get(self):
+        """Test conditional requests are answered with 304 until the feed changes"""
+        response = self._get_feed()
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        last_modified = response.headers['Last-Modified']
+        # Serving the feed does not write the token, the cron stores the change time
+        self.subscription.invalidate_recordset()
+        self.assertFalse(self.subscription.feed_changed_at)
+        self.env['calendar.subscription.token'].flush_access_log()
+        changed_at = self.subscription.feed_changed_at.replace(tzinfo=timezone.utc, microsecond=0)
+        self.assertEqual(parse_date(last_modified), changed_at)
+        
+        response = self._get_feed({'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertFalse(response.content)
+        self.assertEqual(self._get_feed({'If-Modified-Since': last_modified}).status_code, 304)
+        self.assertEqual(
+            self._get_feed({'If-Modified-Since': http_date(changed_at - timedelta(seconds=1))}).status_code, 200,
+        )
+        # If-None-Match wins over If-Modified-Since
+        self.assertEqual(
+            self._get_feed({'If-None-Match': '"other"', 'If-Modified-Since': last_modified}).status_code, 200,
+        )
+        
+        # Other clients get their own version of the same content
+        response = self._get_feed({'User-Agent': 'iOS/17.0 dataaccessd/1.0', 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.headers['Last-Modified'], last_modified)
+        
+        # Removing an event changes the version, also without a newer write date
+        self.event.unlink()
+        response = self._get_feed({'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+    
+    def test_feed_content(self):
+        """Test the feed holds the subscribed events with their data"""
+        category = self.env['calendar.event.type'].create({'name': 'Vorstand'})
+        guest = self.env['res.partner'].create({'name': 'Gast', 'email': 'gast@test.com'})
+        start = self.event.start
+        self.event.write({
+            'categ_ids': [(6, 0, category.ids)],
+            'location': 'Kulturhaus',
+            'description': '<p>Tagesordnung</p>',
+            'partner_ids': [(4, guest.id)],
+        })
+        private_event = self.env['calendar.event'].create({
+            'name': 'Privat',
+            'user_id': self.user.id,
+            'partner_ids': [(6, 0, self.user.partner_id.ids)],
+            'privacy': 'private',
+            'start': start,
+            'stop': start + timedelta(hours=1),
+        })
+        far_event = self.event.copy({'name': 'Später', 'start': start + timedelta(days=500),
+                                     'stop': start + timedelta(days=500, hours=1)})
+        other_event = self.env['calendar.event'].create({
+            'name': 'Fremd',
+            'user_id': self.env.ref('base.user_admin').id,
+            'partner_ids': [(6, 0, guest.ids)],
+            'start': start,
+            'stop': start + timedelta(hours=1),
+        })
+        
+        response = self._get_feed()
+        self.assertTrue(response.content.startswith(b'BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(response.content.endswith(b'END:VCALENDAR\r\n'))
+        self.assertIn(b'BEGIN:VTIMEZONE', response.content)
+        self.assertEqual(response.headers['Content-Type'], 'text/calendar; charset=utf-8')
+        events = self._get_events(response)
+        self.assertEqual(set(events), {self._uid(self.event)})
+        for event in (private_event, far_event, other_event):
+            self.assertNotIn(self._uid(event), events)
+        
+        vevent = events[self._uid(self.event)]
+        self.assertEqual(str(vevent['summary']), 'Vorstandssitzung')
+        self.assertEqual(str(vevent['location']), 'Kulturhaus')
+        self.assertEqual(str(vevent['description']), 'Tagesordnung')
+        self.assertEqual([str(category) for category in vevent['categories'].cats], ['Vorstand'])
+        self.assertIn('feed_user@test.com', str(vevent['organizer']))
+        self.assertEqual(vevent.decoded('dtstart').astimezone(timezone.utc).replace(tzinfo=None), start)
+        self.assertNotIn('attendee', vevent)
+        
+        # Private events and attendees only come with private data
+        self.subscription.include_private = True
+        events = self._get_events(self._get_feed())
+        self.assertEqual(set(events), {self._uid(self.event), self._uid(private_event)})
+        attendees = events[self._uid(self.event)].get('attendee')
+        attendees = attendees if isinstance(attendees, list) else [attendees]
+        self.assertIn('MAILTO:gast@test.com', [str(attendee) for attendee in attendees])
+        
+        # Restricting the event types filters the events
+        self.subscription.calendar_types = self.env['calendar.event.type'].create({'name': 'Andere'})
+        self.assertEqual(self._get_events(self._get_feed()), {})
+    
+    def test_feed_rendered_once(self):
+        """Test feeds are served from the feed cache and share rendered events"""
+        self._age(self.event)
+        self._age(self.user.partner_id)
+        serialize = patch.object(
+            CalendarFeedController, '_serialize_event',
+            autospec=True, side_effect=CalendarFeedController._serialize_event,
+        )
+        with serialize as serialize_event:
+            response = self._get_feed()
+            self.assertEqual(serialize_event.call_count, 1)
+            version = response.headers['ETag'].strip('"')
+            feed_file = self.subscription._open_cached_feed(self.subscription.id, version)
+            self.assertIsNotNone(feed_file)
+            feed_file.close()
+            
+            # The stored feed is served as is
+            self.assertEqual(self._get_feed().content, response.content)
+            self.assertEqual(serialize_event.call_count, 1)
+            
+            # Other subscriptions reuse the rendered event
+            other = self.env['calendar.subscription.token'].create({'name': 'Tablet', 'user_id': self.user.id})
+            self.addCleanup(other._invalidate_feed_cache)
+            events = self._get_events(self._get_feed(url=f'/calendar/ics/{other.token}.ics'))
+            self.assertEqual(set(events), {self._uid(self.event)})
+            self.assertEqual(serialize_event.call_count, 1)
+            
+            # A changed event is rendered again
+            self.event.name = 'Mitgliederversammlung'
+            events = self._get_events(self._get_feed())
+            self.assertEqual(str(events[self._uid(self.event)]['summary']), 'Mitgliederversammlung')
+            self.assertEqual(serialize_event.call_count, 2)
+    
+    def test_feed_fingerprint(self):
+        """Test the fingerprint moves with the data rendered into the events"""
+        Token = self.env['calendar.subscription.token']
+        category = self.env['calendar.event.type'].create({'name': 'Vorstand'})
+        guest = self.env['res.partner'].create({'name': 'Gast', 'email': 'gast@test.com'})
+        self.event.write({'categ_ids': [(6, 0, category.ids)], 'partner_ids': [(4, guest.id)]})
+        self._age(self.event)
+        self._age(self.user.partner_id | guest)
+        self._age(category)
+        
+        public = self.subscription._get_feed_settings_values()
+        self.subscription.include_private = True
+        private = self.subscription._get_feed_settings_values()
+        
+        def get_fingerprints():
+            return Token._get_feed_fingerprint(public), Token._get_feed_fingerprint(private)
+        
+        fingerprints = get_fingerprints()
+        self.assertEqual(fingerprints[0][0], 1)
+        self.assertEqual(fingerprints[1][0], 1)
+        
+        # Attendees are only rendered with private data
+        guest.name = 'Gast Umbenannt'
+        public_fingerprint, private_fingerprint = get_fingerprints()
+        self.assertEqual(public_fingerprint, fingerprints[0])
+        self.assertNotEqual(private_fingerprint, fingerprints[1])
+        self._age(guest)
+        self.assertEqual(get_fingerprints(), fingerprints)
+        
+        # Categories and the organizer are rendered into every feed
+        for record in (category, self.user.partner_id):
+            record.name = f'{record.name} Neu'
+            public_fingerprint, private_fingerprint = get_fingerprints()
+            self.assertNotEqual(public_fingerprint, fingerprints[0])
+            self.assertNotEqual(private_fingerprint, fingerprints[1])
+            self._age(record)
+            self.assertEqual(get_fingerprints(), fingerprints)
+        
+        # Other events only change the fingerprint when they are part of the feed
+        self.env['calendar.event'].create({
+            'name': 'Fremd',
+            'user_id': self.env.ref('base.user_admin').id,
+            'partner_ids': [(6, 0, self.env.ref('base.user_admin').partner_id.ids)],
+            'start': self.event.start,
+            'stop': self.event.stop,
+        })
+        self.assertEqual(get_fingerprints(), fingerprints)
+        self.event.copy()
+        public_fingerprint, private_fingerprint = get_fingerprints()
+        self.assertEqual(public_fingerprint[0], 2)
+        self.assertNotEqual(public_fingerprint[2], fingerprints[0][2])
@@ -37,8 +37,10 @@ while preserving all existing functionality.
     'data': [
         'security/groups.xml',
         'security/ir.model.access.csv',
+        'data/dashboard_kpi_data.xml',
         'views/dashboard_view.xml',
         'views/dashboard_card_config_views.xml',
+        'views/dashboard_kpi_views.xml',
         'views/res_users_view.xml',
         'views/user_profile_views.xml',
         'views/menu.xml',
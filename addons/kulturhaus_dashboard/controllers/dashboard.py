@@ -12,12 +12,8 @@ class DashboardController(http.Controller):
         """Return dashboard data including KPIs and user-configured cards"""
         user = request.env.user
         
-        # KPI calculation
-        kpis = {
-            'total_members': self._get_members_count(),
-            'upcoming_events': self._get_upcoming_events_count(),
-            'website_info': 'Kulturhaus Website'
-        }
+        # KPIs come from the cached provider (one query on a cache miss)
+        kpis = request.env['kulturhaus.dashboard.kpi'].get_kpis()
         
         # Get user-configured cards or fallback to static cards
         try:
@@ -49,116 +45,9 @@ class DashboardController(http.Controller):
             'layout': user.dashboard_layout,
         }
     
-    def _get_members_count(self):
-        """Get total members count"""
-        try:
-            # First try to count active membership lines
-            if 'membership.membership_line' in request.env:
-                membership_count = request.env['membership.membership_line'].search_count([
-                    ('state', 'in', ['invoiced', 'paid', 'free'])
-                ])
-                if membership_count > 0:
-                    return membership_count
-            
-            # Fallback to individual partners (exclude companies and internal users)
-            return request.env['res.partner'].search_count([
-                ('is_company', '=', False),
-                ('category_id', '!=', False)  # Partners with categories (likely members)
-            ])
-        except:
-            # Final fallback: count all individual partners
-            try:
-                return request.env['res.partner'].search_count([('is_company', '=', False)])
-            except:
-                return 0
-    
-    def _get_upcoming_events_count(self):
-        """Get upcoming events count (next 6 months)"""
-        try:
-            from datetime import datetime, timedelta
-            
-            # Calculate date range for next 6 months
-            today = datetime.now().date()
-            six_months_later = today + timedelta(days=180)  # Approximately 6 months
-            
-            if 'event.event' in request.env:
-                return request.env['event.event'].search_count([
-                    ('date_begin', '>=', today.strftime('%Y-%m-%d')),
-                    ('date_begin', '<=', six_months_later.strftime('%Y-%m-%d')),
-                    ('stage_id.is_done', '=', False)  # Exclude completed events
-                ])
-            else:
-                return 0
-        except:
-            return 0
-    
     def _get_user_cards(self):
-        """Get user-configured dashboard cards grouped by sections"""
-        user = request.env.user
-        
-        # Get user's configured cards ordered by sections
-        card_configs = user.dashboard_card_ids.filtered('is_active')
-        
-        # Group cards by section
-        sections = {}
-        for card_config in card_configs:
-            section_name = card_config.section_name or 'Main'
-            section_sequence = card_config.section_sequence or 10
-            
-            if section_name not in sections:
-                sections[section_name] = {
-                    'name': section_name,
-                    'sequence': section_sequence,
-                    'cards': []
-                }
-            
-            card_data = {
-                'id': card_config.name.lower().replace(' ', '_'),
-                'title': card_config.name,
-                'description': card_config.description,
-                'icon': card_config.icon,
-                'color': card_config.color,
-                'section': section_name,
-                'action': self._build_action_from_config(card_config)
-            }
-            sections[section_name]['cards'].append(card_data)
-        
-        # Convert to list and sort by section sequence
-        section_list = []
-        for section_data in sections.values():
-            section_list.append(section_data)
-        section_list.sort(key=lambda x: x['sequence'])
-        
-        return section_list
-    
-    def _build_action_from_config(self, card_config):
-        """Build action object from card configuration"""
-        if card_config.action_type == 'window' and card_config.action_window_id:
-            action = card_config.action_window_id
-            return {
-                'type': 'ir.actions.act_window',
-                'name': action.name,
-                'res_model': action.res_model,
-                'view_mode': action.view_mode,
-                'views': action.views or [],
-                'target': action.target or 'current',
-                'domain': action.domain or [],
-            }
-        elif card_config.action_type == 'url' and card_config.action_url:
-            return {
-                'type': 'ir.actions.act_url',
-                'url': card_config.action_url,
-                'target': 'new',
-            }
-        elif card_config.action_type == 'custom' and card_config.custom_action_code:
-            # For custom actions, return the code to be executed client-side
-            return {
-                'type': 'custom',
-                'code': card_config.custom_action_code,
-            }
-        
-        # Fallback to empty action
-        return {}
+        """Get user-configured dashboard cards grouped by sections (cached per user)"""
+        return request.env['dashboard.card.config']._get_user_sections(request.env.user.id)
     
     def _get_static_cards(self):
         """Get static navigation cards (no customization)"""
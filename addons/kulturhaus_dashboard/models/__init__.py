@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
 
 from . import res_users
-from . import dashboard_card_config
\ No newline at end of file
+from . import dashboard_card_config
+from . import dashboard_kpi
\ No newline at end of file
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from odoo.tools import frozendict
 
 
 class DashboardCardConfig(models.Model):
@@ -43,6 +44,90 @@ class DashboardCardConfig(models.Model):
     action_url = fields.Char(string='URL')
     custom_action_code = fields.Text(string='Custom Action Code')
     
+    @api.model
+    def _get_user_sections(self, user_id):
+        """Dashboard payload of the user's active cards, grouped by section.
+        
+        The cards are read with one query; the payload built from them is
+        cached by their values, so card changes need no cache clearing.
+        """
+        card_configs = self.sudo().search_read(
+            [('user_id', '=', user_id), ('is_active', '=', True)],
+            ['name', 'description', 'icon', 'color', 'section_name', 'section_sequence',
+             'action_type', 'action_window_id', 'action_url', 'custom_action_code'],
+        )
+        return self._get_sections(tuple(frozendict(card_config) for card_config in card_configs))
+    
+    @api.model
+    @tools.ormcache('card_configs')
+    def _get_sections(self, card_configs):
+        """Group card values read by ``_get_user_sections`` into sections"""
+        window_action_ids = {
+            card['action_window_id'][0] for card in card_configs
+            if card['action_type'] == 'window' and card['action_window_id']
+        }
+        window_actions = {
+            action['id']: action for action in self.env['ir.actions.act_window'].sudo().browse(
+                window_action_ids
+            ).read(['name', 'res_model', 'view_mode', 'views', 'target', 'domain'])
+        }
+        
+        # Group cards by section
+        sections = {}
+        for card_config in card_configs:
+            section_name = card_config['section_name'] or 'Main'
+            section_sequence = card_config['section_sequence'] or 10
+            
+            if section_name not in sections:
+                sections[section_name] = {
+                    'name': section_name,
+                    'sequence': section_sequence,
+                    'cards': []
+                }
+            
+            sections[section_name]['cards'].append({
+                'id': card_config['name'].lower().replace(' ', '_'),
+                'title': card_config['name'],
+                'description': card_config['description'],
+                'icon': card_config['icon'],
+                'color': card_config['color'],
+                'section': section_name,
+                'action': self._build_action_payload(card_config, window_actions),
+            })
+        
+        return sorted(sections.values(), key=lambda x: x['sequence'])
+    
+    @api.model
+    def _build_action_payload(self, card_config, window_actions):
+        """Build action object from card configuration values"""
+        if card_config['action_type'] == 'window' and card_config['action_window_id']:
+            action = window_actions.get(card_config['action_window_id'][0])
+            if action:
+                return {
+                    'type': 'ir.actions.act_window',
+                    'name': action['name'],
+                    'res_model': action['res_model'],
+                    'view_mode': action['view_mode'],
+                    'views': action['views'] or [],
+                    'target': action['target'] or 'current',
+                    'domain': action['domain'] or [],
+                }
+        elif card_config['action_type'] == 'url' and card_config['action_url']:
+            return {
+                'type': 'ir.actions.act_url',
+                'url': card_config['action_url'],
+                'target': 'new',
+            }
+        elif card_config['action_type'] == 'custom' and card_config['custom_action_code']:
+            # For custom actions, return the code to be executed client-side
+            return {
+                'type': 'custom',
+                'code': card_config['custom_action_code'],
+            }
+        
+        # Fallback to empty action
+        return {}
+    
     @api.model
     def create_default_cards_for_user(self, user_id):
         """Create default dashboard cards for a user"""
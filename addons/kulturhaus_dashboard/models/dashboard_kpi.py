@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, fields, api
+from odoo.tools import SQL
+from odoo.tools.safe_eval import safe_eval
+
+_logger = logging.getLogger(__name__)
+
+# Seconds a worker serves KPIs from its cache before re-reading the snapshots
+KPI_CACHE_TTL = 60
+
+# Delay before a snapshot refresh triggered by a write on a source model, so
+# bursts of writes are folded into a single refresh
+KPI_REFRESH_DELAY = timedelta(minutes=1)
+
+# (dbname, company_id) -> (expiry, kpi values)
+_kpi_cache = {}
+
+# Models of this module, never used as KPI sources
+DASHBOARD_MODELS = {
+    'kulturhaus.dashboard.kpi',
+    'kulturhaus.dashboard.kpi.definition',
+    'kulturhaus.dashboard.kpi.snapshot',
+}
+
+# Fields of a source model that always influence its KPIs
+KPI_SCOPE_FIELDS = {'active', 'company_id'}
+
+
+class DashboardKpiDefinition(models.Model):
+    _name = 'kulturhaus.dashboard.kpi.definition'
+    _description = 'Dashboard KPI Definition'
+    _order = 'sequence, id'
+
+    name = fields.Char(string='Name', required=True, translate=True)
+    code = fields.Char(string='Code', required=True, help='Key of the value in the dashboard data')
+    sequence = fields.Integer(string='Sequence', default=10)
+    active = fields.Boolean(string='Active', default=True)
+
+    model_name = fields.Char(string='Model', required=True, help='Technical name, e.g. event.event')
+    domain = fields.Char(
+        string='Domain', default='[]',
+        help='Evaluated with context_today, datetime and relativedelta available'
+    )
+    aggregation = fields.Selection([
+        ('count', 'Count'),
+        ('sum', 'Sum'),
+        ('avg', 'Average'),
+        ('min', 'Minimum'),
+        ('max', 'Maximum'),
+    ], string='Aggregation', default='count', required=True)
+    field_name = fields.Char(string='Field', help='Stored numeric field to aggregate (not used for counts)')
+    fallback_id = fields.Many2one(
+        'kulturhaus.dashboard.kpi.definition', string='Fallback KPI',
+        help='Value used when the model is not installed or the KPI evaluates to zero'
+    )
+    show_on_dashboard = fields.Boolean(
+        string='Show on Dashboard', default=True,
+        help='Uncheck for KPIs that are only computed as fallback of other KPIs'
+    )
+
+    _sql_constraints = [
+        ('code_uniq', 'unique(code)', 'The KPI code must be unique.'),
+    ]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env['kulturhaus.dashboard.kpi']._update_registry()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'model_name', 'domain', 'field_name', 'active'}.intersection(vals):
+            self.env['kulturhaus.dashboard.kpi']._update_registry()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env['kulturhaus.dashboard.kpi']._update_registry()
+        return res
+
+    def _get_domain(self):
+        self.ensure_one()
+        return safe_eval(self.domain or '[]', {
+            'context_today': lambda: fields.Date.context_today(self),
+            'datetime': datetime,
+            'relativedelta': relativedelta,
+        })
+
+
+class DashboardKpiSnapshot(models.Model):
+    _name = 'kulturhaus.dashboard.kpi.snapshot'
+    _description = 'Dashboard KPI Snapshot'
+    _order = 'company_id, kpi_id'
+
+    kpi_id = fields.Many2one(
+        'kulturhaus.dashboard.kpi.definition', string='KPI',
+        required=True, ondelete='cascade', index=True
+    )
+    code = fields.Char(related='kpi_id.code', string='Code')
+    company_id = fields.Many2one('res.company', string='Company', required=True, ondelete='cascade')
+    value = fields.Float(string='Value', readonly=True)
+    previous_value = fields.Float(string='Previous Value', readonly=True, help='Value on the previous day')
+    trend = fields.Float(string='Trend', readonly=True, help='Change since the previous day')
+    computed_at = fields.Datetime(string='Computed At', readonly=True)
+
+    _sql_constraints = [
+        ('kpi_company_uniq', 'unique(kpi_id, company_id)', 'Only one snapshot per KPI and company.'),
+    ]
+
+
+class DashboardKpi(models.AbstractModel):
+    _name = 'kulturhaus.dashboard.kpi'
+    _description = 'Dashboard KPI Provider'
+
+    @api.model
+    def get_kpis(self):
+        """Return the precomputed dashboard KPIs of the current company (cached)"""
+        key = (self.env.cr.dbname, self.env.company.id)
+        cached = _kpi_cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        values = self._read_snapshots()
+        _kpi_cache[key] = (time.monotonic() + KPI_CACHE_TTL, values)
+        return values
+
+    @api.model
+    def _read_snapshots(self):
+        snapshots = self.env['kulturhaus.dashboard.kpi.snapshot'].sudo().search_read(
+            [
+                ('company_id', '=', self.env.company.id),
+                ('kpi_id.active', '=', True),
+                ('kpi_id.show_on_dashboard', '=', True),
+            ],
+            ['code', 'value', 'trend'],
+        )
+        values = {
+            'website_info': 'Kulturhaus Website',
+            'trends': {},
+        }
+        for snapshot in snapshots:
+            value = snapshot['value']
+            values[snapshot['code']] = int(value) if value.is_integer() else value
+            values['trends'][snapshot['code']] = snapshot['trend']
+        return values
+
+    @api.model
+    def refresh_snapshots(self):
+        """Cron job materializing all KPI values, one query per company"""
+        definitions = self.env['kulturhaus.dashboard.kpi.definition'].sudo().search([])
+        Snapshot = self.env['kulturhaus.dashboard.kpi.snapshot'].sudo()
+        now = fields.Datetime.now()
+        for company in self.env['res.company'].sudo().search([]):
+            values = self.with_company(company)._compute_values(definitions)
+            snapshots = {
+                snapshot.kpi_id.id: snapshot
+                for snapshot in Snapshot.search([('company_id', '=', company.id)])
+            }
+            new_snapshots = []
+            for definition in definitions:
+                value = values.get(definition.id)
+                if value is None:
+                    continue
+                snapshot = snapshots.get(definition.id)
+                if not snapshot:
+                    new_snapshots.append({
+                        'kpi_id': definition.id,
+                        'company_id': company.id,
+                        'value': value,
+                        'previous_value': value,
+                        'trend': 0.0,
+                        'computed_at': now,
+                    })
+                    continue
+                previous_value = snapshot.previous_value
+                if snapshot.computed_at and snapshot.computed_at.date() < now.date():
+                    previous_value = snapshot.value
+                snapshot.write({
+                    'value': value,
+                    'previous_value': previous_value,
+                    'trend': value - previous_value,
+                    'computed_at': now,
+                })
+            Snapshot.create(new_snapshots)
+        self._invalidate_kpis()
+
+    @api.model
+    def _compute_values(self, definitions):
+        """Evaluate all definitions in a single query, scoped to the current company.
+        
+        Returns ``{definition id: value}`` with fallbacks applied; KPIs whose
+        model is not installed and that have no usable fallback are left out.
+        """
+        company_id = self.env.company.id
+        keys = []
+        subqueries = []
+        for definition in definitions:
+            if definition.model_name not in self.env:
+                continue
+            model = self.env[definition.model_name].sudo()
+            try:
+                domain = definition._get_domain()
+                if 'company_id' in model._fields:
+                    domain = domain + [('company_id', 'in', [company_id, False])]
+                query = model._search(domain)
+                if definition.aggregation == 'count':
+                    aggregate = SQL('COUNT(*)')
+                else:
+                    field = model._fields[definition.field_name]
+                    if not field.store:
+                        raise ValueError(f'{definition.field_name} is not stored')
+                    aggregate = SQL(
+                        'COALESCE(%s(%s), 0)',
+                        SQL(definition.aggregation.upper()),
+                        SQL.identifier(model._table, definition.field_name),
+                    )
+            except Exception as e:
+                _logger.warning('Skipping dashboard KPI %s: %s', definition.code, e)
+                continue
+            keys.append(definition.id)
+            subqueries.append(SQL('(%s)', query.select(aggregate)))
+        raw_values = {}
+        if subqueries:
+            self.env.flush_all()
+            self.env.cr.execute(SQL('SELECT %s', SQL(', ').join(subqueries)))
+            raw_values = dict(zip(keys, self.env.cr.fetchone()))
+
+        def resolve(definition, seen):
+            value = raw_values.get(definition.id)
+            fallback = definition.fallback_id
+            if not value and fallback and fallback not in seen:
+                fallback_value = resolve(fallback, seen | fallback)
+                if fallback_value is not None:
+                    return fallback_value
+            return None if value is None else float(value)
+
+        return {definition.id: resolve(definition, definition) for definition in definitions}
+
+    @api.model
+    def _get_source_fields(self):
+        """Fields whose changes can move a KPI, per source model.
+        
+        Only the first part of a domain path is known to the source model, so
+        e.g. a change of an event stage is only seen by the hourly cron.
+        
+        :return: dict model name -> set of field names, or None for any field
+        """
+        source_fields = {}
+        definitions = self.env['kulturhaus.dashboard.kpi.definition'].sudo().search([])
+        for definition in definitions:
+            model_name = definition.model_name
+            if model_name in DASHBOARD_MODELS or model_name not in self.env:
+                continue
+            try:
+                domain = definition._get_domain()
+            except Exception:
+                source_fields[model_name] = None
+                continue
+            field_names = {
+                leaf[0].split('.')[0]
+                for leaf in domain
+                if isinstance(leaf, (list, tuple)) and len(leaf) == 3 and isinstance(leaf[0], str)
+            }
+            field_names |= KPI_SCOPE_FIELDS
+            if definition.field_name:
+                field_names.add(definition.field_name)
+            if model_name not in source_fields:
+                source_fields[model_name] = field_names
+            elif source_fields[model_name] is not None:
+                source_fields[model_name] |= field_names
+        return source_fields
+
+    def _register_hook(self):
+        """Patch the KPI source models so their changes schedule a refresh.
+        
+        Like the rules of base_automation, only the models of the KPI
+        definitions are hooked, and writes only when they touch fields the
+        KPIs use.
+        """
+        super()._register_hook()
+
+        # The patched methods are built by functions, so each closure refers
+        # to its own method (see base_automation)
+        def make_create():
+            @api.model_create_multi
+            def create(self, vals_list, **kw):
+                records = create.origin(self, vals_list, **kw)
+                self.env['kulturhaus.dashboard.kpi']._schedule_refresh()
+                return records
+            return create
+
+        def make_write(field_names):
+            def write(self, vals, **kw):
+                res = write.origin(self, vals, **kw)
+                if field_names is None or not field_names.isdisjoint(vals):
+                    self.env['kulturhaus.dashboard.kpi']._schedule_refresh()
+                return res
+            return write
+
+        def make_unlink():
+            def unlink(self, **kw):
+                self.env['kulturhaus.dashboard.kpi']._schedule_refresh()
+                return unlink.origin(self, **kw)
+            return unlink
+
+        for model_name, field_names in self._get_source_fields().items():
+            ModelClass = self.env.registry[model_name]
+            for name, method in (
+                ('create', make_create()),
+                ('write', make_write(field_names)),
+                ('unlink', make_unlink()),
+            ):
+                method.origin = getattr(ModelClass, name)
+                method._dashboard_kpi_refresh = True
+                setattr(ModelClass, name, method)
+
+    def _unregister_hook(self):
+        """Remove the patches installed by ``_register_hook``"""
+        for ModelClass in self.env.registry.values():
+            for name in ('create', 'write', 'unlink'):
+                if getattr(ModelClass.__dict__.get(name), '_dashboard_kpi_refresh', False):
+                    delattr(ModelClass, name)
+        super()._unregister_hook()
+
+    @api.model
+    def _update_registry(self):
+        """Re-hook the source models after the KPI definitions changed"""
+        if self.env.registry.ready and not self.env.context.get('import_file'):
+            self._unregister_hook()
+            self._register_hook()
+            self.env.registry.registry_invalidated = True
+
+    @api.model
+    def _schedule_refresh(self):
+        """Trigger the snapshot cron shortly, at most once per transaction"""
+        if self.env.cr.precommit.data.get('kulturhaus_dashboard.refresh_scheduled'):
+            return
+        self.env.cr.precommit.data['kulturhaus_dashboard.refresh_scheduled'] = True
+        cron = self.env.ref('kulturhaus_dashboard.ir_cron_refresh_kpi_snapshots', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger(fields.Datetime.now() + KPI_REFRESH_DELAY)
+
+    @api.model
+    def _invalidate_kpis(self):
+        """Drop this worker's cached KPIs once the current transaction commits"""
+        dbname = self.env.cr.dbname
+
+        def clear_kpi_cache():
+            for key in list(_kpi_cache):
+                if key[0] == dbname:
+                    _kpi_cache.pop(key, None)
+
+        self.env.cr.postcommit.add(clear_kpi_cache)
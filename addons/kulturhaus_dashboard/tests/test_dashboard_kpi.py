@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+from ..models import dashboard_kpi
+from ..models.dashboard_kpi import KPI_CACHE_TTL, _kpi_cache
+
+REFRESH_SCHEDULED = 'kulturhaus_dashboard.refresh_scheduled'
+
+
+@tagged('post_install', '-at_install')
+class TestDashboardKpi(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        _kpi_cache.clear()
+        self.addCleanup(_kpi_cache.clear)
+        self.Kpi = self.env['kulturhaus.dashboard.kpi']
+        self.KpiDefinition = self.env['kulturhaus.dashboard.kpi.definition']
+        self.partners = self.env['res.partner'].create([
+            {'name': 'KPI Partner 1', 'ref': 'KPI-TEST', 'color': 2},
+            {'name': 'KPI Partner 2', 'ref': 'KPI-TEST', 'color': 5},
+            {'name': 'KPI Partner 3', 'ref': 'KPI-OTHER', 'color': 7},
+        ])
+        self.kpi_count = self.KpiDefinition.create({
+            'name': 'Test Count',
+            'code': 'test_count',
+            'model_name': 'res.partner',
+            'domain': "[('ref', '=', 'KPI-TEST')]",
+        })
+        self.kpi_sum = self.KpiDefinition.create({
+            'name': 'Test Sum',
+            'code': 'test_sum',
+            'model_name': 'res.partner',
+            'domain': "[('ref', 'like', 'KPI-')]",
+            'aggregation': 'sum',
+            'field_name': 'color',
+        })
+        self.kpi_max = self.KpiDefinition.create({
+            'name': 'Test Max',
+            'code': 'test_max',
+            'model_name': 'res.partner',
+            'domain': "[('ref', '=', 'KPI-TEST')]",
+            'aggregation': 'max',
+            'field_name': 'color',
+        })
+
+    def test_compute_values(self):
+        """Test counts and aggregates are evaluated for the current company"""
+        definitions = self.kpi_count | self.kpi_sum | self.kpi_max
+        self.assertEqual(self.Kpi._compute_values(definitions), {
+            self.kpi_count.id: 2.0,
+            self.kpi_sum.id: 14.0,
+            self.kpi_max.id: 5.0,
+        })
+
+        # Pending changes are taken into account
+        self.partners[0].color = 10
+        self.partners[2].ref = 'KPI-TEST'
+        self.assertEqual(self.Kpi._compute_values(definitions), {
+            self.kpi_count.id: 3.0,
+            self.kpi_sum.id: 22.0,
+            self.kpi_max.id: 10.0,
+        })
+
+        # Records of other companies are left out
+        other_company = self.env['res.company'].create({'name': 'Other Kulturhaus'})
+        self.partners[2].company_id = other_company
+        values = self.Kpi._compute_values(definitions)
+        self.assertEqual(values[self.kpi_count.id], 2.0)
+        values = self.Kpi.with_company(other_company)._compute_values(definitions)
+        self.assertEqual(values[self.kpi_count.id], 3.0)
+
+    def test_compute_values_fallbacks(self):
+        """Test KPIs of missing models or without value use their fallback"""
+        kpi_missing = self.KpiDefinition.create({
+            'name': 'Missing Model',
+            'code': 'test_missing',
+            'model_name': 'x_kulturhaus.not_installed',
+            'fallback_id': self.kpi_count.id,
+        })
+        kpi_missing_alone = self.KpiDefinition.create({
+            'name': 'Missing Model Alone',
+            'code': 'test_missing_alone',
+            'model_name': 'x_kulturhaus.not_installed',
+        })
+        kpi_zero = self.KpiDefinition.create({
+            'name': 'Zero',
+            'code': 'test_zero',
+            'model_name': 'res.partner',
+            'domain': "[('ref', '=', 'KPI-NONE')]",
+            'fallback_id': self.kpi_max.id,
+        })
+        kpi_not_stored = self.KpiDefinition.create({
+            'name': 'Not Stored',
+            'code': 'test_not_stored',
+            'model_name': 'res.partner',
+            'aggregation': 'sum',
+            'field_name': 'display_name',
+        })
+        kpi_zero.fallback_id = kpi_zero  # cycles end at the KPI itself
+
+        values = self.Kpi._compute_values(
+            self.kpi_count | self.kpi_max | kpi_missing | kpi_missing_alone | kpi_zero | kpi_not_stored
+        )
+        self.assertEqual(values[kpi_missing.id], 2.0)
+        self.assertIsNone(values[kpi_missing_alone.id])
+        self.assertEqual(values[kpi_zero.id], 0.0)
+        self.assertIsNone(values[kpi_not_stored.id])
+
+        kpi_zero.fallback_id = self.kpi_max
+        values = self.Kpi._compute_values(self.kpi_max | kpi_zero)
+        self.assertEqual(values[kpi_zero.id], 5.0)
+
+    def test_get_kpis_cache(self):
+        """Test the cached KPIs are dropped after a refresh commits or when they expire"""
+        self.Kpi.refresh_snapshots()
+        self.env.cr.postcommit.run()
+        kpis = self.Kpi.get_kpis()
+        self.assertEqual(kpis['test_count'], 2)
+        self.assertEqual(kpis['test_sum'], 14)
+
+        # The worker keeps serving its cached values until the refresh is committed
+        self.partners[2].ref = 'KPI-TEST'
+        self.Kpi.refresh_snapshots()
+        self.assertEqual(self.Kpi.get_kpis()['test_count'], 2)
+        self.env.cr.postcommit.run()
+        kpis = self.Kpi.get_kpis()
+        self.assertEqual(kpis['test_count'], 3)
+        self.assertEqual(kpis['trends']['test_count'], 1.0)
+
+        # Snapshots changed by another worker are read once the cache expires
+        self.env['kulturhaus.dashboard.kpi.snapshot'].search([('kpi_id', '=', self.kpi_count.id)]).value = 4
+        self.assertEqual(self.Kpi.get_kpis()['test_count'], 3)
+        with patch.object(dashboard_kpi.time, 'monotonic', return_value=time.monotonic() + KPI_CACHE_TTL + 1):
+            self.assertEqual(self.Kpi.get_kpis()['test_count'], 4)
+
+    def test_card_sections_cache(self):
+        """Test the cached card sections follow changes of the card configuration"""
+        user = self.env['res.users'].create({'name': 'Dashboard User', 'login': 'dashboard_user'})
+        Card = self.env['dashboard.card.config']
+        self.assertEqual(Card._get_user_sections(user.id), [])
+
+        card_url = Card.create({
+            'user_id': user.id,
+            'name': 'Website',
+            'section_name': 'Extern',
+            'section_sequence': 20,
+            'action_type': 'url',
+            'action_url': 'https://kulturhaus-bortfeld.de',
+        })
+        card_users = Card.create({
+            'user_id': user.id,
+            'name': 'Benutzer',
+            'section_name': 'Verwaltung',
+            'action_type': 'window',
+            'action_window_id': self.env.ref('base.action_res_users').id,
+        })
+        sections = Card._get_user_sections(user.id)
+        self.assertEqual([section['name'] for section in sections], ['Verwaltung', 'Extern'])
+        self.assertEqual(sections[0]['cards'][0]['action']['res_model'], 'res.users')
+        self.assertEqual(sections[1]['cards'][0]['action'], {
+            'type': 'ir.actions.act_url',
+            'url': 'https://kulturhaus-bortfeld.de',
+            'target': 'new',
+        })
+
+        # Card changes are new cache keys, the registry cache is left alone
+        with patch.object(type(self.env.registry), 'clear_cache') as clear_cache:
+            card_url.name = 'Homepage'
+            self.assertEqual(Card._get_user_sections(user.id)[1]['cards'][0]['title'], 'Homepage')
+
+            card_users.is_active = False
+            self.assertEqual([section['name'] for section in Card._get_user_sections(user.id)], ['Extern'])
+
+            card_url.unlink()
+            self.assertEqual(Card._get_user_sections(user.id), [])
+
+            Card.create_default_cards_for_user(user.id)
+            self.assertIn('Verwaltung', [section['name'] for section in Card._get_user_sections(user.id)])
+            clear_cache.assert_not_called()
+
+    def _is_hooked(self, model_name, method_name):
+        method = self.env.registry[model_name].__dict__.get(method_name)
+        return getattr(method, '_dashboard_kpi_refresh', False)
+
+    def test_refresh_snapshots(self):
+        """Test snapshots hold the KPI values per company and their daily trend"""
+        Snapshot = self.env['kulturhaus.dashboard.kpi.snapshot']
+        self.kpi_max.show_on_dashboard = False
+        self.Kpi.refresh_snapshots()
+        snapshot = Snapshot.search([
+            ('kpi_id', '=', self.kpi_count.id), ('company_id', '=', self.env.company.id),
+        ])
+        self.assertRecordValues(snapshot, [{'value': 2.0, 'previous_value': 2.0, 'trend': 0.0}])
+
+        # Hidden KPIs are computed, but not served
+        self.assertTrue(Snapshot.search_count([('kpi_id', '=', self.kpi_max.id)]))
+        values = self.Kpi._read_snapshots()
+        self.assertEqual(values['test_count'], 2)
+        self.assertNotIn('test_max', values)
+        self.kpi_sum.active = False
+        self.assertNotIn('test_sum', self.Kpi._read_snapshots())
+
+        # Refreshes on the same day compare with the value of the previous day
+        self.partners[2].ref = 'KPI-TEST'
+        self.Kpi.refresh_snapshots()
+        self.assertRecordValues(snapshot, [{'value': 3.0, 'previous_value': 2.0, 'trend': 1.0}])
+        self.partners[1].ref = 'KPI-OTHER'
+        self.Kpi.refresh_snapshots()
+        self.assertRecordValues(snapshot, [{'value': 2.0, 'previous_value': 2.0, 'trend': 0.0}])
+
+        # On the next day the last value becomes the previous value
+        snapshot.computed_at = fields.Datetime.now() - timedelta(days=1)
+        self.partners[1].ref = 'KPI-TEST'
+        self.Kpi.refresh_snapshots()
+        self.assertRecordValues(snapshot, [{'value': 3.0, 'previous_value': 2.0, 'trend': 1.0}])
+
+    def test_source_fields(self):
+        """Test the source fields are collected from the domains and aggregated fields"""
+        self.KpiDefinition.create([{
+            'name': 'Snapshots',
+            'code': 'test_snapshots',
+            'model_name': 'kulturhaus.dashboard.kpi.snapshot',
+        }, {
+            'name': 'Unknown Domain',
+            'code': 'test_unknown_domain',
+            'model_name': 'res.partner.category',
+            'domain': "[('name', '=', undefined_name)]",
+        }])
+        source_fields = self.Kpi._get_source_fields()
+        self.assertNotIn('kulturhaus.dashboard.kpi.snapshot', source_fields)
+        self.assertIsNone(source_fields['res.partner.category'])
+        self.assertTrue({'ref', 'color', 'active', 'company_id'} <= source_fields['res.partner'])
+        self.assertNotIn('comment', source_fields['res.partner'])
+
+    def test_source_model_hooks(self):
+        """Test only KPI source models are hooked, following the definitions"""
+        self.assertTrue(self._is_hooked('res.partner', 'write'))
+        self.assertFalse(self._is_hooked('res.partner.category', 'write'))
+        self.assertFalse(self._is_hooked('kulturhaus.dashboard.kpi.snapshot', 'write'))
+
+        definition = self.KpiDefinition.create({
+            'name': 'Root Categories',
+            'code': 'test_root_categories',
+            'model_name': 'res.partner.category',
+            'domain': "[('parent_id', '=', False)]",
+        })
+        for method_name in ('create', 'write', 'unlink'):
+            self.assertTrue(self._is_hooked('res.partner.category', method_name))
+
+        definition.model_name = 'res.partner.industry'
+        self.assertFalse(self._is_hooked('res.partner.category', 'write'))
+        self.assertTrue(self._is_hooked('res.partner.industry', 'write'))
+
+        definition.unlink()
+        self.assertFalse(self._is_hooked('res.partner.industry', 'write'))
+
+    def test_source_changes_schedule_refresh(self):
+        """Test writes on fields used by KPIs trigger the refresh cron once"""
+        cron = self.env.ref('kulturhaus_dashboard.ir_cron_refresh_kpi_snapshots')
+        Trigger = self.env['ir.cron.trigger']
+        self.env.cr.precommit.data.pop(REFRESH_SCHEDULED, None)
+        trigger_count = Trigger.search_count([('cron_id', '=', cron.id)])
+
+        self.partners[0].comment = 'Not used by any KPI'
+        self.assertFalse(self.env.cr.precommit.data.get(REFRESH_SCHEDULED))
+        self.assertEqual(Trigger.search_count([('cron_id', '=', cron.id)]), trigger_count)
+
+        self.partners[0].color = 3
+        self.assertTrue(self.env.cr.precommit.data.get(REFRESH_SCHEDULED))
+        self.assertEqual(Trigger.search_count([('cron_id', '=', cron.id)]), trigger_count + 1)
+
+        # Later changes in the same transaction reuse the scheduled refresh
+        self.partners[1].color = 4
+        self.env['res.partner'].create({'name': 'KPI Partner 4', 'ref': 'KPI-TEST'})
+        self.partners[2].unlink()
+        self.assertEqual(Trigger.search_count([('cron_id', '=', cron.id)]), trigger_count + 1)
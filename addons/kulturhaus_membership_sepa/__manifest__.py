@@ -17,6 +17,7 @@
     'data': [
         'security/ir.model.access.csv',
         'wizards/sepa_batch_wizard_views.xml',
+        'views/sepa_batch_views.xml',
         'views/res_partner_views.xml',
         'views/membership_views.xml',
         'views/menu_views.xml',
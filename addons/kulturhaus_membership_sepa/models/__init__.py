@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
 from . import res_partner
 from . import product_template
-from . import res_config_settings
\ No newline at end of file
+from . import res_config_settings
+from . import sepa_batch
\ No newline at end of file
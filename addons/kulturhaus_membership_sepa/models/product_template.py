@@ -1,5 +1,14 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from odoo.tools import frozendict
+
+# Fallback price when no membership product is configured for a period
+DEFAULT_MEMBERSHIP_AMOUNT = 60.0
+
+# Product fields the membership tariffs are resolved from, including the
+# default order deciding which product wins
+TARIFF_FIELDS = {'membership', 'membership_period_type', 'membership_tariff',
+                 'list_price', 'active', 'company_id', 'priority', 'name'}
 
 class ProductTemplate(models.Model):
     _inherit = 'product.template'
@@ -31,6 +40,12 @@ class ProductTemplate(models.Model):
     ], string='SEPA Collection Month',
        help='Default month for SEPA collection for this product')
     
+    membership_tariff = fields.Selection([
+        ('regular', 'Regular'),
+        ('reduced', 'Reduced'),
+    ], string='Membership Tariff', default='regular',
+       help='Members with this tariff are charged the price of this product')
+    
     force_sepa_payment = fields.Boolean(
         string='Force SEPA Payment',
         help='If checked, only SEPA payment will be allowed for this product'
@@ -40,4 +55,59 @@ class ProductTemplate(models.Model):
     def _onchange_membership(self):
         """When product is marked as membership, suggest SEPA settings"""
         if self.membership:
-            self.is_membership_sepa = True
\ No newline at end of file
+            self.is_membership_sepa = True
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        templates = super().create(vals_list)
+        if any(vals.get('membership') for vals in vals_list):
+            self.env.registry.clear_cache()
+        return templates
+    
+    def write(self, vals):
+        # Only membership products, before or after the write, affect the tariffs
+        affects_tariffs = TARIFF_FIELDS.intersection(vals) and (
+            vals.get('membership') or any(self.mapped('membership'))
+        )
+        res = super().write(vals)
+        if affects_tariffs:
+            self.env.registry.clear_cache()
+        return res
+    
+    def unlink(self):
+        has_membership = any(self.mapped('membership'))
+        res = super().unlink()
+        if has_membership:
+            self.env.registry.clear_cache()
+        return res
+    
+    @api.model
+    def _get_membership_tariff(self, period_type, tariff='regular'):
+        """Price of a membership period for a tariff in the current company
+        
+        Falls back to the regular tariff and then to the default amount.
+        """
+        tariffs = self._get_membership_tariffs(self.env.company.id)
+        return tariffs.get(
+            (period_type, tariff),
+            tariffs.get((period_type, 'regular'), DEFAULT_MEMBERSHIP_AMOUNT),
+        )
+    
+    @api.model
+    @tools.ormcache('company_id')
+    def _get_membership_tariffs(self, company_id):
+        """Membership prices by (period type, tariff) for a company
+        
+        Loaded with one query for all periods and tariffs; the first product
+        in the default order wins, as for a ``search(..., limit=1)``.
+        """
+        products = self.sudo().with_company(company_id).search_read([
+            ('membership', '=', True),
+            ('membership_period_type', 'in', ['full_year', 'half_year']),
+            ('company_id', 'in', [False, company_id]),
+        ], ['membership_period_type', 'membership_tariff', 'list_price'])
+        tariffs = {}
+        for product in products:
+            key = (product['membership_period_type'], product['membership_tariff'] or 'regular')
+            tariffs.setdefault(key, product['list_price'])
+        return frozendict(tariffs)
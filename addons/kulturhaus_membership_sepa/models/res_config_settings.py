@@ -70,6 +70,20 @@ class ResConfigSettings(models.TransientModel):
         help='Days before SEPA collection to notify members'
     )
     
+    sepa_first_debit_lead_days = fields.Integer(
+        string='First Debit Lead Days',
+        config_parameter='kulturhaus_membership_sepa.first_debit_lead_days',
+        default=5,
+        help='Minimum business days between submission and collection of first (FRST) direct debits'
+    )
+    
+    sepa_recurring_debit_lead_days = fields.Integer(
+        string='Recurring Debit Lead Days',
+        config_parameter='kulturhaus_membership_sepa.recurring_debit_lead_days',
+        default=2,
+        help='Minimum business days between submission and collection of recurring and final direct debits'
+    )
+    
     sepa_batch_reference_prefix = fields.Char(
         string='Batch Reference Prefix',
         config_parameter='kulturhaus_membership_sepa.batch_prefix',
@@ -61,6 +61,12 @@ class ResPartner(models.Model):
     ], string='Membership Period', default='auto',
        help='Preference for membership billing period')
     
+    membership_tariff = fields.Selection([
+        ('regular', 'Regular'),
+        ('reduced', 'Reduced'),
+    ], string='Membership Tariff', default='regular',
+       help='Tariff used for the SEPA membership fee, e.g. reduced rates for students')
+    
     @api.model
     def create(self, vals):
         """Generate SEPA mandate ID on creation if SEPA fields are filled"""
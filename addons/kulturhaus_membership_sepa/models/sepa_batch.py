@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import SQL, str2bool
+import tempfile
+from datetime import timedelta
+
+from ..tools import Pain008Writer
+
+# Batch lines fetched per round trip while writing the SEPA XML
+LINE_FETCH_SIZE = 500
+
+# Default business days between submission and collection per sequence type;
+# first debits get the longer lead for their pre-notification
+FIRST_DEBIT_LEAD_DAYS = 5
+RECURRING_DEBIT_LEAD_DAYS = 2
+
+
+def add_business_days(date, days):
+    """Return the date ``days`` business days (Monday to Friday) after ``date``"""
+    while days > 0:
+        date += timedelta(days=1)
+        if date.weekday() < 5:
+            days -= 1
+    return date
+
+
+class SepaBatch(models.Model):
+    _name = 'sepa.batch'
+    _description = 'SEPA Direct Debit Batch'
+    _order = 'collection_date desc, id desc'
+
+    name = fields.Char(
+        string='Einzugsreferenz',
+        required=True,
+        readonly=True
+    )
+
+    batch_type = fields.Selection([
+        ('full_year', 'Ganzjahresbeitrag'),
+        ('half_year', 'Halbjahresbeitrag (Jan-Jun)'),
+        ('half_year_2', 'Halbjahresbeitrag (Jul-Dez)'),
+        ('custom', 'Benutzerdefinierte Auswahl')
+    ], string='Beitragsart', required=True, readonly=True)
+
+    collection_date = fields.Date(
+        string='Einzugsdatum',
+        required=True,
+        readonly=True
+    )
+
+    remittance_info = fields.Char(
+        string='Verwendungszweck',
+        readonly=True
+    )
+
+    line_ids = fields.One2many(
+        'sepa.batch.line',
+        'batch_id',
+        string='Lastschriften',
+        readonly=True
+    )
+
+    line_count = fields.Integer(
+        string='Anzahl Lastschriften',
+        compute='_compute_totals'
+    )
+
+    total_amount = fields.Float(
+        string='Gesamtbetrag',
+        compute='_compute_totals'
+    )
+
+    attachment_id = fields.Many2one(
+        'ir.attachment',
+        string='SEPA XML-Datei',
+        readonly=True,
+        copy=False
+    )
+
+    xml_filename = fields.Char(
+        string='Dateiname',
+        readonly=True,
+        copy=False
+    )
+
+    state = fields.Selection([
+        ('draft', 'Entwurf'),
+        ('generated', 'Generiert')
+    ], string='Status', default='draft', readonly=True, copy=False)
+
+    _sql_constraints = [
+        ('name_uniq', 'unique(name)', 'Die Einzugsreferenz muss eindeutig sein.'),
+    ]
+
+    @api.depends('line_ids.amount')
+    def _compute_totals(self):
+        totals = {
+            batch.id: (count, amount)
+            for batch, count, amount in self.env['sepa.batch.line']._read_group(
+                [('batch_id', 'in', self.ids)],
+                ['batch_id'],
+                ['__count', 'amount:sum'],
+            )
+        }
+        for batch in self:
+            batch.line_count, batch.total_amount = totals.get(batch._origin.id, (0, 0.0))
+
+    def _get_collection_dates(self):
+        """Collection date per sequence type
+        
+        Each sequence type is collected on the batch collection date, but not
+        before its lead time counted in business days from today: first debits
+        (FRST) need the longer lead, recurring and final debits the shorter one.
+        
+        :return: dict sequence type -> collection date
+        """
+        self.ensure_one()
+        ICP = self.env['ir.config_parameter'].sudo()
+        first_lead = int(ICP.get_param('kulturhaus_membership_sepa.first_debit_lead_days', FIRST_DEBIT_LEAD_DAYS))
+        recurring_lead = int(ICP.get_param(
+            'kulturhaus_membership_sepa.recurring_debit_lead_days', RECURRING_DEBIT_LEAD_DAYS))
+        today = fields.Date.context_today(self)
+        return {
+            sequence_type: max(self.collection_date, add_business_days(today, lead_days))
+            for sequence_type, lead_days in (
+                ('FRST', first_lead), ('RCUR', recurring_lead), ('FNAL', recurring_lead),
+            )
+        }
+    
+    def _insert_lines(self, member_ids, amounts):
+        """Bulk insert one debit line per member from the current partner data
+
+        Mandate and bank details are copied onto the lines, so the batch can
+        be exported again later without looking at the members. The sequence
+        type is FRST for members never debited before and FNAL for cancelled
+        memberships; the collection date follows from the sequence type, see
+        ``_get_collection_dates``.
+
+        :param amounts: dict of amounts keyed by membership tariff, must
+                        contain the ``regular`` tariff
+        """
+        self.ensure_one()
+        if not member_ids:
+            return
+        amount = SQL("CASE p.membership_tariff %s ELSE %s END", SQL(" ").join(
+            SQL("WHEN %s THEN %s", tariff, tariff_amount)
+            for tariff, tariff_amount in amounts.items()
+        ), amounts['regular'])
+        collection_date = SQL("CASE s.sequence_type %s END", SQL(" ").join(
+            SQL("WHEN %s THEN %s", sequence_type, date)
+            for sequence_type, date in self._get_collection_dates().items()
+        ))
+        end_to_end_date = fields.Date.today().strftime('%Y%m%d')
+        self.env['res.partner'].flush_model([
+            'name', 'membership_tariff', 'membership_cancel', 'sepa_last_debit_date',
+            'sepa_mandate_id', 'sepa_mandate_date', 'bank_account_iban', 'bank_account_bic',
+        ])
+        self.env['sepa.batch.line'].flush_model()
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO sepa_batch_line (
+                batch_id, partner_id, amount, tariff, sequence_type, collection_date,
+                end_to_end_id, mandate_id, mandate_date,
+                debtor_name, debtor_iban, debtor_bic,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT %(batch_id)s, p.id, %(amount)s, COALESCE(p.membership_tariff, 'regular'),
+                   s.sequence_type, %(collection_date)s,
+                   'MB-' || p.id || '-' || %(e2e_date)s,
+                   COALESCE(NULLIF(p.sepa_mandate_id, ''), 'MANDATE-' || p.id),
+                   COALESCE(p.sepa_mandate_date, %(today)s),
+                   p.name, p.bank_account_iban, p.bank_account_bic,
+                   %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+              FROM res_partner p
+        CROSS JOIN LATERAL (
+                SELECT CASE
+                           WHEN p.sepa_last_debit_date IS NULL THEN 'FRST'
+                           WHEN p.membership_cancel IS NOT NULL THEN 'FNAL'
+                           ELSE 'RCUR'
+                       END AS sequence_type
+               ) s
+             WHERE p.id = ANY(%(member_ids)s)
+          ORDER BY p.id
+            """,
+            batch_id=self.id,
+            amount=amount,
+            collection_date=collection_date,
+            e2e_date=end_to_end_date,
+            today=fields.Date.today(),
+            uid=self.env.uid,
+            member_ids=list(member_ids),
+        ))
+        self.env['sepa.batch.line'].invalidate_model()
+        self.invalidate_recordset(['line_ids', 'line_count', 'total_amount'])
+
+    def _mark_members_debited(self):
+        """Set the last debit date of all debited members in one statement
+
+        This bypasses the ORM on purpose: no mail tracking and no recomputes
+        are needed for the technical debit date.
+        """
+        self.env['sepa.batch.line'].flush_model(['batch_id', 'partner_id', 'collection_date'])
+        self.env.cr.execute(SQL(
+            """
+            UPDATE res_partner p
+               SET sepa_last_debit_date = l.collection_date
+              FROM sepa_batch_line l
+             WHERE l.partner_id = p.id
+               AND l.batch_id = ANY(%s)
+            """,
+            self.ids,
+        ))
+        self.env['res.partner'].invalidate_model(['sepa_last_debit_date'])
+
+    def _get_sepa_creditor(self):
+        """Get creditor information from settings"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        return {
+            'name': ICP.get_param('kulturhaus_membership_sepa.sepa_creditor_name', 'Kulturhaus Bortfeld'),
+            'identifier': ICP.get_param('kulturhaus_membership_sepa.sepa_creditor_id', 'DE98ZZZ09999999999'),
+            'iban': ICP.get_param('kulturhaus_membership_sepa.sepa_creditor_iban', 'DE89370400440532013000'),
+            'bic': ICP.get_param('kulturhaus_membership_sepa.sepa_creditor_bic', 'COBADEFFXXX'),
+        }
+
+    def _generate_sepa_xml(self):
+        """Prepare a streaming SEPA pain.008.001.02 writer from the stored lines.
+
+        Lines are fetched in chunks and partitioned in the same pass into one
+        payment block per sequence type, collection date and tariff; each
+        transaction is spooled as soon as it is read. The caller writes the
+        document and closes the writer.
+        """
+        self.ensure_one()
+        ICP = self.env['ir.config_parameter'].sudo()
+        pretty_print = str2bool(ICP.get_param('kulturhaus_membership_sepa.pretty_print', 'True'))
+        writer = Pain008Writer(self.name, self._get_sepa_creditor(), pretty_print)
+        try:
+            remittance_info = self.remittance_info or ''
+            payments = {}
+
+            self.env['sepa.batch.line'].flush_model()
+            self.env.cr.execute(SQL(
+                """
+                SELECT sequence_type, collection_date, tariff,
+                       end_to_end_id, amount, mandate_id, mandate_date,
+                       debtor_name, debtor_iban, debtor_bic
+                  FROM sepa_batch_line
+                 WHERE batch_id = %s
+              ORDER BY collection_date, sequence_type, tariff, id
+                """,
+                self.id,
+            ))
+            while rows := self.env.cr.fetchmany(LINE_FETCH_SIZE):
+                for (sequence_type, collection_date, tariff, end_to_end_id, amount,
+                     mandate_id, mandate_date, name, iban, bic) in rows:
+                    # One PmtInf block per sequence type, collection date and tariff
+                    key = (sequence_type, collection_date, tariff)
+                    payment = payments.get(key)
+                    if payment is None:
+                        payment = payments[key] = writer.add_payment(
+                            f"{self.name}-{len(payments) + 1:03d}",
+                            collection_date or self.collection_date,
+                            sequence_type or 'RCUR',
+                        )
+                    payment.add_transaction(
+                        end_to_end_id=end_to_end_id,
+                        amount=amount,
+                        mandate_id=mandate_id,
+                        mandate_date=mandate_date,
+                        debtor_name=name,
+                        debtor_iban=iban,
+                        remittance_info=remittance_info,
+                        debtor_bic=bic,
+                    )
+        except Exception:
+            writer.close()
+            raise
+        return writer
+
+    def action_generate_xml(self):
+        """(Re)generate the SEPA XML file from the stored batch lines
+
+        Regenerating only replaces the attachment; members are not touched.
+        """
+        for batch in self:
+            if not batch.line_ids:
+                raise UserError(_('The SEPA batch %s has no debit lines.', batch.name))
+            filename = f"SEPA_{batch.name}_{batch.collection_date}.xml"
+            with tempfile.TemporaryFile() as xml_file:
+                with batch._generate_sepa_xml() as writer:
+                    writer.write(xml_file)
+                xml_file.seek(0)
+                attachment = self.env['ir.attachment'].create({
+                    'name': filename,
+                    'type': 'binary',
+                    'raw': xml_file.read(),
+                    'mimetype': 'application/xml',
+                    'res_model': batch._name,
+                    'res_id': batch.id,
+                })
+            previous = batch.attachment_id
+            batch.write({
+                'attachment_id': attachment.id,
+                'xml_filename': filename,
+                'state': 'generated',
+            })
+            previous.unlink()
+        return True
+
+    def action_download_xml(self):
+        """Download the XML file, generating it from the lines if needed"""
+        self.ensure_one()
+        if not self.attachment_id:
+            self.action_generate_xml()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{self.attachment_id.id}?download=true',
+            'target': 'self',
+        }
+
+
+class SepaBatchLine(models.Model):
+    _name = 'sepa.batch.line'
+    _description = 'SEPA Direct Debit Batch Line'
+    _order = 'batch_id, id'
+
+    batch_id = fields.Many2one(
+        'sepa.batch',
+        string='Einzug',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+
+    partner_id = fields.Many2one(
+        'res.partner',
+        string='Mitglied',
+        required=True,
+        ondelete='restrict',
+        index=True
+    )
+
+    amount = fields.Float(string='Betrag', required=True)
+    tariff = fields.Selection([
+        ('regular', 'Regular'),
+        ('reduced', 'Reduced'),
+    ], string='Tarif', default='regular')
+    sequence_type = fields.Selection([
+        ('FRST', 'Erstlastschrift'),
+        ('RCUR', 'Folgelastschrift'),
+        ('FNAL', 'Letzte Lastschrift'),
+    ], string='Sequenztyp', required=True, default='RCUR')
+    collection_date = fields.Date(string='Einzugsdatum', required=True)
+    end_to_end_id = fields.Char(string='End-to-End-ID', required=True)
+    mandate_id = fields.Char(string='Mandatsreferenz', required=True)
+    mandate_date = fields.Date(string='Mandatsdatum', required=True)
+    debtor_name = fields.Char(string='Kontoinhaber')
+    debtor_iban = fields.Char(string='IBAN')
+    debtor_bic = fields.Char(string='BIC')
@@ -0,0 +1,536 @@
+# -*- coding: utf-8 -*-
+import io
+import xml.etree.ElementTree as ET
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+from ..models.sepa_batch import add_business_days
+from ..tools import Pain008Writer, SepaValidator
+from ..tools.pain008_writer import PAIN_008_NAMESPACE
+from ..tools.sepa_validation import check_bic, check_iban
+from ..wizards import sepa_batch_wizard
+
+NS = {'p': PAIN_008_NAMESPACE}
+
+CREDITOR = {
+    'name': 'Kulturhaus Bortfeld e.V.',
+    'identifier': 'DE98ZZZ09999999999',
+    'iban': 'DE89370400440532013000',
+    'bic': 'COBADEFFXXX',
+}
+
+
+@tagged('post_install', '-at_install')
+class TestMembershipSepa(TransactionCase):
+    
+    def setUp(self):
+        super().setUp()
+        self.today = fields.Date.today()
+        self.year_start = date(self.today.year, 1, 1)
+        self.year_end = date(self.today.year, 12, 31)
+        self.mandate_date = self.today - timedelta(days=365)
+        
+        ProductTemplate = self.env['product.template']
+        ProductTemplate.search([
+            ('membership', '=', True), ('membership_period_type', '!=', False),
+        ]).write({'active': False})
+        self.product_full = ProductTemplate.create(self._membership_product_values('full_year', 'regular', 80.0))
+        self.product_full_reduced = ProductTemplate.create(self._membership_product_values('full_year', 'reduced', 40.0))
+        self.product_half = ProductTemplate.create(self._membership_product_values('half_year', 'regular', 45.0))
+        
+        self.member_regular = self._create_member('Anna Regular')
+        self.member_reduced = self._create_member('Bernd Reduced', membership_tariff='reduced',
+                                                  bank_account_iban='DE02120300000000202051',
+                                                  bank_account_bic='BYLADEM1001')
+        self.member_half = self._create_member('Carla Half', membership_period_preference='half_year',
+                                               bank_account_iban='DE02100500000054540402',
+                                               bank_account_bic=False)
+    
+    def _membership_product_values(self, period_type, tariff, price):
+        return {
+            'name': f'Mitgliedschaft {period_type} {tariff}',
+            'type': 'service',
+            'membership': True,
+            'membership_date_from': self.year_start,
+            'membership_date_to': self.year_end,
+            'membership_period_type': period_type,
+            'membership_tariff': tariff,
+            'list_price': price,
+        }
+    
+    def _create_member(self, name, **values):
+        partner = self.env['res.partner'].create(dict({
+            'name': name,
+            'free_member': True,
+            'bank_account_iban': 'DE89370400440532013000',
+            'bank_account_bic': 'COBADEFFXXX',
+            'sepa_mandate_id': f'MANDATE-{name}',
+            'sepa_mandate_date': self.mandate_date,
+        }, **values))
+        self.env['membership.membership_line'].create({
+            'partner': partner.id,
+            'membership_id': self.product_full.product_variant_id.id,
+            'date': self.today,
+            'date_from': self.year_start,
+            'date_to': self.year_end,
+            'member_price': 80.0,
+        })
+        return partner
+    
+    def _create_wizard(self, batch_type='full_year', **values):
+        return self.env['sepa.batch.wizard'].create(dict({
+            'batch_type': batch_type,
+            'batch_reference': f'TEST-SEPA-{batch_type}',
+        }, **values))
+    
+    def _parse_xml(self, raw):
+        return ET.fromstring(raw)
+    
+    def _write_document(self, writer):
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+    
+    def test_pain008_writer_totals(self):
+        """Test the streamed document carries the totals of its transactions"""
+        collection_date = date(2026, 3, 2)
+        with Pain008Writer('MSG-1', CREDITOR) as writer:
+            first = writer.add_payment('MSG-1-001', collection_date, 'FRST')
+            first.add_transaction(
+                end_to_end_id='E2E-1', amount=60.0, mandate_id='M-1', mandate_date=date(2024, 1, 1),
+                debtor_name='Anna Muster', debtor_iban='DE02 1203 0000 0000 2020 51',
+                remittance_info='Beitrag', debtor_bic='BYLADEM1001',
+            )
+            # Payment blocks without transactions are left out
+            writer.add_payment('MSG-1-002', collection_date, 'FNAL')
+            recurring = writer.add_payment('MSG-1-003', collection_date, 'RCUR')
+            for index, amount in enumerate((12.5, 0.1), start=2):
+                recurring.add_transaction(
+                    end_to_end_id=f'E2E-{index}', amount=amount, mandate_id=f'M-{index}',
+                    mandate_date=date(2024, 1, 1), debtor_name='X' * 80,
+                    debtor_iban='DE02100500000054540402', remittance_info='Beitrag',
+                )
+            raw = self._write_document(writer)
+        
+        root = self._parse_xml(raw)
+        group_header = root.find('p:CstmrDrctDbtInitn/p:GrpHdr', NS)
+        self.assertEqual(group_header.findtext('p:MsgId', namespaces=NS), 'MSG-1')
+        self.assertEqual(group_header.findtext('p:NbOfTxs', namespaces=NS), '3')
+        self.assertEqual(group_header.findtext('p:CtrlSum', namespaces=NS), '72.60')
+        
+        payments = root.findall('p:CstmrDrctDbtInitn/p:PmtInf', NS)
+        self.assertEqual([payment.findtext('p:PmtInfId', namespaces=NS) for payment in payments],
+                         ['MSG-1-001', 'MSG-1-003'])
+        self.assertEqual([payment.findtext('p:PmtTpInf/p:SeqTp', namespaces=NS) for payment in payments],
+                         ['FRST', 'RCUR'])
+        self.assertEqual([payment.findtext('p:NbOfTxs', namespaces=NS) for payment in payments], ['1', '2'])
+        self.assertEqual([payment.findtext('p:CtrlSum', namespaces=NS) for payment in payments], ['60.00', '12.60'])
+        self.assertEqual(payments[0].findtext('p:ReqdColltnDt', namespaces=NS), '2026-03-02')
+        self.assertEqual(
+            payments[0].findtext('p:CdtrSchmeId/p:Id/p:PrvtId/p:Othr/p:Id', namespaces=NS),
+            CREDITOR['identifier'],
+        )
+        
+        first_tx, second_tx, third_tx = root.findall('.//p:DrctDbtTxInf', NS)
+        self.assertEqual(first_tx.findtext('p:DbtrAcct/p:Id/p:IBAN', namespaces=NS), 'DE02120300000000202051')
+        self.assertEqual(first_tx.findtext('p:DbtrAgt/p:FinInstnId/p:BIC', namespaces=NS), 'BYLADEM1001')
+        self.assertEqual(first_tx.findtext('p:DrctDbtTx/p:MndtRltdInf/p:DtOfSgntr', namespaces=NS), '2024-01-01')
+        self.assertEqual(second_tx.findtext('p:InstdAmt', namespaces=NS), '12.50')
+        self.assertEqual(third_tx.findtext('p:InstdAmt', namespaces=NS), '0.10')
+        self.assertIsNone(second_tx.find('p:DbtrAgt', NS))
+        self.assertEqual(len(second_tx.findtext('p:Dbtr/p:Nm', namespaces=NS)), 70)
+    
+    def test_pain008_writer_compact(self):
+        """Test the document without pretty printing is the same document on one line"""
+        def build(pretty_print):
+            with Pain008Writer('MSG-2', CREDITOR, pretty_print) as writer:
+                payment = writer.add_payment('MSG-2-001', date(2026, 3, 2))
+                payment.add_transaction(
+                    end_to_end_id='E2E-1', amount=30.0, mandate_id='M-1', mandate_date=date(2024, 1, 1),
+                    debtor_name='Anna Muster', debtor_iban='DE02120300000000202051', remittance_info='Beitrag',
+                )
+                return self._write_document(writer)
+        
+        compact, pretty = build(False), build(True)
+        self.assertNotIn(b'\n', compact)
+        self.assertIn(b'\n', pretty)
+        for raw in (compact, pretty):
+            root = self._parse_xml(raw)
+            self.assertEqual(root.findtext('.//p:PmtTpInf/p:SeqTp', namespaces=NS), 'RCUR')
+            self.assertEqual(root.findtext('.//p:InstdAmt', namespaces=NS), '30.00')
+    
+    def test_member_eligibility_reasons(self):
+        """Test each member is included or excluded with the first matching reason"""
+        member_recent = self._create_member('Dora Recent', sepa_last_debit_date=self.today - timedelta(days=10))
+        member_old = self._create_member('Emil Old', sepa_last_debit_date=self.today - timedelta(days=400))
+        member_half_recent = self._create_member('Frida Half Recent', membership_period_preference='half_year',
+                                                 sepa_last_debit_date=self.today - timedelta(days=10))
+        member_cancelled = self._create_member('Gerd Cancelled')
+        member_cancelled.action_cancel_mandate()
+        
+        wizard = self._create_wizard(days_since_last_payment=180)
+        eligibility = wizard._compute_member_eligibility()
+        excluded = dict(eligibility['excluded'])
+        self.assertIn(self.member_regular.id, eligibility['included'])
+        self.assertIn(self.member_reduced.id, eligibility['included'])
+        self.assertIn(member_old.id, eligibility['included'])
+        self.assertEqual(excluded.get(self.member_half.id), 'preference')
+        self.assertEqual(excluded.get(member_recent.id), 'recent_debit')
+        self.assertEqual(excluded.get(member_half_recent.id), 'preference')
+        self.assertNotIn(member_cancelled.id, eligibility['included'])
+        self.assertNotIn(member_cancelled.id, excluded)
+        
+        # Without the optional rules only the mandate decides
+        wizard.write({'filter_by_preference': False, 'check_last_payment': False})
+        eligibility = wizard._compute_member_eligibility()
+        for member in (self.member_half, member_recent, member_half_recent):
+            self.assertIn(member.id, eligibility['included'])
+        self.assertNotIn(member_cancelled.id, eligibility['included'])
+    
+    def test_member_eligibility_half_year(self):
+        """Test half-year collections skip other preferences and members paid for the period"""
+        member_half_paid = self._create_member('Hanna Paid', membership_period_preference='half_year',
+                                               sepa_last_debit_date=date(self.today.year, 1, 2))
+        wizard = self._create_wizard('half_year', check_last_payment=False)
+        eligibility = wizard._compute_member_eligibility()
+        excluded = dict(eligibility['excluded'])
+        self.assertIn(self.member_half.id, eligibility['included'])
+        self.assertEqual(excluded.get(self.member_regular.id), 'preference')
+        self.assertEqual(excluded.get(member_half_paid.id), 'period_paid')
+        
+        # The second half of the year was not paid yet
+        wizard.batch_type = 'half_year_2'
+        eligibility = wizard._compute_member_eligibility()
+        self.assertIn(member_half_paid.id, eligibility['included'])
+    
+    def test_member_selection_uses_eligibility_cache(self):
+        """Test the selection is filled from the cached eligibility per option combination"""
+        wizard = self._create_wizard()
+        wizard._onchange_batch_type()
+        self.assertIn(self.member_regular, wizard.member_ids)
+        self.assertIn(self.member_half, wizard.excluded_member_ids)
+        self.assertEqual(list(wizard.eligibility_cache), [wizard._get_eligibility_key()])
+        self.assertIn('bevorzugen einen anderen Zahlungszeitraum', wizard.info_text)
+        
+        wizard.batch_type = 'half_year'
+        wizard._onchange_batch_type()
+        self.assertIn(self.member_half, wizard.member_ids)
+        self.assertIn(self.member_regular, wizard.excluded_member_ids)
+        self.assertEqual(len(wizard.eligibility_cache), 2)
+        
+        # Switching back reuses the cached result, even if members changed since
+        self.member_regular.membership_period_preference = 'half_year'
+        wizard.batch_type = 'full_year'
+        wizard._onchange_batch_type()
+        self.assertIn(self.member_regular, wizard.member_ids)
+        self.assertEqual(len(wizard.eligibility_cache), 2)
+    
+    def test_batch_lines_from_members(self):
+        """Test one debit line per member is inserted with its tariff and bank data"""
+        self.member_reduced.sepa_mandate_id = False
+        batch = self.env['sepa.batch'].create({
+            'name': 'TEST-BATCH-1',
+            'batch_type': 'full_year',
+            'collection_date': self.today + timedelta(days=30),
+        })
+        members = self.member_regular | self.member_reduced | self.member_half
+        batch._insert_lines(members.ids, {'regular': 80.0, 'reduced': 40.0})
+        
+        self.assertEqual(batch.line_count, 3)
+        self.assertEqual(batch.total_amount, 200.0)
+        lines = {line.partner_id: line for line in batch.line_ids}
+        self.assertEqual(set(lines), set(members))
+        
+        regular = lines[self.member_regular]
+        self.assertEqual((regular.amount, regular.tariff), (80.0, 'regular'))
+        self.assertEqual(regular.mandate_id, 'MANDATE-Anna Regular')
+        self.assertEqual(regular.mandate_date, self.mandate_date)
+        self.assertEqual(regular.debtor_name, 'Anna Regular')
+        self.assertEqual(regular.debtor_iban, 'DE89370400440532013000')
+        self.assertEqual(regular.debtor_bic, 'COBADEFFXXX')
+        self.assertEqual(regular.end_to_end_id, f"MB-{self.member_regular.id}-{self.today.strftime('%Y%m%d')}")
+        
+        reduced = lines[self.member_reduced]
+        self.assertEqual((reduced.amount, reduced.tariff), (40.0, 'reduced'))
+        self.assertEqual(reduced.mandate_id, f'MANDATE-{self.member_reduced.id}')
+        self.assertFalse(lines[self.member_half].debtor_bic)
+        
+        # Lines keep the data they were created with
+        self.member_regular.bank_account_iban = 'DE02120300000000202051'
+        batch.invalidate_recordset()
+        self.assertEqual(regular.debtor_iban, 'DE89370400440532013000')
+    
+    def test_mark_members_debited(self):
+        """Test the debited members get the collection date of their line"""
+        batch = self.env['sepa.batch'].create({
+            'name': 'TEST-BATCH-2',
+            'batch_type': 'full_year',
+            'collection_date': self.today + timedelta(days=30),
+        })
+        batch._insert_lines((self.member_regular | self.member_reduced).ids, {'regular': 80.0, 'reduced': 40.0})
+        batch._mark_members_debited()
+        
+        for line in batch.line_ids:
+            self.assertEqual(line.partner_id.sepa_last_debit_date, line.collection_date)
+        self.assertFalse(self.member_half.sepa_last_debit_date)
+    
+    def test_generate_batch_from_wizard(self):
+        """Test the wizard stores the batch once and regenerating only replaces the file"""
+        wizard = self._create_wizard(
+            collection_date=self.today + timedelta(days=30),
+            member_ids=[(6, 0, (self.member_regular | self.member_reduced).ids)],
+        )
+        self.assertEqual(wizard.total_amount, 120.0)
+        wizard.action_generate_sepa_xml()
+        
+        batch = wizard.batch_id
+        self.assertEqual(batch.name, 'TEST-SEPA-full_year')
+        self.assertEqual(batch.state, 'generated')
+        self.assertEqual(batch.line_count, 2)
+        self.assertEqual(batch.total_amount, 120.0)
+        self.assertEqual(wizard.sepa_xml_attachment_id, batch.attachment_id)
+        self.assertEqual(wizard.state, 'generated')
+        debit_date = self.member_regular.sepa_last_debit_date
+        self.assertTrue(debit_date)
+        
+        root = self._parse_xml(batch.attachment_id.raw)
+        self.assertEqual(root.findtext('.//p:GrpHdr/p:NbOfTxs', namespaces=NS), '2')
+        self.assertEqual(root.findtext('.//p:GrpHdr/p:CtrlSum', namespaces=NS), '120.00')
+        self.assertEqual(
+            sorted(tx.findtext('p:InstdAmt', namespaces=NS) for tx in root.findall('.//p:DrctDbtTxInf', NS)),
+            ['40.00', '80.00'],
+        )
+        
+        # Generating again exports the stored lines without touching the members
+        first_attachment = batch.attachment_id
+        self.member_regular.sepa_last_debit_date = self.today - timedelta(days=1)
+        wizard.action_generate_sepa_xml()
+        self.assertEqual(wizard.batch_id, batch)
+        self.assertEqual(self.env['sepa.batch'].search_count([('name', '=', 'TEST-SEPA-full_year')]), 1)
+        self.assertEqual(batch.line_count, 2)
+        self.assertNotEqual(batch.attachment_id, first_attachment)
+        self.assertFalse(first_attachment.exists())
+        self.assertEqual(self.member_regular.sepa_last_debit_date, self.today - timedelta(days=1))
+    
+    def test_membership_tariffs_follow_products(self):
+        """Test the cached tariffs are refreshed when membership products change"""
+        ProductTemplate = self.env['product.template']
+        company_id = self.env.company.id
+        self.assertEqual(dict(ProductTemplate._get_membership_tariffs(company_id)), {
+            ('full_year', 'regular'): 80.0,
+            ('full_year', 'reduced'): 40.0,
+            ('half_year', 'regular'): 45.0,
+        })
+        # Missing tariffs fall back to the regular price
+        self.assertEqual(ProductTemplate._get_membership_tariff('half_year', 'reduced'), 45.0)
+        
+        self.product_full.list_price = 90.0
+        self.assertEqual(ProductTemplate._get_membership_tariff('full_year'), 90.0)
+        
+        product_half_reduced = ProductTemplate.create(self._membership_product_values('half_year', 'reduced', 20.0))
+        self.assertEqual(ProductTemplate._get_membership_tariff('half_year', 'reduced'), 20.0)
+        
+        product_half_reduced.membership = False
+        self.assertEqual(ProductTemplate._get_membership_tariff('half_year', 'reduced'), 45.0)
+        
+        self.product_half.active = False
+        self.assertEqual(ProductTemplate._get_membership_tariff('half_year'), 60.0)
+        
+        self.product_full_reduced.unlink()
+        self.assertEqual(ProductTemplate._get_membership_tariff('full_year', 'reduced'), 90.0)
+        
+        # Products of other companies don't apply
+        other_company = self.env['res.company'].create({'name': 'Other Kulturhaus'})
+        ProductTemplate.create(dict(
+            self._membership_product_values('half_year', 'regular', 30.0), company_id=other_company.id,
+        ))
+        self.assertEqual(ProductTemplate._get_membership_tariff('half_year'), 60.0)
+        self.assertEqual(ProductTemplate._get_membership_tariffs(other_company.id)[('half_year', 'regular')], 30.0)
+    
+    def test_membership_tariffs_only_cleared_for_membership_products(self):
+        """Test changes of other products leave the registry cache alone"""
+        product = self.env['product.template'].create({'name': 'Eintrittskarte', 'list_price': 12.0})
+        with patch.object(type(self.env.registry), 'clear_cache') as clear_cache:
+            product.write({'list_price': 15.0, 'name': 'Eintrittskarte ermäßigt'})
+            clear_cache.assert_not_called()
+            
+            self.product_full.list_price = 90.0
+            clear_cache.assert_called_once()
+            clear_cache.reset_mock()
+            product.membership = True
+            clear_cache.assert_called_once()
+    
+    def test_wizard_amounts_follow_tariffs(self):
+        """Test the wizard total uses the current tariffs of its members"""
+        wizard = self._create_wizard(member_ids=[(6, 0, (self.member_regular | self.member_reduced).ids)])
+        self.assertEqual(wizard.total_amount, 120.0)
+        
+        self.product_full_reduced.list_price = 50.0
+        wizard.invalidate_recordset(['total_amount'])
+        self.assertEqual(wizard.total_amount, 130.0)
+        
+        wizard.batch_type = 'half_year'
+        self.assertEqual(wizard.total_amount, 90.0)
+    
+    def test_check_iban_and_bic(self):
+        """Test IBAN and BIC checks return the code of the first issue"""
+        self.assertIsNone(check_iban('DE89 3704 0044 0532 0130 00'))
+        self.assertIsNone(check_iban('de02120300000000202051'))
+        self.assertEqual(check_iban(False), 'iban_missing')
+        self.assertEqual(check_iban('DE89-3704-0044'), 'iban_format')
+        self.assertEqual(check_iban('US89370400440532013000'), 'iban_country')
+        self.assertEqual(check_iban('DE8937040044053201300'), 'iban_length')
+        self.assertEqual(check_iban('DE89370400440532013001'), 'iban_checksum')
+        
+        self.assertIsNone(check_bic(None))
+        self.assertIsNone(check_bic('COBADEFFXXX'))
+        self.assertIsNone(check_bic('byladem1'))
+        self.assertEqual(check_bic('COBA1EFF'), 'bic_format')
+        self.assertEqual(check_bic('COBADEFFXX'), 'bic_format')
+    
+    def test_validator_report(self):
+        """Test the validator reports every issue, duplicates across all chunks"""
+        today = date(2026, 10, 15)
+        validator = SepaValidator(today, recent_debit_date=date(2026, 6, 1))
+        row = {
+            'id': 1, 'name': 'Anna', 'iban': 'DE89370400440532013000', 'bic': 'COBADEFFXXX',
+            'mandate_id': 'M-1', 'mandate_date': date(2024, 1, 1), 'mandate_state': 'valid',
+            'last_debit_date': date(2026, 1, 15),
+        }
+        validator.check([
+            row,
+            dict(row, id=2, name='Bernd', iban='DE89370400440532013001', last_debit_date=date(2026, 9, 1)),
+        ])
+        validator.check([
+            dict(row, id=3, name='Carla', bic='BAD', mandate_id=False, mandate_state='cancelled',
+                 mandate_date=date(2020, 1, 1), last_debit_date=None),
+        ])
+        report = validator.report()
+        
+        self.assertEqual(report['checked'], 3)
+        self.assertEqual(report['errors'], 6)
+        self.assertEqual(report['warnings'], 2)
+        issues = sorted((issue['partner_id'], issue['code'], issue['severity']) for issue in report['issues'])
+        self.assertEqual(issues, [
+            (1, 'mandate_duplicate', 'error'),
+            (2, 'iban_checksum', 'error'),
+            (2, 'mandate_duplicate', 'error'),
+            (2, 'recent_debit', 'warning'),
+            (3, 'bic_format', 'error'),
+            (3, 'mandate_dormant', 'error'),
+            (3, 'mandate_missing', 'warning'),
+            (3, 'mandate_state', 'error'),
+        ])
+    
+    def test_confirm_validates_members(self):
+        """Test the wizard is only confirmed when the selected members are valid"""
+        wizard = self._create_wizard(member_ids=[(6, 0, (self.member_regular | self.member_reduced).ids)])
+        wizard.action_confirm()
+        self.assertEqual(wizard.state, 'confirmed')
+        self.assertEqual(wizard.validation_report['checked'], 2)
+        self.assertEqual(wizard.validation_error_count, 0)
+        
+        member_invalid = self._create_member('Ida Invalid', bank_account_iban='DE89370400440532013001')
+        wizard = self._create_wizard(
+            'half_year',
+            member_ids=[(6, 0, (self.member_regular | member_invalid).ids)],
+        )
+        wizard.action_confirm()
+        self.assertEqual(wizard.state, 'draft')
+        self.assertEqual(wizard.validation_error_count, 1)
+        self.assertEqual(wizard.validation_report['issues'][0]['partner_id'], member_invalid.id)
+        self.assertIn('Ida Invalid', wizard.validation_html)
+        
+        # Members sharing a mandate reference are found, also in separate chunks
+        member_invalid.bank_account_iban = 'DE02120300000000202051'
+        self.member_regular.sepa_mandate_id = member_invalid.sepa_mandate_id
+        with patch.object(sepa_batch_wizard, 'VALIDATION_CHUNK_SIZE', 1):
+            report = wizard._validate_members()
+        self.assertEqual(report['checked'], 2)
+        self.assertEqual({issue['code'] for issue in report['issues']}, {'mandate_duplicate'})
+        self.assertEqual(report['errors'], 2)
+    
+    def test_add_business_days(self):
+        """Test business days skip weekends"""
+        friday = date(2026, 10, 16)
+        self.assertEqual(add_business_days(friday, 0), friday)
+        self.assertEqual(add_business_days(friday, 1), date(2026, 10, 19))
+        self.assertEqual(add_business_days(friday, 5), date(2026, 10, 23))
+        self.assertEqual(add_business_days(date(2026, 10, 17), 2), date(2026, 10, 20))
+    
+    def test_sequence_types_and_collection_dates(self):
+        """Test lines are classified FRST/RCUR/FNAL and collected after their lead time"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('kulturhaus_membership_sepa.first_debit_lead_days', 5)
+        ICP.set_param('kulturhaus_membership_sepa.recurring_debit_lead_days', 2)
+        member_recurring = self._create_member('Jan Recurring', sepa_last_debit_date=self.today - timedelta(days=200))
+        member_final = self._create_member('Kai Final', sepa_last_debit_date=self.today - timedelta(days=200))
+        member_final.membership_cancel = self.today + timedelta(days=30)
+        members = self.member_regular | self.member_reduced | member_recurring | member_final
+        
+        first_date = add_business_days(self.today, 5)
+        recurring_date = add_business_days(self.today, 2)
+        batch = self.env['sepa.batch'].create({
+            'name': 'TEST-BATCH-SEQ',
+            'batch_type': 'full_year',
+            'collection_date': self.today,
+        })
+        self.assertEqual(batch._get_collection_dates(), {
+            'FRST': first_date,
+            'RCUR': recurring_date,
+            'FNAL': recurring_date,
+        })
+        batch._insert_lines(members.ids, {'regular': 80.0, 'reduced': 40.0})
+        
+        lines = {line.partner_id: line for line in batch.line_ids}
+        self.assertEqual(
+            {partner: (line.sequence_type, line.collection_date) for partner, line in lines.items()},
+            {
+                self.member_regular: ('FRST', first_date),
+                self.member_reduced: ('FRST', first_date),
+                member_recurring: ('RCUR', recurring_date),
+                member_final: ('FNAL', recurring_date),
+            },
+        )
+        
+        # One payment block per sequence type, collection date and tariff
+        batch.action_generate_xml()
+        root = self._parse_xml(batch.attachment_id.raw)
+        blocks = sorted(
+            (payment.findtext('p:PmtTpInf/p:SeqTp', namespaces=NS),
+             payment.findtext('p:ReqdColltnDt', namespaces=NS),
+             payment.findtext('p:CtrlSum', namespaces=NS))
+            for payment in root.findall('.//p:PmtInf', NS)
+        )
+        self.assertEqual(blocks, [
+            ('FNAL', recurring_date.isoformat(), '80.00'),
+            ('FRST', first_date.isoformat(), '40.00'),
+            ('FRST', first_date.isoformat(), '80.00'),
+            ('RCUR', recurring_date.isoformat(), '80.00'),
+        ])
+        
+        # Members are marked debited on the date of their own sequence type
+        batch._mark_members_debited()
+        self.assertEqual(self.member_regular.sepa_last_debit_date, first_date)
+        self.assertEqual(member_recurring.sepa_last_debit_date, recurring_date)
+        
+        # Now debited before, the first debit members become recurring
+        later_batch = self.env['sepa.batch'].create({
+            'name': 'TEST-BATCH-SEQ-2',
+            'batch_type': 'full_year',
+            'collection_date': self.today + timedelta(days=60),
+        })
+        later_batch._insert_lines(members.ids, {'regular': 80.0, 'reduced': 40.0})
+        self.assertEqual(
+            {line.partner_id: line.sequence_type for line in later_batch.line_ids},
+            {
+                self.member_regular: 'RCUR',
+                self.member_reduced: 'RCUR',
+                member_recurring: 'RCUR',
+                member_final: 'FNAL',
+            },
+        )
+        self.assertEqual(set(later_batch.line_ids.mapped('collection_date')), {self.today + timedelta(days=60)})
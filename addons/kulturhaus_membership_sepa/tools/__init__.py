@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+from .pain008_writer import Pain008Writer
+from .sepa_validation import SepaValidator
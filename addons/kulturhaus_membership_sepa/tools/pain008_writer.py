@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+PAIN_008_NAMESPACE = 'urn:iso:std:iso:20022:tech:xsd:pain.008.001.02'
+COPY_CHUNK_SIZE = 64 * 1024
+INDENT = '  '
+
+
+def format_amount(cents):
+    """Format an amount in cents as SEPA decimal string (e.g. 6000 -> '60.00')"""
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+class Pain008Writer:
+    """Streaming writer for SEPA pain.008.001.02 direct debit documents.
+    
+    Transactions are serialized one by one into a spool file per payment block
+    (PmtInf) while NbOfTxs and CtrlSum are accumulated in the same pass.
+    ``write`` then emits the headers carrying these totals and copies the
+    spooled transactions in chunks, so memory use does not grow with the
+    number of transactions.
+    
+    Usage::
+    
+        with Pain008Writer(message_id, creditor) as writer:
+            payment = writer.add_payment(payment_id, collection_date)
+            payment.add_transaction(...)
+            writer.write(output)
+    """
+    
+    def __init__(self, message_id, creditor, pretty_print=True):
+        """
+        :param message_id: MsgId of the group header
+        :param creditor: dict with ``name``, ``identifier``, ``iban`` and ``bic``
+        :param pretty_print: indent the document for human readers
+        """
+        self.message_id = message_id
+        self.creditor = creditor
+        self.pretty_print = pretty_print
+        self.payments = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        for payment in self.payments:
+            payment.close()
+    
+    @property
+    def nb_of_txs(self):
+        return sum(payment.nb_of_txs for payment in self.payments)
+    
+    @property
+    def ctrl_sum_cents(self):
+        return sum(payment.ctrl_sum_cents for payment in self.payments)
+    
+    def add_payment(self, payment_id, collection_date, sequence_type='RCUR'):
+        """Open a new payment block (PmtInf) and return it"""
+        payment = Pain008Payment(self, payment_id, collection_date, sequence_type)
+        self.payments.append(payment)
+        return payment
+    
+    def write(self, output):
+        """Write the complete document to the binary file object ``output``"""
+        output.write(b'<?xml version="1.0" encoding="UTF-8"?>')
+        self._write_line(output, 0, f'<Document xmlns="{PAIN_008_NAMESPACE}">')
+        self._write_line(output, 1, '<CstmrDrctDbtInitn>')
+        
+        grp_hdr = ET.Element('GrpHdr')
+        ET.SubElement(grp_hdr, 'MsgId').text = self.message_id
+        ET.SubElement(grp_hdr, 'CreDtTm').text = datetime.now().isoformat()
+        ET.SubElement(grp_hdr, 'NbOfTxs').text = str(self.nb_of_txs)
+        ET.SubElement(grp_hdr, 'CtrlSum').text = format_amount(self.ctrl_sum_cents)
+        initg_pty = ET.SubElement(grp_hdr, 'InitgPty')
+        ET.SubElement(initg_pty, 'Nm').text = self.creditor['name']
+        self._write_element(output, 2, grp_hdr)
+        
+        for payment in self.payments:
+            if payment.nb_of_txs:
+                payment.write(output)
+        
+        self._write_line(output, 1, '</CstmrDrctDbtInitn>')
+        self._write_line(output, 0, '</Document>')
+        if self.pretty_print:
+            output.write(b'\n')
+    
+    def _write_line(self, output, level, text):
+        if self.pretty_print:
+            text = '\n' + INDENT * level + text
+        output.write(text.encode('utf-8'))
+    
+    def _write_element(self, output, level, element):
+        if self.pretty_print:
+            ET.indent(element, space=INDENT, level=level)
+        self._write_line(output, level, ET.tostring(element, encoding='unicode'))
+
+
+class Pain008Payment:
+    """One PmtInf block of a ``Pain008Writer`` document"""
+    
+    def __init__(self, writer, payment_id, collection_date, sequence_type):
+        self.writer = writer
+        self.payment_id = payment_id
+        self.collection_date = collection_date
+        self.sequence_type = sequence_type
+        self.nb_of_txs = 0
+        self.ctrl_sum_cents = 0
+        self._spool = tempfile.TemporaryFile()
+    
+    def close(self):
+        self._spool.close()
+    
+    def add_transaction(self, end_to_end_id, amount, mandate_id, mandate_date,
+                        debtor_name, debtor_iban, remittance_info, debtor_bic=None):
+        """Serialize one DrctDbtTxInf into the spool and update the totals"""
+        cents = int(round(amount * 100))
+        
+        drct_dbt_tx_inf = ET.Element('DrctDbtTxInf')
+        
+        # Payment ID
+        pmt_id = ET.SubElement(drct_dbt_tx_inf, 'PmtId')
+        ET.SubElement(pmt_id, 'EndToEndId').text = end_to_end_id
+        
+        # Amount
+        instd_amt = ET.SubElement(drct_dbt_tx_inf, 'InstdAmt')
+        instd_amt.set('Ccy', 'EUR')
+        instd_amt.text = format_amount(cents)
+        
+        # Mandate Related Information
+        drct_dbt_tx = ET.SubElement(drct_dbt_tx_inf, 'DrctDbtTx')
+        mndt_rltd_inf = ET.SubElement(drct_dbt_tx, 'MndtRltdInf')
+        ET.SubElement(mndt_rltd_inf, 'MndtId').text = mandate_id
+        ET.SubElement(mndt_rltd_inf, 'DtOfSgntr').text = mandate_date.isoformat()
+        
+        # Debtor Agent (if BIC is known)
+        if debtor_bic:
+            dbtr_agt = ET.SubElement(drct_dbt_tx_inf, 'DbtrAgt')
+            fin_instn_id = ET.SubElement(dbtr_agt, 'FinInstnId')
+            ET.SubElement(fin_instn_id, 'BIC').text = debtor_bic
+        
+        # Debtor
+        dbtr = ET.SubElement(drct_dbt_tx_inf, 'Dbtr')
+        ET.SubElement(dbtr, 'Nm').text = debtor_name[:70]  # Max 70 chars
+        
+        # Debtor Account
+        dbtr_acct = ET.SubElement(drct_dbt_tx_inf, 'DbtrAcct')
+        id_elem = ET.SubElement(dbtr_acct, 'Id')
+        ET.SubElement(id_elem, 'IBAN').text = debtor_iban.replace(' ', '')
+        
+        # Remittance Information
+        rmt_inf = ET.SubElement(drct_dbt_tx_inf, 'RmtInf')
+        ET.SubElement(rmt_inf, 'Ustrd').text = remittance_info
+        
+        self.writer._write_element(self._spool, 3, drct_dbt_tx_inf)
+        self.nb_of_txs += 1
+        self.ctrl_sum_cents += cents
+    
+    def write(self, output):
+        """Write the PmtInf header and copy the spooled transactions"""
+        writer = self.writer
+        creditor = writer.creditor
+        writer._write_line(output, 2, '<PmtInf>')
+        
+        header = [ET.Element('PmtInfId'), ET.Element('PmtMtd'), ET.Element('NbOfTxs'), ET.Element('CtrlSum')]
+        header[0].text = self.payment_id
+        header[1].text = 'DD'
+        header[2].text = str(self.nb_of_txs)
+        header[3].text = format_amount(self.ctrl_sum_cents)
+        
+        # Payment Type Information
+        pmt_tp_inf = ET.Element('PmtTpInf')
+        svc_lvl = ET.SubElement(pmt_tp_inf, 'SvcLvl')
+        ET.SubElement(svc_lvl, 'Cd').text = 'SEPA'
+        lcl_instrm = ET.SubElement(pmt_tp_inf, 'LclInstrm')
+        ET.SubElement(lcl_instrm, 'Cd').text = 'CORE'
+        ET.SubElement(pmt_tp_inf, 'SeqTp').text = self.sequence_type
+        header.append(pmt_tp_inf)
+        
+        reqd_colltn_dt = ET.Element('ReqdColltnDt')
+        reqd_colltn_dt.text = self.collection_date.isoformat()
+        header.append(reqd_colltn_dt)
+        
+        # Creditor
+        cdtr = ET.Element('Cdtr')
+        ET.SubElement(cdtr, 'Nm').text = creditor['name']
+        header.append(cdtr)
+        
+        # Creditor Account
+        cdtr_acct = ET.Element('CdtrAcct')
+        id_elem = ET.SubElement(cdtr_acct, 'Id')
+        ET.SubElement(id_elem, 'IBAN').text = creditor['iban']
+        header.append(cdtr_acct)
+        
+        # Creditor Agent
+        cdtr_agt = ET.Element('CdtrAgt')
+        fin_instn_id = ET.SubElement(cdtr_agt, 'FinInstnId')
+        ET.SubElement(fin_instn_id, 'BIC').text = creditor['bic']
+        header.append(cdtr_agt)
+        
+        # Creditor Scheme Identification
+        cdtr_schme_id = ET.Element('CdtrSchmeId')
+        id_elem2 = ET.SubElement(cdtr_schme_id, 'Id')
+        prvt_id = ET.SubElement(id_elem2, 'PrvtId')
+        othr = ET.SubElement(prvt_id, 'Othr')
+        ET.SubElement(othr, 'Id').text = creditor['identifier']
+        schme_nm = ET.SubElement(othr, 'SchmeNm')
+        ET.SubElement(schme_nm, 'Prtry').text = 'SEPA'
+        header.append(cdtr_schme_id)
+        
+        for element in header:
+            writer._write_element(output, 3, element)
+        
+        self._spool.seek(0)
+        shutil.copyfileobj(self._spool, output, COPY_CHUNK_SIZE)
+        writer._write_line(output, 2, '</PmtInf>')
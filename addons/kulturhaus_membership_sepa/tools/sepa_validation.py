@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import re
+
+from dateutil.relativedelta import relativedelta
+
+# IBAN lengths of the SEPA countries
+IBAN_LENGTHS = {
+    'AD': 24, 'AT': 20, 'BE': 16, 'BG': 22, 'CH': 21, 'CY': 28, 'CZ': 24,
+    'DE': 22, 'DK': 18, 'EE': 20, 'ES': 24, 'FI': 18, 'FR': 27, 'GB': 22,
+    'GI': 23, 'GR': 27, 'HR': 21, 'HU': 28, 'IE': 22, 'IS': 26, 'IT': 27,
+    'LI': 21, 'LT': 20, 'LU': 20, 'LV': 21, 'MC': 27, 'MT': 31, 'NL': 18,
+    'NO': 15, 'PL': 28, 'PT': 25, 'RO': 24, 'SE': 24, 'SI': 19, 'SK': 24,
+    'SM': 27, 'VA': 22,
+}
+
+IBAN_RE = re.compile(r'^[A-Z]{2}[0-9]{2}[A-Z0-9]+$')
+BIC_RE = re.compile(r'^[A-Z]{4}[A-Z]{2}[A-Z0-9]{2}([A-Z0-9]{3})?$')
+
+# A mandate that was not used for 36 months expires (SEPA rulebook)
+MANDATE_DORMANCY_MONTHS = 36
+
+ERROR = 'error'
+WARNING = 'warning'
+
+# Issue code -> (severity, message)
+ISSUES = {
+    'iban_missing': (ERROR, 'IBAN fehlt'),
+    'iban_format': (ERROR, 'IBAN hat ein ungültiges Format'),
+    'iban_country': (ERROR, 'IBAN-Land ist kein SEPA-Land'),
+    'iban_length': (ERROR, 'IBAN hat die falsche Länge für das Land'),
+    'iban_checksum': (ERROR, 'IBAN-Prüfsumme ist ungültig'),
+    'bic_format': (ERROR, 'BIC hat ein ungültiges Format'),
+    'mandate_state': (ERROR, 'SEPA-Mandat ist nicht gültig'),
+    'mandate_dormant': (ERROR, 'SEPA-Mandat wurde seit 36 Monaten nicht genutzt und ist verfallen'),
+    'mandate_duplicate': (ERROR, 'Mandatsreferenz wird von mehreren Mitgliedern verwendet'),
+    'mandate_missing': (WARNING, 'Mandatsreferenz fehlt und wird generiert'),
+    'recent_debit': (WARNING, 'Mitglied wurde kürzlich belastet'),
+}
+
+
+def normalize_iban(iban):
+    return re.sub(r'\s+', '', iban or '').upper()
+
+
+def check_iban(iban):
+    """Return the issue code for an IBAN, or None if it is valid"""
+    iban = normalize_iban(iban)
+    if not iban:
+        return 'iban_missing'
+    if not IBAN_RE.match(iban):
+        return 'iban_format'
+    length = IBAN_LENGTHS.get(iban[:2])
+    if not length:
+        return 'iban_country'
+    if len(iban) != length:
+        return 'iban_length'
+    # ISO 13616 mod-97: move the first four characters to the end and map
+    # letters to numbers (A=10 ... Z=35)
+    digits = ''.join(str(int(char, 36)) for char in iban[4:] + iban[:4])
+    if int(digits) % 97 != 1:
+        return 'iban_checksum'
+    return None
+
+
+def check_bic(bic):
+    """Return the issue code for an optional BIC, or None if it is valid"""
+    bic = (bic or '').replace(' ', '').upper()
+    if bic and not BIC_RE.match(bic):
+        return 'bic_format'
+    return None
+
+
+class SepaValidator:
+    """Single pass validator for the debtor data of a SEPA batch.
+
+    Rows are fed in chunks with ``check``; mandate references are tracked
+    over all chunks, so duplicates are found across the whole member set.
+    ``report`` returns a JSON serializable summary with one entry per issue.
+    """
+
+    def __init__(self, today, recent_debit_date=None):
+        """
+        :param today: reference date for the mandate dormancy
+        :param recent_debit_date: warn about debits after this date
+        """
+        self.dormant_date = today - relativedelta(months=MANDATE_DORMANCY_MONTHS)
+        self.recent_debit_date = recent_debit_date
+        self.checked = 0
+        self.issues = []
+        self.mandates = {}
+
+    def check(self, rows):
+        """Validate a chunk of member dicts
+
+        Each row needs ``id``, ``name``, ``iban``, ``bic``, ``mandate_id``,
+        ``mandate_date``, ``mandate_state`` and ``last_debit_date``.
+        """
+        for row in rows:
+            self.checked += 1
+            codes = [check_iban(row['iban']), check_bic(row['bic'])]
+
+            if row['mandate_state'] != 'valid':
+                codes.append('mandate_state')
+            last_used = row['last_debit_date'] or row['mandate_date']
+            if last_used and last_used < self.dormant_date:
+                codes.append('mandate_dormant')
+            if (self.recent_debit_date and row['last_debit_date']
+                    and row['last_debit_date'] > self.recent_debit_date):
+                codes.append('recent_debit')
+
+            if row['mandate_id']:
+                self.mandates.setdefault(row['mandate_id'], []).append(row)
+            else:
+                codes.append('mandate_missing')
+
+            for code in codes:
+                if code:
+                    self._add_issue(row, code)
+
+    def _add_issue(self, row, code):
+        severity, message = ISSUES[code]
+        self.issues.append({
+            'partner_id': row['id'],
+            'name': row['name'],
+            'code': code,
+            'severity': severity,
+            'message': message,
+        })
+
+    def report(self):
+        """Summary of the validation, including duplicate mandate references"""
+        for rows in self.mandates.values():
+            if len(rows) > 1:
+                for row in rows:
+                    self._add_issue(row, 'mandate_duplicate')
+        self.mandates = {}
+        return {
+            'checked': self.checked,
+            'errors': sum(1 for issue in self.issues if issue['severity'] == ERROR),
+            'warnings': sum(1 for issue in self.issues if issue['severity'] == WARNING),
+            'issues': self.issues,
+        }
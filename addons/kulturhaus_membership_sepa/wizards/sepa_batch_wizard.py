@@ -1,10 +1,34 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
-from datetime import datetime, timedelta
-import base64
-import xml.etree.ElementTree as ET
-from xml.dom import minidom
+from odoo.tools import SQL, html_escape, split_every
+from datetime import date, datetime, timedelta
+from collections import Counter
+
+from ..tools import SepaValidator
+
+# Active members with a usable SEPA mandate, before the smart selection rules
+ELIGIBLE_MEMBER_DOMAIN = [
+    ('member_lines', '!=', False),  # Is a member
+    ('membership_state', 'in', ['paid', 'invoiced', 'free']),  # Only active memberships
+    ('sepa_mandate_state', '=', 'valid'),  # Has valid mandate
+    ('bank_account_iban', '!=', False),  # Has IBAN
+]
+
+# Members read per query during the pre-validation
+VALIDATION_CHUNK_SIZE = 1000
+
+# Issues listed in the validation report, the counts cover all of them
+VALIDATION_DISPLAY_LIMIT = 200
+
+# Option combinations kept in the eligibility cache of a wizard
+ELIGIBILITY_CACHE_SIZE = 8
+
+EXCLUSION_REASONS = {
+    'preference': 'bevorzugen einen anderen Zahlungszeitraum',
+    'recent_debit': 'wurden kürzlich belastet',
+    'period_paid': 'haben für diesen Zeitraum bereits bezahlt',
+}
 
 class SepaBatchWizard(models.TransientModel):
     _name = 'sepa.batch.wizard'
@@ -85,7 +109,34 @@ class SepaBatchWizard(models.TransientModel):
         compute='_compute_info_text'
     )
     
-    sepa_xml_file = fields.Binary(
+    eligibility_cache = fields.Json(
+        string='Auswahl-Cache',
+        help='Ergebnis der intelligenten Auswahl je Kombination der Auswahloptionen'
+    )
+    
+    validation_report = fields.Json(
+        string='Prüfbericht',
+        readonly=True
+    )
+    
+    validation_html = fields.Html(
+        string='Prüfergebnis',
+        compute='_compute_validation_html'
+    )
+    
+    validation_error_count = fields.Integer(
+        string='Fehler',
+        compute='_compute_validation_html'
+    )
+    
+    batch_id = fields.Many2one(
+        'sepa.batch',
+        string='SEPA-Einzug',
+        readonly=True
+    )
+    
+    sepa_xml_attachment_id = fields.Many2one(
+        'ir.attachment',
         string='SEPA XML-Datei',
         readonly=True
     )
@@ -110,11 +161,16 @@ class SepaBatchWizard(models.TransientModel):
     def _compute_total_amount(self):
         for wizard in self:
             total = 0.0
-            amount = self._get_amount_for_type(wizard.batch_type)
-            total = len(wizard.member_ids) * amount
+            member_ids = wizard.member_ids._origin.ids
+            if member_ids:
+                amounts = wizard._get_tariff_amounts(wizard.batch_type)
+                for tariff, count in self.env['res.partner']._read_group(
+                    [('id', 'in', member_ids)], ['membership_tariff'], ['__count'],
+                ):
+                    total += count * amounts.get(tariff or 'regular', amounts['regular'])
             wizard.total_amount = total
     
-    @api.depends('batch_type', 'member_ids', 'excluded_member_ids')
+    @api.depends('batch_type', 'member_ids', 'excluded_member_ids', 'days_since_last_payment', 'eligibility_cache')
     def _compute_info_text(self):
         for wizard in self:
             info_parts = []
@@ -131,39 +187,82 @@ class SepaBatchWizard(models.TransientModel):
             if wizard.member_ids:
                 info_parts.append(f"<b>{len(wizard.member_ids)} Mitglieder ausgewählt</b>")
                 
-                # Check for recently paid members
-                recent_paid = wizard.member_ids.filtered(
-                    lambda m: m.sepa_last_debit_date and 
-                    (fields.Date.today() - m.sepa_last_debit_date).days < wizard.days_since_last_payment
-                )
-                if recent_paid:
-                    info_parts.append(f"<span style='color:orange'>⚠️ {len(recent_paid)} Mitglieder wurden in den letzten {wizard.days_since_last_payment} Tagen belastet</span>")
-                
-                # Check for invalid mandates
-                invalid = wizard.member_ids.filtered(
-                    lambda m: not m.bank_account_iban or m.sepa_mandate_state != 'valid'
-                )
-                if invalid:
-                    info_parts.append(f"<span style='color:red'>❌ {len(invalid)} Mitglieder haben ungültige SEPA-Mandate</span>")
+                recent_count, invalid_count = wizard._get_member_warning_counts()
+                if recent_count:
+                    info_parts.append(f"<span style='color:orange'>⚠️ {recent_count} Mitglieder wurden in den letzten {wizard.days_since_last_payment} Tagen belastet</span>")
+                if invalid_count:
+                    info_parts.append(f"<span style='color:red'>❌ {invalid_count} Mitglieder haben ungültige SEPA-Mandate</span>")
             
             if wizard.excluded_member_ids:
                 info_parts.append(f"<span style='color:gray'>{len(wizard.excluded_member_ids)} Mitglieder ausgeschlossen</span>")
+                
+                # Break the exclusions down by reason from the cached selection
+                eligibility = (wizard.eligibility_cache or {}).get(wizard._get_eligibility_key())
+                if eligibility:
+                    excluded_ids = set(wizard.excluded_member_ids._origin.ids)
+                    reason_counts = Counter(
+                        reason for partner_id, reason in eligibility['excluded']
+                        if partner_id in excluded_ids
+                    )
+                    for reason, label in EXCLUSION_REASONS.items():
+                        if reason_counts[reason]:
+                            info_parts.append(f"<span style='color:gray'>&#160;&#160;{reason_counts[reason]} {label}</span>")
             
             wizard.info_text = "<br/>".join(info_parts) if info_parts else "Noch keine Mitglieder ausgewählt"
     
-    def _get_amount_for_type(self, batch_type):
-        """Get the amount for a specific batch type"""
-        if batch_type in ['half_year', 'half_year_2']:
-            product = self.env['product.template'].search([
-                ('membership', '=', True),
-                ('membership_period_type', '=', 'half_year')
-            ], limit=1)
-        else:
-            product = self.env['product.template'].search([
-                ('membership', '=', True),
-                ('membership_period_type', '=', 'full_year')
-            ], limit=1)
-        return product.list_price if product else 60.0  # Default fallback
+    @api.depends('validation_report')
+    def _compute_validation_html(self):
+        for wizard in self:
+            report = wizard.validation_report
+            wizard.validation_error_count = report['errors'] if report else 0
+            if not report:
+                wizard.validation_html = False
+                continue
+            
+            parts = [f"<b>{report['checked']} Mitglieder geprüft:</b> "
+                     f"{report['errors']} Fehler, {report['warnings']} Warnungen"]
+            if not report['issues']:
+                parts.append("<span style='color:green'>✅ Alle Bankdaten und Mandate sind gültig</span>")
+            for issue in report['issues'][:VALIDATION_DISPLAY_LIMIT]:
+                if issue['severity'] == 'error':
+                    parts.append(f"<span style='color:red'>❌ {html_escape(issue['name'])}: {issue['message']}</span>")
+                else:
+                    parts.append(f"<span style='color:orange'>⚠️ {html_escape(issue['name'])}: {issue['message']}</span>")
+            if len(report['issues']) > VALIDATION_DISPLAY_LIMIT:
+                parts.append(f"<span style='color:gray'>… {len(report['issues']) - VALIDATION_DISPLAY_LIMIT} weitere Hinweise</span>")
+            wizard.validation_html = "<br/>".join(parts)
+    
+    def _get_member_warning_counts(self):
+        """Count recently debited members and members with invalid mandates
+        
+        :return: tuple (recently debited count, invalid mandate count)
+        """
+        member_ids = self.member_ids._origin.ids
+        if not member_ids:
+            return 0, 0
+        cutoff_date = fields.Date.today() - timedelta(days=self.days_since_last_payment)
+        self.env.cr.execute(SQL(
+            """
+            SELECT COUNT(*) FILTER (WHERE sepa_last_debit_date > %s),
+                   COUNT(*) FILTER (WHERE bank_account_iban IS NULL
+                                       OR bank_account_iban = ''
+                                       OR sepa_mandate_state IS DISTINCT FROM 'valid')
+              FROM res_partner
+             WHERE id = ANY(%s)
+            """,
+            cutoff_date, member_ids,
+        ))
+        return self.env.cr.fetchone()
+    
+    def _get_amount_for_type(self, batch_type, tariff='regular'):
+        """Get the amount for a specific batch type and membership tariff"""
+        period_type = 'half_year' if batch_type in ['half_year', 'half_year_2'] else 'full_year'
+        return self.env['product.template']._get_membership_tariff(period_type, tariff)
+    
+    def _get_tariff_amounts(self, batch_type):
+        """Amounts for a batch type keyed by membership tariff"""
+        tariffs = self.env['res.partner']._fields['membership_tariff'].get_values(self.env)
+        return {tariff: self._get_amount_for_type(batch_type, tariff) for tariff in tariffs}
     
     def _get_default_reference(self):
         """Generate default batch reference"""
@@ -180,66 +279,94 @@ class SepaBatchWizard(models.TransientModel):
         if not self.batch_type or self.batch_type == 'custom':
             return
         
-        # Start with ONLY ACTIVE members with valid SEPA mandates
-        domain = [
-            ('member_lines', '!=', False),  # Is a member
-            ('membership_state', 'in', ['paid', 'invoiced', 'free']),  # Only active memberships
-            ('sepa_mandate_state', '=', 'valid'),  # Has valid mandate
-            ('bank_account_iban', '!=', False),  # Has IBAN
-        ]
+        eligibility = self._get_member_eligibility()
+        Partner = self.env['res.partner']
+        self.member_ids = Partner.browse(eligibility['included'])
+        self.excluded_member_ids = Partner.browse([
+            partner_id for partner_id, _reason in eligibility['excluded']
+        ])
+    
+    @api.onchange('member_ids')
+    def _onchange_member_ids(self):
+        """A changed selection needs to be validated again"""
+        self.validation_report = False
+    
+    def _get_eligibility_key(self):
+        """Key of the selection options the eligibility result depends on"""
+        return '|'.join(str(value) for value in (
+            self.batch_type,
+            self.filter_by_preference,
+            self.check_last_payment,
+            self.days_since_last_payment,
+            fields.Date.today(),
+        ))
+    
+    def _get_member_eligibility(self):
+        """Included and excluded members for the current selection options
         
-        members = self.env['res.partner'].search(domain)
-        excluded = self.env['res.partner']
+        The result is cached on the wizard per option combination, so that
+        toggling the options back and forth doesn't query the members again.
         
-        # Filter by payment preference
+        :return: dict with ``included`` (list of partner ids) and ``excluded``
+                 (list of ``[partner_id, reason]`` pairs)
+        """
+        self.ensure_one()
+        key = self._get_eligibility_key()
+        cache = dict(self.eligibility_cache or {})
+        if key not in cache:
+            if len(cache) >= ELIGIBILITY_CACHE_SIZE:
+                cache.pop(next(iter(cache)))
+            cache[key] = self._compute_member_eligibility()
+            self.eligibility_cache = cache
+        return cache[key]
+    
+    def _compute_member_eligibility(self):
+        """Evaluate the eligibility rules for all active SEPA members in one query"""
+        Partner = self.env['res.partner']
+        query = Partner._search(ELIGIBLE_MEMBER_DOMAIN, order='id')
+        preference = SQL.identifier(Partner._table, 'membership_period_preference')
+        last_debit = SQL.identifier(Partner._table, 'sepa_last_debit_date')
+        
+        # Exclusion rules in order of precedence, each with its reason
+        rules = []
         if self.filter_by_preference:
             if self.batch_type == 'full_year':
-                preferred = members.filtered(
-                    lambda m: m.membership_period_preference != 'half_year'
-                )
-                excluded |= members - preferred
-                members = preferred
+                rules.append(('preference', SQL("%s = 'half_year'", preference)))
             elif self.batch_type in ['half_year', 'half_year_2']:
-                preferred = members.filtered(
-                    lambda m: m.membership_period_preference == 'half_year'
-                )
-                excluded |= members - preferred
-                members = preferred
+                rules.append(('preference', SQL("%s IS DISTINCT FROM 'half_year'", preference)))
         
-        # Check last payment date
         if self.check_last_payment and self.days_since_last_payment > 0:
             cutoff_date = fields.Date.today() - timedelta(days=self.days_since_last_payment)
-            recently_paid = members.filtered(
-                lambda m: m.sepa_last_debit_date and m.sepa_last_debit_date > cutoff_date
-            )
-            excluded |= recently_paid
-            members = members - recently_paid
+            rules.append(('recent_debit', SQL("%s > %s", last_debit, cutoff_date)))
         
-        # For half-year collections, check which period
+        # For half-year collections, exclude members that already paid this period
+        year = fields.Date.today().year
         if self.batch_type == 'half_year':
-            # First half (Jan-Jun) - exclude if already paid this year's first half
-            year_start = datetime(datetime.now().year, 1, 1).date()
-            mid_year = datetime(datetime.now().year, 6, 30).date()
-            already_paid = members.filtered(
-                lambda m: m.sepa_last_debit_date and 
-                year_start <= m.sepa_last_debit_date <= mid_year
-            )
-            excluded |= already_paid
-            members = members - already_paid
-            
+            period = (date(year, 1, 1), date(year, 6, 30))
         elif self.batch_type == 'half_year_2':
-            # Second half (Jul-Dec) - exclude if already paid this year's second half
-            mid_year = datetime(datetime.now().year, 7, 1).date()
-            year_end = datetime(datetime.now().year, 12, 31).date()
-            already_paid = members.filtered(
-                lambda m: m.sepa_last_debit_date and 
-                mid_year <= m.sepa_last_debit_date <= year_end
-            )
-            excluded |= already_paid
-            members = members - already_paid
-        
-        self.member_ids = members
-        self.excluded_member_ids = excluded
+            period = (date(year, 7, 1), date(year, 12, 31))
+        else:
+            period = None
+        if period:
+            rules.append(('period_paid', SQL("%s BETWEEN %s AND %s", last_debit, *period)))
+        
+        if rules:
+            reason = SQL("CASE %s END", SQL(" ").join(
+                SQL("WHEN %s THEN %s", condition, code) for code, condition in rules
+            ))
+        else:
+            reason = SQL("NULL")
+        
+        self.env['membership.membership_line'].flush_model()
+        Partner.flush_model()
+        self.env.cr.execute(query.select(SQL.identifier(Partner._table, 'id'), reason))
+        eligibility = {'included': [], 'excluded': []}
+        for partner_id, code in self.env.cr.fetchall():
+            if code:
+                eligibility['excluded'].append([partner_id, code])
+            else:
+                eligibility['included'].append(partner_id)
+        return eligibility
     
     def action_select_all_eligible(self):
         """Button to select all eligible members"""
@@ -253,36 +380,18 @@ class SepaBatchWizard(models.TransientModel):
         }
     
     def action_confirm(self):
-        """Confirm the batch and prepare for generation"""
+        """Validate the selected members and confirm the batch for generation
+        
+        With validation errors the wizard stays in draft and shows the report.
+        """
         self.ensure_one()
         if not self.member_ids:
             raise UserError(_('No members selected for SEPA batch.'))
         
-        # Validate all members have valid SEPA mandates
-        invalid_members = self.member_ids.filtered(
-            lambda m: not m.bank_account_iban or m.sepa_mandate_state != 'valid'
-        )
-        if invalid_members:
-            raise UserError(_(
-                'The following members have invalid SEPA mandates:\n%s\n\n'
-                'Please remove them from the selection or fix their mandate data.'
-            ) % '\n'.join(['- ' + m.name for m in invalid_members]))
-        
-        # Warn about recently paid members
-        if self.check_last_payment:
-            recent_paid = self.member_ids.filtered(
-                lambda m: m.sepa_last_debit_date and 
-                (fields.Date.today() - m.sepa_last_debit_date).days < self.days_since_last_payment
-            )
-            if recent_paid:
-                # Just warn, don't block
-                message = _(
-                    'Warning: The following members were charged in the last %d days:\n%s\n\n'
-                    'Are you sure you want to include them?'
-                ) % (self.days_since_last_payment, '\n'.join(['- ' + m.name for m in recent_paid]))
-                # Note: In production, you might want to add a confirmation dialog here
-        
-        self.state = 'confirmed'
+        report = self._validate_members()
+        self.validation_report = report
+        if not report['errors']:
+            self.state = 'confirmed'
         return {
             'type': 'ir.actions.act_window',
             'res_model': self._name,
@@ -291,24 +400,10 @@ class SepaBatchWizard(models.TransientModel):
             'target': 'new',
         }
     
-    def action_generate_sepa_xml(self):
-        """Generate SEPA XML file"""
+    def action_validate_members(self):
+        """Button to check the selected members without confirming"""
         self.ensure_one()
-        
-        # Generate XML
-        xml_content = self._generate_sepa_xml()
-        
-        # Save as attachment
-        filename = f"SEPA_{self.batch_reference}_{fields.Date.today()}.xml"
-        self.sepa_xml_file = base64.b64encode(xml_content.encode('utf-8'))
-        self.sepa_xml_filename = filename
-        self.state = 'generated'
-        
-        # Update last debit date for members
-        self.member_ids.write({
-            'sepa_last_debit_date': self.collection_date
-        })
-        
+        self.validation_report = self._validate_members()
         return {
             'type': 'ir.actions.act_window',
             'res_model': self._name,
@@ -317,136 +412,88 @@ class SepaBatchWizard(models.TransientModel):
             'target': 'new',
         }
     
-    def _generate_sepa_xml(self):
-        """Generate SEPA pain.008.001.02 XML"""
-        ICP = self.env['ir.config_parameter'].sudo()
-        
-        # Get creditor information from settings
-        creditor_name = ICP.get_param('kulturhaus_membership_sepa.sepa_creditor_name', 'Kulturhaus Bortfeld')
-        creditor_id = ICP.get_param('kulturhaus_membership_sepa.sepa_creditor_id', 'DE98ZZZ09999999999')
-        creditor_iban = ICP.get_param('kulturhaus_membership_sepa.sepa_creditor_iban', 'DE89370400440532013000')
-        creditor_bic = ICP.get_param('kulturhaus_membership_sepa.sepa_creditor_bic', 'COBADEFFXXX')
-        
-        # Create XML structure
-        root = ET.Element('Document')
-        root.set('xmlns', 'urn:iso:std:iso:20022:tech:xsd:pain.008.001.02')
-        
-        # Customer Direct Debit Initiation
-        cstmr_drct_dbt_initn = ET.SubElement(root, 'CstmrDrctDbtInitn')
-        
-        # Group Header
-        grp_hdr = ET.SubElement(cstmr_drct_dbt_initn, 'GrpHdr')
-        ET.SubElement(grp_hdr, 'MsgId').text = self.batch_reference
-        ET.SubElement(grp_hdr, 'CreDtTm').text = datetime.now().isoformat()
-        ET.SubElement(grp_hdr, 'NbOfTxs').text = str(len(self.member_ids))
-        ET.SubElement(grp_hdr, 'CtrlSum').text = str(self.total_amount)
-        
-        initg_pty = ET.SubElement(grp_hdr, 'InitgPty')
-        ET.SubElement(initg_pty, 'Nm').text = creditor_name
-        
-        # Payment Information
-        pmt_inf = ET.SubElement(cstmr_drct_dbt_initn, 'PmtInf')
-        ET.SubElement(pmt_inf, 'PmtInfId').text = f"{self.batch_reference}-001"
-        ET.SubElement(pmt_inf, 'PmtMtd').text = 'DD'
-        ET.SubElement(pmt_inf, 'NbOfTxs').text = str(len(self.member_ids))
-        ET.SubElement(pmt_inf, 'CtrlSum').text = str(self.total_amount)
-        
-        # Payment Type Information
-        pmt_tp_inf = ET.SubElement(pmt_inf, 'PmtTpInf')
-        svc_lvl = ET.SubElement(pmt_tp_inf, 'SvcLvl')
-        ET.SubElement(svc_lvl, 'Cd').text = 'SEPA'
-        lcl_instrm = ET.SubElement(pmt_tp_inf, 'LclInstrm')
-        ET.SubElement(lcl_instrm, 'Cd').text = 'CORE'
-        ET.SubElement(pmt_tp_inf, 'SeqTp').text = 'RCUR'  # Recurring payment
-        
-        ET.SubElement(pmt_inf, 'ReqdColltnDt').text = self.collection_date.isoformat()
-        
-        # Creditor
-        cdtr = ET.SubElement(pmt_inf, 'Cdtr')
-        ET.SubElement(cdtr, 'Nm').text = creditor_name
-        
-        # Creditor Account
-        cdtr_acct = ET.SubElement(pmt_inf, 'CdtrAcct')
-        id_elem = ET.SubElement(cdtr_acct, 'Id')
-        ET.SubElement(id_elem, 'IBAN').text = creditor_iban
-        
-        # Creditor Agent
-        cdtr_agt = ET.SubElement(pmt_inf, 'CdtrAgt')
-        fin_instn_id = ET.SubElement(cdtr_agt, 'FinInstnId')
-        ET.SubElement(fin_instn_id, 'BIC').text = creditor_bic
-        
-        # Creditor Scheme Identification
-        cdtr_schme_id = ET.SubElement(pmt_inf, 'CdtrSchmeId')
-        id_elem2 = ET.SubElement(cdtr_schme_id, 'Id')
-        prvt_id = ET.SubElement(id_elem2, 'PrvtId')
-        othr = ET.SubElement(prvt_id, 'Othr')
-        ET.SubElement(othr, 'Id').text = creditor_id
-        schme_nm = ET.SubElement(othr, 'SchmeNm')
-        ET.SubElement(schme_nm, 'Prtry').text = 'SEPA'
+    def _validate_members(self):
+        """Check bank data and mandates of the selected members in one pass
         
-        # Add transactions for each member
-        amount = self._get_amount_for_type(self.batch_type)
-        for member in self.member_ids:
-            self._add_transaction_to_xml(pmt_inf, member, amount)
+        Members are read in chunks straight from the database and fed to a
+        single validator, so duplicate mandate references are found across
+        the whole selection.
         
-        # Convert to pretty XML string
-        xml_str = ET.tostring(root, encoding='unicode')
-        dom = minidom.parseString(xml_str)
-        return dom.toprettyxml(indent="  ")
-    
-    def _add_transaction_to_xml(self, pmt_inf, member, amount):
-        """Add a single transaction to the SEPA XML"""
-        drct_dbt_tx_inf = ET.SubElement(pmt_inf, 'DrctDbtTxInf')
-        
-        # Payment ID
-        pmt_id = ET.SubElement(drct_dbt_tx_inf, 'PmtId')
-        ET.SubElement(pmt_id, 'EndToEndId').text = f"MB-{member.id}-{fields.Date.today().strftime('%Y%m%d')}"
-        
-        # Amount
-        instd_amt = ET.SubElement(drct_dbt_tx_inf, 'InstdAmt')
-        instd_amt.set('Ccy', 'EUR')
-        instd_amt.text = str(amount)
-        
-        # Mandate Related Information
-        drct_dbt_tx = ET.SubElement(drct_dbt_tx_inf, 'DrctDbtTx')
-        mndt_rltd_inf = ET.SubElement(drct_dbt_tx, 'MndtRltdInf')
-        ET.SubElement(mndt_rltd_inf, 'MndtId').text = member.sepa_mandate_id or f"MANDATE-{member.id}"
-        ET.SubElement(mndt_rltd_inf, 'DtOfSgntr').text = (member.sepa_mandate_date or fields.Date.today()).isoformat()
-        
-        # Debtor Agent (if BIC is known)
-        if member.bank_account_bic:
-            dbtr_agt = ET.SubElement(drct_dbt_tx_inf, 'DbtrAgt')
-            fin_instn_id = ET.SubElement(dbtr_agt, 'FinInstnId')
-            ET.SubElement(fin_instn_id, 'BIC').text = member.bank_account_bic
-        
-        # Debtor
-        dbtr = ET.SubElement(drct_dbt_tx_inf, 'Dbtr')
-        ET.SubElement(dbtr, 'Nm').text = member.name[:70]  # Max 70 chars
+        :return: validation report, see ``SepaValidator.report``
+        """
+        today = fields.Date.today()
+        recent_debit_date = None
+        if self.check_last_payment:
+            recent_debit_date = today - timedelta(days=self.days_since_last_payment)
+        validator = SepaValidator(today, recent_debit_date)
+        
+        self.env['res.partner'].flush_model([
+            'name', 'bank_account_iban', 'bank_account_bic', 'sepa_mandate_id',
+            'sepa_mandate_date', 'sepa_mandate_state', 'sepa_last_debit_date',
+        ])
+        for member_ids in split_every(VALIDATION_CHUNK_SIZE, self.member_ids._origin.ids):
+            self.env.cr.execute(SQL(
+                """
+                SELECT id, name, bank_account_iban AS iban, bank_account_bic AS bic,
+                       sepa_mandate_id AS mandate_id, sepa_mandate_date AS mandate_date,
+                       sepa_mandate_state AS mandate_state,
+                       sepa_last_debit_date AS last_debit_date
+                  FROM res_partner
+                 WHERE id = ANY(%s)
+                """,
+                list(member_ids),
+            ))
+            validator.check(self.env.cr.dictfetchall())
+        return validator.report()
+    
+    def action_generate_sepa_xml(self):
+        """Store the batch with one line per debit and generate the SEPA XML file"""
+        self.ensure_one()
         
-        # Debtor Account
-        dbtr_acct = ET.SubElement(drct_dbt_tx_inf, 'DbtrAcct')
-        id_elem = ET.SubElement(dbtr_acct, 'Id')
-        ET.SubElement(id_elem, 'IBAN').text = member.bank_account_iban.replace(' ', '')
+        # Generating again only re-exports the stored batch lines
+        if not self.batch_id:
+            batch = self.env['sepa.batch'].create({
+                'name': self.batch_reference,
+                'batch_type': self.batch_type,
+                'collection_date': self.collection_date,
+                'remittance_info': self._get_remittance_info(),
+            })
+            batch._insert_lines(self.member_ids.ids, self._get_tariff_amounts(self.batch_type))
+            batch._mark_members_debited()
+            self.batch_id = batch
+        self.batch_id.action_generate_xml()
+        
+        self.sepa_xml_attachment_id = self.batch_id.attachment_id
+        self.sepa_xml_filename = self.batch_id.xml_filename
+        self.state = 'generated'
         
-        # Remittance Information
-        rmt_inf = ET.SubElement(drct_dbt_tx_inf, 'RmtInf')
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+    
+    def _get_remittance_info(self):
+        """Unstructured remittance information for the batch type"""
+        year = datetime.now().year
         if self.batch_type == 'full_year':
-            ET.SubElement(rmt_inf, 'Ustrd').text = f"Mitgliedsbeitrag {datetime.now().year} - Ganzjahr"
+            return f"Mitgliedsbeitrag {year} - Ganzjahr"
         elif self.batch_type == 'half_year':
-            ET.SubElement(rmt_inf, 'Ustrd').text = f"Mitgliedsbeitrag {datetime.now().year} - 1. Halbjahr"
+            return f"Mitgliedsbeitrag {year} - 1. Halbjahr"
         elif self.batch_type == 'half_year_2':
-            ET.SubElement(rmt_inf, 'Ustrd').text = f"Mitgliedsbeitrag {datetime.now().year} - 2. Halbjahr"
-        else:
-            ET.SubElement(rmt_inf, 'Ustrd').text = f"Mitgliedsbeitrag {datetime.now().year}"
+            return f"Mitgliedsbeitrag {year} - 2. Halbjahr"
+        return f"Mitgliedsbeitrag {year}"
     
     def action_download_xml(self):
         """Download the generated XML file"""
         self.ensure_one()
-        if not self.sepa_xml_file:
+        if not self.sepa_xml_attachment_id:
             raise UserError(_('No XML file generated yet.'))
         
         return {
             'type': 'ir.actions.act_url',
-            'url': f'/web/content/?model={self._name}&id={self.id}&field=sepa_xml_file&filename_field=sepa_xml_filename&download=true',
+            'url': f'/web/content/{self.sepa_xml_attachment_id.id}?download=true',
             'target': 'self',
         }
\ No newline at end of file
@@ -61,6 +61,7 @@ Technical Excellence:
         
         # Data
         'data/notification_profiles.xml',
+        'data/ir_cron.xml',
         
         # Views
         'views/res_users_views.xml',
@@ -2,6 +2,10 @@
 # Part of Smart Notification. See LICENSE file for full copyright and licensing details.
 
 from odoo import models, fields, api, _
+from collections import defaultdict
+import logging
+
+_logger = logging.getLogger(__name__)
 
 
 class MailFollowers(models.Model):
@@ -22,38 +26,62 @@ class MailFollowers(models.Model):
     
     @api.depends('partner_id')
     def _compute_uses_smart_defaults(self):
+        smart_users = self._get_smart_users_by_partner()
         for follower in self:
-            user = self.env['res.users'].search([
-                ('partner_id', '=', follower.partner_id.id),
-                ('smart_notifications_enabled', '=', True)
-            ], limit=1)
-            follower.uses_smart_defaults = bool(user)
+            follower.uses_smart_defaults = smart_users.get(follower.partner_id.id, (None, False))[1]
+    
+    def _get_smart_users_by_partner(self):
+        """Resolve the followers' partners to their users in one query
+        
+        A user with smart notifications enabled is preferred when a partner
+        has several users.
+        
+        :return: dict partner id -> (user, smart notifications enabled)
+        """
+        partner_ids = self.partner_id.ids
+        if not partner_ids:
+            return {}
+        smart_users = {}
+        users = self.env['res.users'].search_fetch(
+            [('partner_id', 'in', partner_ids)],
+            ['partner_id', 'smart_notifications_enabled'],
+        )
+        for user in users:
+            partner_id = user.partner_id.id
+            if partner_id not in smart_users or (user.smart_notifications_enabled and not smart_users[partner_id][1]):
+                smart_users[partner_id] = (user, user.smart_notifications_enabled)
+        return smart_users
     
     def action_apply_smart_defaults(self):
-        """Apply user's smart defaults to this follower record"""
+        """Apply user's smart defaults to these follower records"""
+        smart_users = self._get_smart_users_by_partner()
+        
+        # Group followers by target subtypes to write each set once
+        followers_by_subtypes = defaultdict(lambda: self.env['mail.followers'])
         for follower in self:
-            user = self.env['res.users'].search([
-                ('partner_id', '=', follower.partner_id.id),
-                ('smart_notifications_enabled', '=', True)
-            ], limit=1)
-            
-            if user:
-                # Get user's preferred subtypes for this model
-                subtypes = user.get_notification_subtypes(follower.res_model)
-                if subtypes:
-                    follower.subtype_ids = [(6, 0, subtypes)]
-                    
-                    # Show success notification
-                    return {
-                        'type': 'ir.actions.client',
-                        'tag': 'display_notification',
-                        'params': {
-                            'title': _('Smart Defaults Applied'),
-                            'message': _('Notification preferences have been updated.'),
-                            'type': 'success',
-                            'sticky': False,
-                        }
-                    }
+            user, smart_enabled = smart_users.get(follower.partner_id.id, (None, False))
+            if not smart_enabled:
+                continue
+            # Get user's preferred subtypes for this model
+            subtypes = user.get_notification_subtypes(follower.res_model)
+            if subtypes:
+                followers_by_subtypes[tuple(subtypes)] |= follower
+        
+        for subtypes, followers in followers_by_subtypes.items():
+            followers.subtype_ids = [(6, 0, list(subtypes))]
+        
+        if followers_by_subtypes:
+            # Show success notification
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Smart Defaults Applied'),
+                    'message': _('Notification preferences have been updated.'),
+                    'type': 'success',
+                    'sticky': False,
+                }
+            }
         
         return True
     
@@ -84,23 +112,19 @@ class MailFollowers(models.Model):
         followers = super().create(vals_list)
         
         # Log smart notification applications
-        for follower in followers:
-            if follower.uses_smart_defaults:
-                self._log_smart_notification_usage(follower)
+        smart_count = len(followers.filtered('uses_smart_defaults'))
+        if smart_count:
+            self._log_smart_notification_usage(followers, smart_count)
         
         return followers
     
-    def _log_smart_notification_usage(self, follower):
+    def _log_smart_notification_usage(self, followers, smart_count):
         """Log usage of smart notifications for analytics"""
         # This could be extended to track usage patterns
-        # For now, just log it
-        _logger = logging.getLogger(__name__)
+        # For now, just log aggregated counters
         _logger.info(
-            "Smart notification applied for %s on %s:%s",
-            follower.partner_id.name,
-            follower.res_model,
-            follower.res_id
+            "Smart notification applied for %d of %d new followers on %s",
+            smart_count,
+            len(followers),
+            ', '.join(sorted(set(followers.mapped('res_model'))))
         )
-
-
-import logging
\ No newline at end of file
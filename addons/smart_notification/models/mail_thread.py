@@ -2,10 +2,16 @@
 # Part of Smart Notification. See LICENSE file for full copyright and licensing details.
 
 from odoo import models, api
+from collections import defaultdict
 import logging
 
+from .res_users import NOTIFICATION_PREFERENCE_FIELDS
+
 _logger = logging.getLogger(__name__)
 
+# User fields needed to resolve the preferred subtypes
+USER_PREFERENCE_FIELDS = ['partner_id', 'smart_notifications_enabled'] + NOTIFICATION_PREFERENCE_FIELDS
+
 
 class MailThread(models.AbstractModel):
     """Override mail.thread to apply smart notification preferences"""
@@ -26,44 +32,27 @@ class MailThread(models.AbstractModel):
                 subtype_ids=subtype_ids
             )
         
-        # Apply smart defaults for each partner
+        # Apply smart defaults, batched over all partners and records
         if partner_ids:
-            # Process each partner individually to apply their preferences
-            for partner_id in partner_ids:
-                user = self.env['res.users'].search([
-                    ('partner_id', '=', partner_id),
-                    ('smart_notifications_enabled', '=', True)
-                ], limit=1)
-                
-                if user:
-                    # Get user's preferred subtypes for this model
-                    user_subtypes = user.get_notification_subtypes(self._name)
-                    
-                    if user_subtypes is not None:
-                        # Subscribe with user's preferences
-                        super().message_subscribe(
-                            partner_ids=[partner_id],
-                            channel_ids=None,
-                            subtype_ids=user_subtypes
-                        )
-                        
-                        _logger.info(
-                            "Applied smart notification preferences for user %s on %s record %s",
-                            user.name, self._name, self.id
-                        )
-                    else:
-                        # Fall back to default behavior
-                        super().message_subscribe(
-                            partner_ids=[partner_id],
-                            channel_ids=None,
-                            subtype_ids=None
-                        )
-                else:
-                    # No user or smart notifications disabled - use default
-                    super().message_subscribe(
-                        partner_ids=[partner_id],
-                        channel_ids=None,
-                        subtype_ids=None
+            # Group partners by their resolved subtypes (None = Odoo defaults)
+            partners_by_subtypes = defaultdict(list)
+            users_by_partner = self._get_smart_notification_users(partner_ids)
+            for partner_id in dict.fromkeys(partner_ids):
+                user = users_by_partner.get(partner_id)
+                user_subtypes = user.get_notification_subtypes(self._name) if user else None
+                key = tuple(sorted(user_subtypes)) if user_subtypes is not None else None
+                partners_by_subtypes[key].append(partner_id)
+            
+            for user_subtypes, group_partner_ids in partners_by_subtypes.items():
+                super().message_subscribe(
+                    partner_ids=group_partner_ids,
+                    channel_ids=None,
+                    subtype_ids=list(user_subtypes) if user_subtypes is not None else None
+                )
+                if user_subtypes is not None:
+                    _logger.info(
+                        "Applied smart notification preferences for %d partners on %d %s records",
+                        len(group_partner_ids), len(self), self._name
                     )
             
             # Handle channels if provided
@@ -84,6 +73,20 @@ class MailThread(models.AbstractModel):
             subtype_ids=subtype_ids
         )
     
+    def _get_smart_notification_users(self, partner_ids):
+        """Resolve partners to their users with smart notifications in one query
+        
+        :return: dict partner id -> first matching user
+        """
+        users_by_partner = {}
+        users = self.env['res.users'].search_fetch([
+            ('partner_id', 'in', list(partner_ids)),
+            ('smart_notifications_enabled', '=', True)
+        ], USER_PREFERENCE_FIELDS)
+        for user in users:
+            users_by_partner.setdefault(user.partner_id.id, user)
+        return users_by_partner
+    
     @api.model
     def message_subscribe_users(self, user_ids=None, subtype_ids=None):
         """
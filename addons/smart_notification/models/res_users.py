@@ -1,8 +1,46 @@
 # -*- coding: utf-8 -*-
 # Part of Smart Notification. See LICENSE file for full copyright and licensing details.
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError
+from odoo.tools import SQL, frozendict
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Fields that make up a user's notification preferences
+NOTIFICATION_PREFERENCE_FIELDS = [
+    'notification_profile', 'notify_task_notes', 'notify_task_messages',
+    'notify_task_state', 'notify_task_assignment', 'notify_sale_notes',
+    'notify_sale_messages', 'notify_sale_confirmation', 'notify_invoice_notes',
+    'notify_invoice_messages', 'notify_invoice_validation',
+]
+
+# Re-application runs in the background above this many followers
+APPLY_BACKGROUND_THRESHOLD = 5000
+
+# Models re-applied per background cron batch
+APPLY_MODELS_PER_BATCH = 5
+
+# Map user preferences to actual subtypes: model -> [(preference field, subtype xmlid)]
+SUBTYPE_PREFERENCES = {
+    'project.task': [
+        ('notify_task_notes', 'mail.mt_note'),
+        ('notify_task_messages', 'mail.mt_comment'),
+        ('notify_task_state', 'project.mt_task_stage'),
+        ('notify_task_assignment', 'project.mt_task_assigned'),
+    ],
+    'sale.order': [
+        ('notify_sale_notes', 'mail.mt_note'),
+        ('notify_sale_messages', 'mail.mt_comment'),
+        ('notify_sale_confirmation', 'sale.mt_order_confirmed'),
+    ],
+    'account.move': [
+        ('notify_invoice_notes', 'mail.mt_note'),
+        ('notify_invoice_messages', 'mail.mt_comment'),
+        ('notify_invoice_validation', 'account.mt_invoice_validated'),
+    ],
+}
 
 
 class ResUsers(models.Model):
@@ -99,6 +137,25 @@ class ResUsers(models.Model):
         help="When your preferences were last applied to followers"
     )
     
+    # Background re-application of preferences
+    notification_apply_pending = fields.Boolean(
+        string='Preferences Being Applied',
+        readonly=True,
+        help="Preferences are being applied to existing followers in the background"
+    )
+    notification_apply_queue = fields.Json(
+        string='Models Left to Apply',
+        readonly=True
+    )
+    notification_apply_total = fields.Integer(
+        string='Models to Apply',
+        readonly=True
+    )
+    notification_apply_progress = fields.Integer(
+        string='Application Progress',
+        compute='_compute_notification_apply_progress'
+    )
+    
     @api.depends('partner_id')
     def _compute_notification_stats(self):
         for user in self:
@@ -106,6 +163,15 @@ class ResUsers(models.Model):
                 ('partner_id', '=', user.partner_id.id)
             ])
     
+    @api.depends('notification_apply_queue', 'notification_apply_total')
+    def _compute_notification_apply_progress(self):
+        for user in self:
+            if user.notification_apply_total:
+                done = user.notification_apply_total - len(user.notification_apply_queue or [])
+                user.notification_apply_progress = 100 * done // user.notification_apply_total
+            else:
+                user.notification_apply_progress = 0
+    
     @api.onchange('notification_profile')
     def _onchange_notification_profile(self):
         """Apply profile presets"""
@@ -173,42 +239,138 @@ class ResUsers(models.Model):
         if not self.smart_notifications_enabled:
             return None  # Use Odoo defaults
         
-        subtypes = self.env['mail.message.subtype']
+        subtype_map = self._get_notification_subtype_map()
+        subtype_ids = subtype_map.get(model_name, subtype_map[None])
+        return list(subtype_ids) if subtype_ids else None
+    
+    def _get_notification_preference_values(self):
+        """Current values of the user's notification preferences"""
+        self.ensure_one()
+        return tuple(self[field_name] for field_name in NOTIFICATION_PREFERENCE_FIELDS)
+    
+    @tools.ormcache('self._get_notification_preference_values()')
+    def _get_notification_subtype_map(self):
+        """Compile the user's preferences into a model -> subtype ids map
+        
+        The ``None`` key holds the subtypes for all other models. Cached by
+        the preference values themselves, so users with the same preferences
+        share an entry and a changed preference is a new key right away,
+        without clearing the registry cache.
+        """
+        IrModelData = self.env['ir.model.data']
+        
+        def resolve(xmlids):
+            res_ids = (IrModelData._xmlid_to_res_id(xmlid, raise_if_not_found=False) for xmlid in xmlids)
+            return tuple(dict.fromkeys(res_id for res_id in res_ids if res_id))
+        
+        subtype_map = {
+            model_name: resolve(xmlid for field_name, xmlid in preferences if self[field_name])
+            for model_name, preferences in SUBTYPE_PREFERENCES.items()
+        }
+        
+        # For other models, use conservative defaults
+        default_xmlids = ['mail.mt_comment']
+        if self.notification_profile == 'board':
+            default_xmlids.append('mail.mt_note')
+        subtype_map[None] = resolve(default_xmlids)
+        return frozendict(subtype_map)
+    
+    def _get_followed_models(self, model_names=None):
+        """Models of the records the user follows
         
-        # Map user preferences to actual subtypes
-        if model_name == 'project.task':
-            if self.notify_task_notes:
-                subtypes |= self.env.ref('mail.mt_note', raise_if_not_found=False)
-            if self.notify_task_messages:
-                subtypes |= self.env.ref('mail.mt_comment', raise_if_not_found=False)
-            if self.notify_task_state:
-                subtypes |= self.env.ref('project.mt_task_stage', raise_if_not_found=False)
-            if self.notify_task_assignment:
-                subtypes |= self.env.ref('project.mt_task_assigned', raise_if_not_found=False)
-                
-        elif model_name == 'sale.order':
-            if self.notify_sale_notes:
-                subtypes |= self.env.ref('mail.mt_note', raise_if_not_found=False)
-            if self.notify_sale_messages:
-                subtypes |= self.env.ref('mail.mt_comment', raise_if_not_found=False)
-            if self.notify_sale_confirmation:
-                subtypes |= self.env.ref('sale.mt_order_confirmed', raise_if_not_found=False)
-                
-        elif model_name == 'account.move':
-            if self.notify_invoice_notes:
-                subtypes |= self.env.ref('mail.mt_note', raise_if_not_found=False)
-            if self.notify_invoice_messages:
-                subtypes |= self.env.ref('mail.mt_comment', raise_if_not_found=False)
-            if self.notify_invoice_validation:
-                subtypes |= self.env.ref('account.mt_invoice_validated', raise_if_not_found=False)
+        :param model_names: restrict to these models
+        """
+        self.ensure_one()
+        self.env['mail.followers'].flush_model(['partner_id', 'res_model'])
+        query = SQL("SELECT DISTINCT res_model FROM mail_followers WHERE partner_id = %s", self.partner_id.id)
+        if model_names is not None:
+            query = SQL("%s AND res_model = ANY(%s)", query, list(model_names))
+        self.env.cr.execute(query)
+        return sorted(res_model for res_model, in self.env.cr.fetchall())
+    
+    def _apply_notification_preferences(self, model_names):
+        """Rewrite the subtypes of the user's followers set-based
+        
+        Target subtypes are computed once per model and the subtype relation
+        is rewritten with one DELETE and one INSERT per model, without going
+        through the followers' ORM writes.
+        
+        :return: number of updated followers
+        """
+        self.ensure_one()
+        Followers = self.env['mail.followers']
+        Followers.flush_model(['partner_id', 'res_model', 'subtype_ids'])
+        updated = 0
+        for res_model in model_names:
+            subtype_ids = self.get_notification_subtypes(res_model)
+            if subtype_ids is None:
+                continue
+            self.env.cr.execute(SQL(
+                """
+                DELETE FROM mail_followers_mail_message_subtype_rel rel
+                      USING mail_followers f
+                      WHERE rel.mail_followers_id = f.id
+                        AND f.partner_id = %s
+                        AND f.res_model = %s
+                """,
+                self.partner_id.id, res_model,
+            ))
+            self.env.cr.execute(SQL(
+                """
+                INSERT INTO mail_followers_mail_message_subtype_rel (mail_followers_id, mail_message_subtype_id)
+                     SELECT f.id, subtype.id
+                       FROM mail_followers f
+                 CROSS JOIN unnest(%s::int[]) AS subtype(id)
+                      WHERE f.partner_id = %s
+                        AND f.res_model = %s
+                """,
+                subtype_ids, self.partner_id.id, res_model,
+            ))
+            updated += self.env.cr.rowcount // len(subtype_ids)
+        Followers.invalidate_model(['subtype_ids'])
+        return updated
+    
+    def _enqueue_apply_notification_preferences(self, model_names):
+        """Schedule the re-application of preferences in the background"""
+        self.ensure_one()
+        self.sudo().write({
+            'notification_apply_pending': True,
+            'notification_apply_queue': model_names,
+            'notification_apply_total': len(model_names),
+        })
+        self.env.ref('smart_notification.ir_cron_apply_notification_preferences')._trigger()
+    
+    @api.model
+    def _cron_apply_notification_preferences(self):
+        """Apply queued preferences, a few models per batch, reporting progress"""
+        users = self.sudo().search([('notification_apply_pending', '=', True)])
+        if not users:
+            return
+        user = users[0]
+        queue = list(user.notification_apply_queue or [])
+        batch, queue = queue[:APPLY_MODELS_PER_BATCH], queue[APPLY_MODELS_PER_BATCH:]
+        updated = user._apply_notification_preferences(batch)
+        _logger.info(
+            "Applied notification preferences of user %s to %d followers on %d models, %d models left",
+            user.id, updated, len(batch), len(queue)
+        )
         
-        else:
-            # For other models, use conservative defaults
-            subtypes |= self.env.ref('mail.mt_comment', raise_if_not_found=False)
-            if self.notification_profile == 'board':
-                subtypes |= self.env.ref('mail.mt_note', raise_if_not_found=False)
+        vals = {'notification_apply_queue': queue}
+        if not queue:
+            vals.update({
+                'notification_apply_pending': False,
+                'notification_apply_total': 0,
+                'notification_last_applied': fields.Datetime.now(),
+            })
+            self.env['bus.bus']._sendone(user.partner_id, 'simple_notification', {
+                'title': _('Preferences Applied'),
+                'message': _('Your notification preferences have been applied to your existing subscriptions.'),
+                'type': 'success',
+            })
+        user.write(vals)
         
-        return subtypes.ids if subtypes else None
+        remaining = sum(len(pending.notification_apply_queue or []) for pending in users - user) + len(queue)
+        self.env['ir.cron']._notify_progress(done=len(batch), remaining=remaining)
     
     def action_apply_preferences(self):
         """Apply current preferences to all existing followers"""
@@ -249,11 +411,6 @@ class ResUsers(models.Model):
     
     def write(self, vals):
         """Track when preferences change"""
-        if any(field in vals for field in [
-            'notification_profile', 'notify_task_notes', 'notify_task_messages',
-            'notify_task_state', 'notify_task_assignment', 'notify_sale_notes',
-            'notify_sale_messages', 'notify_sale_confirmation', 'notify_invoice_notes',
-            'notify_invoice_messages', 'notify_invoice_validation'
-        ]):
+        if any(field in vals for field in NOTIFICATION_PREFERENCE_FIELDS):
             vals['notification_last_applied'] = False  # Mark as needing reapplication
         return super().write(vals)
\ No newline at end of file
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+# Part of Smart Notification. See LICENSE file for full copyright and licensing details.
+
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSmartNotification(TransactionCase):
+    
+    def setUp(self):
+        super().setUp()
+        Users = self.env['res.users'].with_context(no_reset_password=True)
+        self.user_normal = Users.create({
+            'name': 'Smart Normal',
+            'login': 'smart_normal',
+            'email': 'smart_normal@test.com',
+            'notification_profile': 'normal',
+        })
+        self.user_board = Users.create({
+            'name': 'Smart Board',
+            'login': 'smart_board',
+            'email': 'smart_board@test.com',
+            'notification_profile': 'board',
+            'notify_task_notes': True,
+        })
+        self.user_plain = Users.create({
+            'name': 'Plain User',
+            'login': 'plain_user',
+            'email': 'plain_user@test.com',
+            'smart_notifications_enabled': False,
+        })
+        
+        self.mt_note = self.env.ref('mail.mt_note')
+        self.mt_comment = self.env.ref('mail.mt_comment')
+        self.mt_task_stage = self.env.ref('project.mt_task_stage')
+        self.mt_task_assigned = self.env.ref('project.mt_task_assigned')
+        self.task_subtypes = {self.mt_comment.id, self.mt_task_stage.id, self.mt_task_assigned.id}
+    
+    def test_subtype_map_follows_preferences(self):
+        """Test the cached subtype map follows preference changes without clearing the registry cache"""
+        user = self.user_normal
+        self.assertEqual(set(user.get_notification_subtypes('project.task')), self.task_subtypes)
+        self.assertEqual(user.get_notification_subtypes('res.partner'), [self.mt_comment.id])
+        
+        with patch.object(type(self.env.registry), 'clear_cache') as clear_cache:
+            user.notify_task_notes = True
+            self.assertEqual(
+                set(user.get_notification_subtypes('project.task')),
+                self.task_subtypes | {self.mt_note.id},
+            )
+            
+            user.notification_profile = 'board'
+            self.assertEqual(
+                set(user.get_notification_subtypes('res.partner')),
+                {self.mt_comment.id, self.mt_note.id},
+            )
+            
+            user.smart_notifications_enabled = False
+            self.assertIsNone(user.get_notification_subtypes('project.task'))
+            clear_cache.assert_not_called()
+        
+        # Going back to earlier preferences within the transaction is seen as well
+        user.write({'smart_notifications_enabled': True, 'notification_profile': 'normal', 'notify_task_notes': False})
+        self.assertEqual(set(user.get_notification_subtypes('project.task')), self.task_subtypes)
+    
+    def _get_follower_subtypes(self, records, user):
+        followers = self.env['mail.followers'].search([
+            ('res_model', '=', records._name),
+            ('res_id', 'in', records.ids),
+            ('partner_id', '=', user.partner_id.id),
+        ])
+        return {follower.res_id: set(follower.subtype_ids.ids) for follower in followers}
+    
+    def test_message_subscribe_applies_preferences(self):
+        """Test one subscription call applies each partner's own preferences on all records"""
+        project = self.env['project.project'].create({'name': 'Smart Project'})
+        tasks = self.env['project.task'].create([
+            {'name': 'Task 1', 'project_id': project.id},
+            {'name': 'Task 2', 'project_id': project.id},
+        ])
+        
+        tasks.message_subscribe(partner_ids=[
+            self.user_normal.partner_id.id,
+            self.user_board.partner_id.id,
+            self.user_plain.partner_id.id,
+        ])
+        
+        self.assertEqual(
+            self._get_follower_subtypes(tasks, self.user_normal),
+            {task.id: self.task_subtypes for task in tasks},
+        )
+        self.assertEqual(
+            self._get_follower_subtypes(tasks, self.user_board),
+            {task.id: self.task_subtypes | {self.mt_note.id} for task in tasks},
+        )
+        # Without smart notifications the Odoo default subtypes are used
+        plain_subtypes = self._get_follower_subtypes(tasks, self.user_plain)
+        self.assertEqual(set(plain_subtypes), set(tasks.ids))
+        for subtype_ids in plain_subtypes.values():
+            self.assertIn(self.mt_comment.id, subtype_ids)
+            self.assertNotIn(self.mt_note.id, subtype_ids)
+    
+    def test_message_subscribe_keeps_explicit_subtypes(self):
+        """Test explicitly requested subtypes are not replaced by preferences"""
+        partner = self.env['res.partner'].create({'name': 'Followed Partner'})
+        partner.message_subscribe(partner_ids=self.user_normal.partner_id.ids, subtype_ids=self.mt_note.ids)
+        self.assertEqual(
+            self._get_follower_subtypes(partner, self.user_normal),
+            {partner.id: {self.mt_note.id}},
+        )
+    
+    def _create_explicit_followers(self):
+        """Follow a task and a partner with explicit subtypes that differ from the preferences"""
+        project = self.env['project.project'].create({'name': 'Smart Project'})
+        task = self.env['project.task'].create({'name': 'Task', 'project_id': project.id})
+        partner = self.env['res.partner'].create({'name': 'Followed Partner'})
+        for record in (task, partner):
+            record.message_subscribe(
+                partner_ids=[self.user_normal.partner_id.id, self.user_board.partner_id.id],
+                subtype_ids=self.mt_note.ids,
+            )
+        return task, partner
+    
+    def test_apply_preferences_rewrites_followers(self):
+        """Test re-application rewrites the user's followers per model, and only them"""
+        task, partner = self._create_explicit_followers()
+        self.user_normal.notify_task_state = False
+        
+        model_names = self.user_normal._get_followed_models()
+        self.assertIn('project.task', model_names)
+        self.assertIn('res.partner', model_names)
+        updated = self.user_normal._apply_notification_preferences(['project.task', 'res.partner'])
+        
+        self.assertEqual(updated, 2)
+        self.assertEqual(
+            self._get_follower_subtypes(task, self.user_normal),
+            {task.id: {self.mt_comment.id, self.mt_task_assigned.id}},
+        )
+        self.assertEqual(
+            self._get_follower_subtypes(partner, self.user_normal),
+            {partner.id: {self.mt_comment.id}},
+        )
+        # Other users' followers are left alone
+        self.assertEqual(self._get_follower_subtypes(task, self.user_board), {task.id: {self.mt_note.id}})
+    
+    def test_apply_preferences_in_background(self):
+        """Test queued preferences are applied by the cron and the queue is cleared"""
+        task, partner = self._create_explicit_followers()
+        self.user_normal._enqueue_apply_notification_preferences(['project.task', 'res.partner'])
+        self.assertTrue(self.user_normal.notification_apply_pending)
+        self.assertEqual(self.user_normal.notification_apply_progress, 0)
+        
+        self.env['res.users']._cron_apply_notification_preferences()
+        
+        self.assertFalse(self.user_normal.notification_apply_pending)
+        self.assertFalse(self.user_normal.notification_apply_queue)
+        self.assertTrue(self.user_normal.notification_last_applied)
+        self.assertEqual(self._get_follower_subtypes(task, self.user_normal), {task.id: self.task_subtypes})
+        self.assertEqual(self._get_follower_subtypes(partner, self.user_normal), {partner.id: {self.mt_comment.id}})
@@ -4,6 +4,8 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 
+from ..models.res_users import APPLY_BACKGROUND_THRESHOLD
+
 
 class ApplyPreferencesWizard(models.TransientModel):
     """Wizard to apply smart notification preferences to existing subscriptions"""
@@ -52,17 +54,17 @@ class ApplyPreferencesWizard(models.TransientModel):
         
         if not self.user_id.smart_notifications_enabled:
             raise UserError(_('Smart Notifications must be enabled first.'))
+        if self.user_id.notification_apply_pending:
+            raise UserError(_('Your preferences are already being applied in the background.'))
         
         # Get all user's subscriptions
-        domain = [('partner_id', '=', self.user_id.partner_id.id)]
-        
+        model_names = None
         if self.apply_to_models == 'selected' and self.model_ids:
             model_names = self.model_ids.mapped('model')
-            domain.append(('res_model', 'in', model_names))
         
-        subscriptions = self.env['mail.followers'].search(domain)
+        followed_models = self.user_id._get_followed_models(model_names)
         
-        if not subscriptions:
+        if not followed_models:
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
@@ -74,13 +76,23 @@ class ApplyPreferencesWizard(models.TransientModel):
                 }
             }
         
-        # Apply preferences to each subscription
-        updated = 0
-        for subscription in subscriptions:
-            subtypes = self.user_id.get_notification_subtypes(subscription.res_model)
-            if subtypes is not None:
-                subscription.subtype_ids = [(6, 0, subtypes)]
-                updated += 1
+        # Very large follower sets are re-applied in the background
+        if self.subscription_count > APPLY_BACKGROUND_THRESHOLD:
+            self.user_id._enqueue_apply_notification_preferences(followed_models)
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': _('Applying Preferences'),
+                    'message': _('Your preferences are being applied to %d subscriptions in the background. '
+                                 'You will be notified when it is done.') % self.subscription_count,
+                    'type': 'info',
+                    'sticky': False,
+                }
+            }
+        
+        # Apply preferences per model in bulk
+        updated = self.user_id._apply_notification_preferences(followed_models)
         
         # Update last applied timestamp
         self.user_id.notification_last_applied = fields.Datetime.now()
@@ -26,7 +26,10 @@
     'data': [
         'security/ir.model.access.csv',
         'data/mail_template.xml',
+        'data/mention_group_data.xml',
+        'data/project_alias_actions.xml',
         'views/project_task_views.xml',
+        'views/mention_group_views.xml',
     ],
     'assets': {
         'web.assets_backend': [
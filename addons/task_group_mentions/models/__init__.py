@@ -1,3 +1,7 @@
 # -*- coding: utf-8 -*-
+from . import mention_group
 from . import project_task
-from . import mail_thread
\ No newline at end of file
+from . import mail_thread
+from . import bus_notification
+from . import mail_alias_alternative
+from . import res_users
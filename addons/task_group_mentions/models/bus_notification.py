@@ -2,72 +2,118 @@
 """
 Advanced real-time notification system using Odoo's bus
 """
+from collections import defaultdict
 from odoo import models, fields, api, _
-from odoo.addons.bus.models.bus import channel_with_db
-import json
+from odoo.tools import SQL
 
 
 class BusNotification(models.Model):
     _inherit = 'bus.bus'
     
     @api.model
-    def _sendmany(self, notifications):
-        """Override to handle group notifications"""
-        # Process notifications for group mentions
-        for notification in notifications:
-            if isinstance(notification, dict) and notification.get('type') == 'group_mention':
-                self._process_group_mention(notification)
+    def _fan_out_group_mentions(self, group_mentions):
+        """Expand group mention notifications into partner channel notifications
         
-        return super()._sendmany(notifications)
-    
-    def _process_group_mention(self, notification):
-        """Process group mention notifications"""
-        task_id = notification.get('task_id')
-        mention_type = notification.get('mention_type')  # 'all' or 'vorstand'
+        Followers and board members of all mentioned tasks are resolved in one
+        query, restricted to partners with an active user. Like
+        ``task.mention.group._resolve_partners``, tasks without board members
+        fall back to the followers with 'Vorstand' in their function. Each
+        partner gets a message only once, however many users or mentions point
+        to it.
         
-        if not task_id:
-            return
+        :return: list of (partner, notification type, payload) tuples
+        """
+        task_ids = list({n['task_id'] for n in group_mentions if n.get('task_id')})
+        if not task_ids:
+            return []
         
-        task = self.env['project.task'].browse(task_id)
-        if not task.exists():
-            return
+        self.env['mail.followers'].flush_model(['res_model', 'res_id', 'partner_id'])
+        self.env['project.task'].flush_model(['board_member_ids'])
+        self.env['res.partner'].flush_model(['function'])
+        self.env.cr.execute(SQL(
+            """
+            SELECT f.res_id, f.partner_id,
+                   board.partner_id IS NOT NULL,
+                   p.function ILIKE %s,
+                   EXISTS (SELECT 1 FROM project_task_board_members_rel b WHERE b.task_id = f.res_id),
+                   EXISTS (SELECT 1 FROM res_users u WHERE u.partner_id = f.partner_id AND u.active)
+              FROM mail_followers f
+              JOIN res_partner p ON p.id = f.partner_id
+         LEFT JOIN project_task_board_members_rel board
+                ON board.task_id = f.res_id
+               AND board.partner_id = f.partner_id
+             WHERE f.res_model = 'project.task'
+               AND f.res_id = ANY(%s)
+            """,
+            '%vorstand%',
+            task_ids,
+        ))
+        recipients = defaultdict(lambda: {'followers': [], 'board': []})
+        for task_id, partner_id, is_board, is_vorstand, has_board, has_user in self.env.cr.fetchall():
+            if not has_user:
+                continue
+            recipients[task_id]['followers'].append(partner_id)
+            if is_board or (not has_board and is_vorstand):
+                recipients[task_id]['board'].append(partner_id)
         
-        # Determine recipients
-        if mention_type == 'all':
-            partners = task.message_follower_ids.mapped('partner_id')
-        elif mention_type == 'vorstand':
-            partners = task.board_member_ids
-        else:
-            return
+        # mention_type is the alias of a mention group, e.g. 'all' or 'vorstand'
+        mention_groups = self.env['task.mention.group'].sudo().search([
+            ('alias', 'in', list({n.get('mention_type') for n in group_mentions})),
+        ])
+        groups_by_alias = {group.alias: group for group in mention_groups}
         
-        # Send real-time notifications
-        for partner in partners:
-            if partner.user_ids:
-                for user in partner.user_ids:
-                    channel = (self._cr.dbname, 'res.partner', partner.id)
-                    self._sendone(channel, 'mail.message/insert', {
-                        'id': notification.get('message_id'),
-                        'model': 'project.task',
-                        'res_id': task_id,
-                        'body': notification.get('body', ''),
-                        'type': 'group_mention_notification',
-                    })
+        Partner = self.env['res.partner']
+        fan_out = []
+        sent = set()
+        for notification in group_mentions:
+            task_id = notification.get('task_id')
+            group = groups_by_alias.get(notification.get('mention_type'))
+            if not task_id or not group:
+                continue
+            if group.resolver in ('followers', 'board'):
+                partner_ids = recipients[task_id][group.resolver]
+            else:
+                # Other resolvers don't depend on the task followers
+                key = (task_id, group.alias)
+                if key not in recipients:
+                    task = self.env['project.task'].browse(task_id)
+                    recipients[key] = group._resolve_partners(task).filtered('user_ids').ids
+                partner_ids = recipients[key]
+            for partner_id in partner_ids:
+                key = (partner_id, notification.get('message_id'))
+                if key in sent:
+                    continue
+                sent.add(key)
+                fan_out.append((Partner.browse(partner_id), 'mail.message/insert', {
+                    'id': notification.get('message_id'),
+                    'model': 'project.task',
+                    'res_id': task_id,
+                    'body': notification.get('body', ''),
+                    'type': 'group_mention_notification',
+                }))
+        return fan_out
 
 
 class ProjectTaskBus(models.Model):
     _inherit = 'project.task'
     
-    def _notify_group_mention_realtime(self, mention_type, message):
-        """Send real-time notification for group mentions"""
-        notification = {
+    def _notify_group_mention_realtime(self, mention_groups, message):
+        """Send real-time notifications for the groups mentioned in a message
+        
+        All groups are fanned out together; the bus inserts the queued
+        notifications in one batch at commit.
+        """
+        self.ensure_one()
+        notifications = [{
             'type': 'group_mention',
             'task_id': self.id,
-            'mention_type': mention_type,
+            'mention_type': group.alias,
             'message_id': message.id,
             'body': message.body,
-        }
+        } for group in mention_groups.sudo()]
         
-        # Trigger bus notification
-        self.env['bus.bus']._sendmany([notification])
+        # Sends are queued and inserted together when the transaction commits
+        for partner, notification_type, payload in self.env['bus.bus'].sudo()._fan_out_group_mentions(notifications):
+            partner._bus_send(notification_type, payload)
         
         return True
\ No newline at end of file
@@ -4,6 +4,19 @@ Alternative approach using mail.alias for group notifications
 This can be used instead of or alongside the main implementation
 """
 from odoo import models, fields, api, _
+from odoo.tools import split_every, str2bool
+
+# System parameter enabling group aliases for new projects
+GROUP_ALIASES_PARAM = 'task_group_mentions.create_group_aliases'
+
+# Project field -> alias name prefix
+GROUP_ALIAS_FIELDS = {
+    'all_followers_alias_id': 'all',
+    'board_members_alias_id': 'board',
+}
+
+# Projects processed per batch by the backfill and cleanup actions
+ALIAS_BATCH_SIZE = 500
 
 
 class MailAlias(models.Model):
@@ -13,12 +26,6 @@ class MailAlias(models.Model):
         string='Group Alias',
         help='This alias represents a group for notifications'
     )
-    
-    group_partner_ids = fields.Many2many(
-        'res.partner',
-        string='Group Members',
-        help='Partners to notify when this alias is used'
-    )
 
 
 class ProjectProject(models.Model):
@@ -27,37 +34,78 @@ class ProjectProject(models.Model):
     all_followers_alias_id = fields.Many2one(
         'mail.alias',
         string='All Followers Alias',
+        copy=False,
         help='Email alias that notifies all project followers'
     )
     
     board_members_alias_id = fields.Many2one(
         'mail.alias', 
         string='Board Members Alias',
+        copy=False,
         help='Email alias that notifies board members'
     )
     
     @api.model_create_multi
     def create(self, vals_list):
-        """Create mail aliases for group notifications"""
+        """Create mail aliases for group notifications if enabled"""
         projects = super().create(vals_list)
+        ICP = self.env['ir.config_parameter'].sudo()
+        if str2bool(ICP.get_param(GROUP_ALIASES_PARAM, 'False')):
+            projects._create_group_aliases()
+        return projects
+    
+    def _get_group_aliases(self):
+        """Return the group aliases of the project, creating them on first use
         
-        for project in projects:
-            # Create @all alias
-            all_alias = self.env['mail.alias'].create({
-                'alias_name': f'all-{project.id}',
-                'alias_model_id': self.env.ref('project.model_project_task').id,
-                'alias_defaults': {'project_id': project.id},
-                'is_group_alias': True,
-            })
-            project.all_followers_alias_id = all_alias
-            
-            # Create @vorstand alias  
-            board_alias = self.env['mail.alias'].create({
-                'alias_name': f'board-{project.id}',
-                'alias_model_id': self.env.ref('project.model_project_task').id,
-                'alias_defaults': {'project_id': project.id},
-                'is_group_alias': True,
-            })
-            project.board_members_alias_id = board_alias
-            
-        return projects
\ No newline at end of file
+        Called when a group is first mentioned in a task of the project.
+        
+        :return: tuple (all followers alias, board members alias)
+        """
+        self.ensure_one()
+        self._create_group_aliases()
+        return self.all_followers_alias_id, self.board_members_alias_id
+    
+    def _create_group_aliases(self):
+        """Create the missing @all / @vorstand aliases in one batch"""
+        task_model_id = self.env['ir.model']._get_id('project.task')
+        alias_vals_list = []
+        alias_targets = []
+        for project in self:
+            for field_name, prefix in GROUP_ALIAS_FIELDS.items():
+                if not project[field_name]:
+                    alias_vals_list.append({
+                        'alias_name': f'{prefix}-{project.id}',
+                        'alias_model_id': task_model_id,
+                        'alias_defaults': repr({'project_id': project.id}),
+                        'is_group_alias': True,
+                    })
+                    alias_targets.append((project, field_name))
+        if not alias_vals_list:
+            return
+        aliases = self.env['mail.alias'].sudo().create(alias_vals_list)
+        for (project, field_name), alias in zip(alias_targets, aliases):
+            project[field_name] = alias
+    
+    def _remove_group_aliases(self):
+        """Remove the group aliases of the projects"""
+        aliases = self.all_followers_alias_id | self.board_members_alias_id
+        self.write({'all_followers_alias_id': False, 'board_members_alias_id': False})
+        aliases.sudo().unlink()
+    
+    def action_backfill_group_aliases(self):
+        """Create the missing group aliases of these projects (all if empty)"""
+        projects = (self or self.search([])).filtered(
+            lambda p: not p.all_followers_alias_id or not p.board_members_alias_id
+        )
+        for project_ids in split_every(ALIAS_BATCH_SIZE, projects.ids):
+            self.browse(project_ids)._create_group_aliases()
+        return True
+    
+    def action_cleanup_group_aliases(self):
+        """Remove the group aliases of these projects (all if empty)"""
+        projects = (self or self.with_context(active_test=False).search([])).filtered(
+            lambda p: p.all_followers_alias_id or p.board_members_alias_id
+        )
+        for project_ids in split_every(ALIAS_BATCH_SIZE, projects.ids):
+            self.browse(project_ids)._remove_group_aliases()
+        return True
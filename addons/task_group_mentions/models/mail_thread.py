@@ -18,7 +18,7 @@ class MailThread(models.AbstractModel):
         if self._name == 'project.task':
             body = msg_vals.get('body', '')
             # Ensure all mentioned partners are included in notifications
-            if '@all' in str(body).lower() or '@vorstand' in str(body).lower():
+            if self.env['task.mention.group']._process_mentions(body, render=False)[1]:
                 _logger.debug(f"Group mention detected in {self._name} message")
         
         return groups
\ No newline at end of file
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import re
+from markupsafe import Markup
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import ValidationError
+from odoo.tools import frozendict
+
+# Recipient description per resolver, used in the log messages
+RESOLVER_RECIPIENTS = {
+    'followers': 'followers',
+    'board': 'board members',
+    'group': 'group members',
+    'tag': 'tagged partners',
+    'project_team': 'project team members',
+}
+
+
+class TaskMentionGroup(models.Model):
+    """A group that can be mentioned as @alias in task chatter"""
+    _name = 'task.mention.group'
+    _description = 'Task Mention Group'
+    _order = 'sequence, id'
+
+    name = fields.Char(
+        string='Label',
+        required=True,
+        translate=True,
+        help='Shown in the mention badge, e.g. "Vorstand" for @Vorstand'
+    )
+    alias = fields.Char(
+        string='Alias',
+        required=True,
+        help='Word typed after @ to mention the group (case insensitive)'
+    )
+    sequence = fields.Integer(default=10)
+    active = fields.Boolean(default=True)
+    resolver = fields.Selection([
+        ('followers', 'Task Followers'),
+        ('board', 'Board Members Following the Task'),
+        ('group', 'User Group'),
+        ('tag', 'Contact Tag'),
+        ('project_team', 'Project Team'),
+    ], string='Recipients', required=True, default='followers')
+    group_id = fields.Many2one('res.groups', string='User Group')
+    category_id = fields.Many2one('res.partner.category', string='Contact Tag')
+    badge_class = fields.Char(
+        string='Badge Class',
+        default='text-bg-info',
+        help='Bootstrap class of the badge replacing the mention'
+    )
+
+    _sql_constraints = [
+        ('alias_uniq', 'unique(alias)', 'The mention alias must be unique.'),
+    ]
+
+    @api.constrains('alias')
+    def _check_alias(self):
+        for group in self:
+            if not re.fullmatch(r'\w+', group.alias or ''):
+                raise ValidationError(_('The mention alias may only contain letters, digits and underscores.'))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if vals.get('alias'):
+                vals['alias'] = vals['alias'].lower()
+        groups = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return groups
+
+    def write(self, vals):
+        if vals.get('alias'):
+            vals['alias'] = vals['alias'].lower()
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    @tools.ormcache()
+    def _get_mention_matcher(self):
+        """Compile the aliases of all active groups into one regex
+
+        The pattern also matches complete HTML tags, so that mentions inside
+        tags (attributes) are skipped while scanning the raw HTML.
+
+        :return: tuple (compiled pattern or None, dict alias -> group id)
+        """
+        groups = self.sudo().search_read([], ['alias'])
+        group_ids = frozendict({group['alias']: group['id'] for group in groups})
+        if not group_ids:
+            return None, group_ids
+        aliases = '|'.join(re.escape(alias) for alias in sorted(group_ids, key=len, reverse=True))
+        pattern = re.compile(r'(<[^>]*>)|(?<![\w@])@(%s)\b' % aliases, re.IGNORECASE)
+        return pattern, group_ids
+
+    @api.model
+    def _process_mentions(self, body_html, render=True):
+        """Find group mentions in an HTML body and render them as badges
+
+        Mentions are matched on the raw HTML in a single pass, bodies without
+        any ``@`` are returned right away. Groups are read as superuser, any
+        author (e.g. portal users) may mention them.
+
+        :return: tuple (body, mentioned groups in order of appearance)
+        """
+        if not body_html or '@' not in body_html:
+            return body_html, self.browse()
+        pattern, group_ids = self._get_mention_matcher()
+        if pattern is None:
+            return body_html, self.browse()
+
+        found = {}
+        groups = self.sudo()
+
+        def replace(match):
+            if match.group(1):
+                return match.group(0)
+            group = found.setdefault(match.group(2).lower(), groups.browse(group_ids[match.group(2).lower()]))
+            if not render:
+                return match.group(0)
+            return str(Markup('<span class="o_mail_mention_%s badge %s">@%s</span>') % (
+                group.alias, group.badge_class or '', group.name))
+
+        body = pattern.sub(replace, str(body_html))
+        if isinstance(body_html, Markup):
+            body = Markup(body)
+        return body, self.browse([group.id for group in found.values()])
+
+    def _resolve_partners(self, task):
+        """Partners to notify for this group on a task
+
+        The group and its recipients are read as superuser, like in
+        ``_process_mentions``.
+        """
+        self.ensure_one()
+        group = self.sudo()
+        follower_partners = task.message_follower_ids.partner_id
+        if group.resolver == 'followers':
+            return follower_partners
+        if group.resolver == 'board':
+            board_partners = task.board_member_ids
+            if not board_partners and follower_partners:
+                # Fallback: If no specific board members, try to find them
+                board_partners = follower_partners.filtered(
+                    lambda p: p.function and 'vorstand' in p.function.lower()
+                )
+            return board_partners
+        if group.resolver == 'group':
+            return group.group_id.users.partner_id
+        if group.resolver == 'tag':
+            if not group.category_id:
+                return self.env['res.partner']
+            return self.env['res.partner'].sudo().search([('category_id', 'in', group.category_id.ids)])
+        if group.resolver == 'project_team':
+            project = task.project_id
+            return project.message_partner_ids | project.user_id.partner_id
+        return self.env['res.partner']
@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
-import re
-from odoo import models, fields, api, _
-from odoo.tools import html2plaintext
+from odoo import models, fields, api, tools, Command, _
+from odoo.tools import SQL
 import logging
 
+from .mention_group import RESOLVER_RECIPIENTS
+
 _logger = logging.getLogger(__name__)
 
+# System parameter holding the XML id of the board group
+BOARD_GROUP_PARAM = 'task_group_mentions.board_group'
+DEFAULT_BOARD_GROUP = 'base.group_system'
+
 
 class ProjectTask(models.Model):
     _inherit = 'project.task'
@@ -24,22 +29,73 @@ class ProjectTask(models.Model):
     
     @api.depends('message_follower_ids.partner_id')
     def _compute_board_members(self):
-        """Compute board members from followers who have 'Vorstand' tag or group"""
+        """Compute board members from followers who are in the board group
+        
+        Intersects the cached set of board partners with the followers of
+        all tasks at once; followers of the whole recordset are prefetched
+        together.
+        """
+        board_partner_ids = self._get_board_partner_ids()
         for task in self:
-            # Find board members - customize this logic based on your setup
-            # Option 1: Check for a specific user group
-            board_group = self.env.ref('base.group_system', raise_if_not_found=False)  # Replace with your board group
-            if board_group:
-                board_partners = task.message_follower_ids.mapped('partner_id').filtered(
-                    lambda p: p.user_ids and any(board_group in u.groups_id for u in p.user_ids)
-                )
-            else:
-                # Option 2: Check for partners with 'Vorstand' in their function/title
-                board_partners = task.message_follower_ids.mapped('partner_id').filtered(
-                    lambda p: p.function and 'vorstand' in p.function.lower()
-                )
-            
-            task.board_member_ids = [(6, 0, board_partners.ids)]
+            follower_partner_ids = task.message_follower_ids.partner_id.ids
+            task.board_member_ids = [Command.set(
+                [partner_id for partner_id in follower_partner_ids if partner_id in board_partner_ids]
+            )]
+    
+    @api.model
+    def _get_board_partner_ids(self):
+        """Partner ids of all board members, see ``_get_board_partner_ids_for_group``"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        board_group_xmlid = ICP.get_param(BOARD_GROUP_PARAM, DEFAULT_BOARD_GROUP)
+        return self._get_board_partner_ids_for_group(board_group_xmlid)
+    
+    @api.model
+    def _get_board_group_id(self):
+        """Id of the configured board group, or False when board members are
+        identified by their function"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        board_group_xmlid = ICP.get_param(BOARD_GROUP_PARAM, DEFAULT_BOARD_GROUP)
+        return self.env['ir.model.data']._xmlid_to_res_id(board_group_xmlid, raise_if_not_found=False)
+    
+    @api.model
+    @tools.ormcache('board_group_xmlid')
+    def _get_board_partner_ids_for_group(self, board_group_xmlid):
+        """Resolve board members in one query
+        
+        Board members are the partners of active users in the board group or,
+        without a board group, partners with 'Vorstand' in their function.
+        The cache is cleared when group memberships or functions change.
+        
+        :return: frozenset of partner ids
+        """
+        board_group_id = self.env['ir.model.data']._xmlid_to_res_id(board_group_xmlid, raise_if_not_found=False)
+        if board_group_id:
+            self.env['res.users'].flush_model(['partner_id', 'active', 'groups_id'])
+            query = SQL(
+                """
+                SELECT DISTINCT u.partner_id
+                  FROM res_groups_users_rel rel
+                  JOIN res_users u ON u.id = rel.uid
+                 WHERE rel.gid = %s
+                   AND u.active
+                """,
+                board_group_id,
+            )
+        else:
+            self.env['res.partner'].flush_model(['function'])
+            query = SQL("SELECT id FROM res_partner WHERE function ILIKE %s", '%vorstand%')
+        self.env.cr.execute(query)
+        return frozenset(partner_id for partner_id, in self.env.cr.fetchall())
+    
+    @api.model
+    def _recompute_board_members_for_partners(self, partner_ids):
+        """Mark the board members of tasks followed by these partners for recomputation"""
+        self.env.registry.clear_cache()
+        tasks = self.with_context(active_test=False).search([
+            ('message_partner_ids', 'in', list(partner_ids)),
+        ])
+        if tasks:
+            self.env.add_to_compute(self._fields['board_member_ids'], tasks)
     
     def _message_compute_author(self, author_id=None, email_from=None, raise_on_email=False):
         """Override to handle group mentions detection"""
@@ -47,91 +103,51 @@ class ProjectTask(models.Model):
     
     @api.model
     def _extract_group_mentions(self, body_html):
-        """Extract @all and @Vorstand mentions from message body"""
-        if not body_html:
-            return {'has_all': False, 'has_vorstand': False}
-        
-        # Convert to plain text for easier parsing
-        body_text = html2plaintext(body_html or '').lower()
+        """Extract mention groups (e.g. @all, @Vorstand) from message body
         
-        # Pattern to match @all or @vorstand (case insensitive)
-        all_pattern = r'@all\b'
-        vorstand_pattern = r'@vorstand\b'
-        
-        return {
-            'has_all': bool(re.search(all_pattern, body_text)),
-            'has_vorstand': bool(re.search(vorstand_pattern, body_text))
-        }
+        :return: ``task.mention.group`` recordset in order of appearance
+        """
+        return self.env['task.mention.group']._process_mentions(body_html, render=False)[1]
     
     def message_post(self, **kwargs):
         """Override message_post to handle group mentions"""
-        # Extract body from kwargs
-        body = kwargs.get('body', '')
-        
-        # Check for group mentions
-        mentions = self._extract_group_mentions(body)
-        
-        # Store original partner_ids
-        original_partner_ids = kwargs.get('partner_ids', [])
+        # Find group mentions and render them as badges in a single pass
+        body, mention_groups = self.env['task.mention.group']._process_mentions(kwargs.get('body', ''))
         
-        if mentions['has_all'] or mentions['has_vorstand']:
-            # Get all followers
-            all_follower_partners = self.message_follower_ids.mapped('partner_id')
+        if mention_groups:
+            # First group mention in the project provisions its group aliases
+            if self.project_id:
+                self.project_id.sudo()._get_group_aliases()
             
             # Determine which partners to notify
             partners_to_notify = self.env['res.partner']
-            
-            if mentions['has_all']:
-                # Notify all followers
-                partners_to_notify |= all_follower_partners
-                _logger.info(f"Task {self.id}: @all mention detected, notifying {len(all_follower_partners)} followers")
-                
-            if mentions['has_vorstand']:
-                # Notify board members only
-                board_partners = self.board_member_ids
-                if not board_partners and all_follower_partners:
-                    # Fallback: If no specific board members, try to find them
-                    board_partners = all_follower_partners.filtered(
-                        lambda p: p.function and 'vorstand' in p.function.lower()
-                    )
-                partners_to_notify |= board_partners
-                _logger.info(f"Task {self.id}: @Vorstand mention detected, notifying {len(board_partners)} board members")
+            for mention_group in mention_groups.sudo():
+                partners = mention_group._resolve_partners(self)
+                partners_to_notify |= partners
+                _logger.info(
+                    "Task %s: @%s mention detected, notifying %d %s",
+                    self.id, mention_group.name, len(partners),
+                    RESOLVER_RECIPIENTS[mention_group.resolver]
+                )
             
             # Add these partners to the notification list
             if partners_to_notify:
-                # Convert existing partner_ids to list if needed
-                if isinstance(original_partner_ids, list):
-                    partner_ids_list = list(original_partner_ids)
-                else:
-                    partner_ids_list = []
-                
-                # Add new partners
-                partner_ids_list.extend(partners_to_notify.ids)
+                original_partner_ids = kwargs.get('partner_ids', [])
+                if not isinstance(original_partner_ids, list):
+                    original_partner_ids = []
                 
                 # Remove duplicates while preserving order
-                seen = set()
-                unique_partner_ids = []
-                for pid in partner_ids_list:
-                    if pid not in seen:
-                        seen.add(pid)
-                        unique_partner_ids.append(pid)
-                
-                kwargs['partner_ids'] = unique_partner_ids
+                kwargs['partner_ids'] = list(dict.fromkeys(original_partner_ids + partners_to_notify.ids))
                 
                 # Add visual indicator in the message
-                if mentions['has_all']:
-                    body = body.replace('@all', '<span class="o_mail_mention_all badge text-bg-info">@all</span>')
-                if mentions['has_vorstand']:
-                    body = body.replace('@Vorstand', '<span class="o_mail_mention_vorstand badge text-bg-warning">@Vorstand</span>')
-                    body = body.replace('@vorstand', '<span class="o_mail_mention_vorstand badge text-bg-warning">@Vorstand</span>')
-                
                 kwargs['body'] = body
         
         # Call super with modified kwargs
         message = super().message_post(**kwargs)
         
         # Log the notification
-        if mentions['has_all'] or mentions['has_vorstand']:
+        if mention_groups:
+            self._notify_group_mention_realtime(mention_groups, message)
             notified_count = len(kwargs.get('partner_ids', []))
             _logger.info(f"Task {self.id}: Group mention notification sent to {notified_count} partners")
         
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+
+class ResUsers(models.Model):
+    _inherit = 'res.users'
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        """Refresh board members when new users are created as board members
+        
+        Their partner may already follow tasks when an existing contact is
+        turned into a user.
+        """
+        users = super().create(vals_list)
+        Task = self.env['project.task']
+        board_group_id = Task._get_board_group_id()
+        if board_group_id:
+            board_users = users.filtered(lambda user: board_group_id in user.groups_id.ids)
+        else:
+            board_users = users.filtered(lambda user: user.function and 'vorstand' in user.function.lower())
+        if board_users:
+            Task._recompute_board_members_for_partners(board_users.partner_id.ids)
+        return users
+    
+    def write(self, vals):
+        """Refresh board members when group memberships change
+        
+        The user form sends reified ``in_group_<id>`` / ``sel_groups_<ids>``
+        keys, which are only turned into ``groups_id`` further down the MRO.
+        """
+        res = super().write(vals)
+        if any(key in ('groups_id', 'active') or key.startswith(('in_group_', 'sel_groups_')) for key in vals):
+            self.env['project.task']._recompute_board_members_for_partners(self.partner_id.ids)
+        return res
+
+
+class ResGroups(models.Model):
+    _inherit = 'res.groups'
+    
+    def write(self, vals):
+        """Refresh board members when group memberships or implications change"""
+        partners = self.users.partner_id if 'users' in vals or 'implied_ids' in vals else None
+        res = super().write(vals)
+        if partners is not None:
+            partners |= self.users.partner_id
+            self.env['project.task']._recompute_board_members_for_partners(partners.ids)
+        return res
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+    
+    def write(self, vals):
+        """Refresh board members identified by their function
+        
+        The function only matters when no board group is configured.
+        """
+        res = super().write(vals)
+        if 'function' in vals and not self.env['project.task']._get_board_group_id():
+            self.env['project.task']._recompute_board_members_for_partners(self.ids)
+        return res
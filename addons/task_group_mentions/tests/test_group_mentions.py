@@ -1,4 +1,7 @@
 # -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+from odoo import Command
 from odoo.tests import TransactionCase, tagged
 from odoo.tools import html2plaintext
 
@@ -53,24 +56,67 @@ class TestGroupMentions(TransactionCase):
         body = '<p>Hello @all, please review this task</p>'
         mentions = self.task._extract_group_mentions(body)
         
-        self.assertTrue(mentions['has_all'])
-        self.assertFalse(mentions['has_vorstand'])
+        self.assertEqual(mentions.mapped('alias'), ['all'])
     
     def test_extract_vorstand_mention(self):
         """Test @Vorstand mention extraction"""
         body = '<p>@Vorstand approval needed</p>'
         mentions = self.task._extract_group_mentions(body)
         
-        self.assertFalse(mentions['has_all'])
-        self.assertTrue(mentions['has_vorstand'])
+        self.assertEqual(mentions.mapped('alias'), ['vorstand'])
     
     def test_extract_both_mentions(self):
         """Test both @all and @Vorstand mentions"""
         body = '<p>@all FYI, @Vorstand please approve</p>'
         mentions = self.task._extract_group_mentions(body)
         
-        self.assertTrue(mentions['has_all'])
-        self.assertTrue(mentions['has_vorstand'])
+        self.assertEqual(mentions.mapped('alias'), ['all', 'vorstand'])
+    
+    def test_extract_ignores_tags_and_emails(self):
+        """Test mentions inside HTML tags and email addresses are ignored"""
+        body = '<p title="@all">Mail team@all.example</p>'
+        mentions = self.task._extract_group_mentions(body)
+        
+        self.assertFalse(mentions)
+    
+    def test_custom_mention_group(self):
+        """Test a data-driven mention group resolved from a contact tag"""
+        tag = self.env['res.partner.category'].create({'name': 'Technik'})
+        self.user_demo.partner_id.category_id = [Command.link(tag.id)]
+        self.env['task.mention.group'].create({
+            'name': 'Technik',
+            'alias': 'Technik',
+            'resolver': 'tag',
+            'category_id': tag.id,
+        })
+        
+        body, mentions = self.env['task.mention.group']._process_mentions('<p>@technik bitte prüfen</p>')
+        self.assertEqual(mentions.mapped('alias'), ['technik'])
+        self.assertIn('o_mail_mention_technik', body)
+        self.assertEqual(mentions._resolve_partners(self.task), self.user_demo.partner_id)
+    
+    def test_mentions_processed_for_portal_users(self):
+        """Test authors without access to mention groups can still mention them"""
+        portal_user = self.env['res.users'].create({
+            'name': 'Portal User',
+            'login': 'portal_mentions',
+            'groups_id': [Command.set([self.env.ref('base.group_portal').id])],
+        })
+        tag = self.env['res.partner.category'].create({'name': 'Technik'})
+        self.user_demo.partner_id.category_id = [Command.link(tag.id)]
+        self.env['task.mention.group'].create({
+            'name': 'Technik',
+            'alias': 'technik',
+            'resolver': 'tag',
+            'category_id': tag.id,
+        })
+        
+        MentionGroup = self.env['task.mention.group'].with_user(portal_user)
+        body, mentions = MentionGroup._process_mentions('<p>@all @technik bitte lesen</p>')
+        self.assertIn('o_mail_mention_all', body)
+        self.assertIn('o_mail_mention_technik', body)
+        self.assertEqual(len(mentions), 2)
+        self.assertEqual(mentions[1]._resolve_partners(self.task).ids, self.user_demo.partner_id.ids)
     
     def test_compute_board_members(self):
         """Test board member computation"""
@@ -81,6 +127,153 @@ class TestGroupMentions(TransactionCase):
         self.assertIn(self.user_board_1.partner_id, board_members)
         self.assertIn(self.user_board_2.partner_id, board_members)
     
+    def test_board_members_follow_group_membership(self):
+        """Test board members are refreshed when board group membership changes"""
+        board_group = self.env.ref('base.group_erp_manager')
+        self.env['ir.config_parameter'].sudo().set_param(
+            'task_group_mentions.board_group', 'base.group_erp_manager')
+        self.task._compute_board_members()
+        self.assertNotIn(self.user_board_1.partner_id, self.task.board_member_ids)
+        
+        self.user_board_1.groups_id = [Command.link(board_group.id)]
+        self.assertIn(self.user_board_1.partner_id, self.task.board_member_ids)
+        self.assertNotIn(self.user_board_2.partner_id, self.task.board_member_ids)
+        
+        board_group.users = [Command.unlink(self.user_board_1.id)]
+        self.assertNotIn(self.user_board_1.partner_id, self.task.board_member_ids)
+    
+    def test_board_members_follow_user_form(self):
+        """Test board members are refreshed by the reified group fields of the user form"""
+        board_group = self.env.ref('base.group_erp_manager')
+        self.env['ir.config_parameter'].sudo().set_param(
+            'task_group_mentions.board_group', 'base.group_erp_manager')
+        self.task._compute_board_members()
+        self.assertNotIn(self.user_board_1.partner_id, self.task.board_member_ids)
+        
+        self.user_board_1.write({'in_group_%s' % board_group.id: True})
+        self.assertIn(self.user_board_1.partner_id, self.task.board_member_ids)
+        
+        self.user_board_1.write({'in_group_%s' % board_group.id: False})
+        self.assertNotIn(self.user_board_1.partner_id, self.task.board_member_ids)
+    
+    def test_board_members_follow_implied_groups(self):
+        """Test board members are refreshed when a group starts implying the board group"""
+        board_group = self.env.ref('base.group_erp_manager')
+        self.env['ir.config_parameter'].sudo().set_param(
+            'task_group_mentions.board_group', 'base.group_erp_manager')
+        group = self.env['res.groups'].create({
+            'name': 'Vorstand',
+            'users': [Command.link(self.user_board_2.id)],
+        })
+        self.task._compute_board_members()
+        self.assertNotIn(self.user_board_2.partner_id, self.task.board_member_ids)
+        
+        group.implied_ids = [Command.link(board_group.id)]
+        self.assertIn(self.user_board_2.partner_id, self.task.board_member_ids)
+    
+    def test_board_members_cache_cleared_only_when_relevant(self):
+        """Test functions and new users only refresh board members when they can be board members"""
+        Users = self.env['res.users'].with_context(no_reset_password=True)
+        Task = type(self.env['project.task'])
+        with patch.object(Task, '_recompute_board_members_for_partners') as recompute:
+            # The board group decides, the function is irrelevant
+            self.user_demo.partner_id.function = 'Vorstand'
+            Users.create({'name': 'Kassenwart', 'login': 'kasse', 'email': 'kasse@test.com'})
+            recompute.assert_not_called()
+            
+            admin = Users.create({
+                'name': 'Admin 2',
+                'login': 'admin2',
+                'email': 'admin2@test.com',
+                'groups_id': [Command.link(self.env.ref('base.group_system').id)],
+            })
+            recompute.assert_called_once_with(admin.partner_id.ids)
+    
+    def test_board_members_follow_function(self):
+        """Test functions decide about board members without a board group"""
+        self.env['ir.config_parameter'].sudo().set_param(
+            'task_group_mentions.board_group', 'task_group_mentions.no_board_group')
+        self.task._compute_board_members()
+        self.assertEqual(self.task.board_member_ids, self.user_board_1.partner_id | self.user_board_2.partner_id)
+        
+        self.user_demo.partner_id.function = 'Vorstand'
+        self.assertIn(self.user_demo.partner_id, self.task.board_member_ids)
+        self.user_board_1.partner_id.function = 'Kasse'
+        self.assertNotIn(self.user_board_1.partner_id, self.task.board_member_ids)
+    
+    def test_group_mention_provisions_aliases(self):
+        """Test the project group aliases are created on the first group mention"""
+        self.assertFalse(self.project.all_followers_alias_id)
+        
+        self.task.message_post(body='<p>Update</p>', message_type='comment')
+        self.assertFalse(self.project.all_followers_alias_id)
+        
+        self.task.message_post(body='<p>@all bitte lesen</p>', message_type='comment')
+        self.assertTrue(self.project.all_followers_alias_id.is_group_alias)
+        self.assertTrue(self.project.board_members_alias_id.is_group_alias)
+    
+    def test_group_mention_fan_out(self):
+        """Test group mentions fan out once per partner in one batch"""
+        message = self.task.message_post(body='<p>Update</p>', message_type='comment')
+        notifications = [{
+            'type': 'group_mention',
+            'task_id': self.task.id,
+            'mention_type': mention_type,
+            'message_id': message.id,
+            'body': message.body,
+        } for mention_type in ('all', 'vorstand', 'all')]
+        
+        fan_out = self.env['bus.bus']._fan_out_group_mentions(notifications)
+        
+        partners = [partner for partner, _type, _payload in fan_out]
+        self.assertEqual(len(partners), len(set(partners)))
+        self.assertEqual(set(partners), set(self.task.message_partner_ids.filtered('user_ids')))
+    
+    def test_group_mention_fan_out_board_fallback(self):
+        """Test the board fan-out falls back to the function like the chatter recipients"""
+        board_group = self.env['res.groups'].create({'name': 'Empty Board'})
+        self.env['ir.model.data'].create({
+            'module': 'task_group_mentions_test',
+            'name': 'empty_board',
+            'model': 'res.groups',
+            'res_id': board_group.id,
+        })
+        self.env['ir.config_parameter'].sudo().set_param(
+            'task_group_mentions.board_group', 'task_group_mentions_test.empty_board')
+        self.task._compute_board_members()
+        self.assertFalse(self.task.board_member_ids)
+        
+        message = self.task.message_post(body='<p>Update</p>', message_type='comment')
+        board_mention = self.env['task.mention.group'].search([('alias', '=', 'vorstand')])
+        fan_out = self.env['bus.bus']._fan_out_group_mentions([{
+            'type': 'group_mention',
+            'task_id': self.task.id,
+            'mention_type': 'vorstand',
+            'message_id': message.id,
+            'body': message.body,
+        }])
+        
+        partners = self.env['res.partner'].union(*(partner for partner, _type, _payload in fan_out))
+        self.assertEqual(partners, self.user_board_1.partner_id | self.user_board_2.partner_id)
+        self.assertEqual(partners, board_mention._resolve_partners(self.task).filtered('user_ids'))
+    
+    def test_group_mention_sends_bus_notifications(self):
+        """Test a posted group mention is fanned out on the bus"""
+        Bus = self.env['bus.bus'].sudo()
+        last_id = Bus.search([], order='id desc', limit=1).id or 0
+        
+        self.task.message_post(body='<p>@all @all bitte lesen</p>', message_type='comment')
+        # The bus inserts the queued notifications right before committing
+        self.env.cr.precommit.run()
+        
+        notifications = Bus.search([
+            ('id', '>', last_id),
+            ('message', 'like', 'group_mention_notification'),
+        ])
+        recipients = self.task.message_partner_ids.filtered('user_ids')
+        self.assertTrue(recipients)
+        self.assertEqual(len(notifications), len(recipients))
+    
     def test_message_post_with_all_mention(self):
         """Test posting message with @all mention"""
         with self.assertLogs('odoo.addons.task_group_mentions', level='INFO') as log: